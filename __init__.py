@@ -1,10 +1,12 @@
 #
-import pathlib
+import os
 
-_install_path = pathlib.Path(__file__).resolve().parent
+_install_path = os.path.dirname(os.path.realpath(__file__))
 _config_file = f'{_install_path}/PyLex_configs.xlsx'
 
 from .pylex import PyLex
 from .tokenizer import Tokenizer
 from .lexer import Lexer
 
+from .tokens import Token, TokenBuffer
+from .stats import Stats
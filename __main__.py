@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""
+python -m pylex: the batch command line (see cli.py).
+"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
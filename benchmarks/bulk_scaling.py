@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk tokenization benchmark: scaling of BulkTokenizer with the number of worker processes.
+
+A synthetic corpus is built from the config's own expressions & token names.
+It is tokenized serially with 1 Tokenizer, then with BulkTokenizer at 1, 2, 4, ... workers
+    (up to the number of CPUs) & at several chunk sizes.
+The output of every bulk run is checked against the serial output.
+
+Results are printed as JSON: expressions/s & the speedup over the serial run.
+
+Usage:
+    python benchmarks/bulk_scaling.py [--expressions 100000] [--chunksizes 64,256,1024]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex import Tokenizer
+from pylex.bulk import BulkTokenizer, suggest_chunksize
+from pylex.config import load_config
+
+
+def corpus(config, count, seed=0):
+    """Build count random expressions from the config's expressions & token names."""
+
+    rng = random.Random(seed)
+    pieces = [expression for expression in config.expressions.values() if expression]
+    pieces += [' {} '.format(name) for name in config.token_names]
+
+    return [' | '.join(rng.choice(pieces) for piece in range(rng.randint(1, 6)))
+            for expression in range(count)]
+
+
+def worker_counts(limit):
+    """Return 1, 2, 4, ... up to (& including) limit."""
+
+    counts = []
+    count = 1
+    while count < limit:
+        counts.append(count)
+        count *= 2
+    counts.append(limit)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--expressions', type=int, default=100000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunksizes', default='auto,64,256,1024',
+                        help="comma separated chunk sizes; 'auto' uses suggest_chunksize()")
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    expressions = corpus(config, args.expressions)
+
+    tokenizer = Tokenizer(config=config)
+    start = time.perf_counter()
+    serial = [tokenizer.tokenize(expression) for expression in expressions]
+    serial_seconds = time.perf_counter() - start
+
+    runs = []
+    for workers in worker_counts(args.max_workers):
+        for chunksize in args.chunksizes.split(','):
+            if chunksize == 'auto':
+                chunksize = suggest_chunksize(len(expressions), workers)
+            with BulkTokenizer(config=config, workers=workers, chunksize=int(chunksize)) as bulk:
+                list(bulk.tokenize(expressions[:workers]))      # Start the workers
+                start = time.perf_counter()
+                results = list(bulk.tokenize(expressions))
+                seconds = time.perf_counter() - start
+            runs.append({
+                'workers': workers,
+                'chunksize': int(chunksize),
+                'seconds': seconds,
+                'expressions_per_s': len(expressions) / seconds,
+                'speedup': serial_seconds / seconds,
+                'matches_serial': results == serial,
+            })
+            print(json.dumps(runs[-1]), file=sys.stderr)
+
+    print(json.dumps({
+        'expressions': len(expressions),
+        'cpus': os.cpu_count(),
+        'serial': {'seconds': serial_seconds,
+                   'expressions_per_s': len(expressions) / serial_seconds},
+        'bulk': runs,
+    }, indent=2))
+
+    return 0 if all(run['matches_serial'] for run in runs) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
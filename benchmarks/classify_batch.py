@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Batch lexeme classification: Tokenizer.classify_lexemes() vs the per-lexeme path.
+
+The per-lexeme path classifies 1 lexeme at a time, as the tokenizer pipeline does:
+    an operator lookup, then a pylang token check, then a kind code lookup.
+classify_lexemes() is timed on the same lexemes held as:
+    list         a list of str
+    ndarray      a NumPy array of str (searchsorted on the sorted table)
+    categorical  a pandas Categorical (only the categories are looked up; needs pandas)
+Conversions into the NumPy & pandas types are not timed: they are the formats
+    the lexemes are assumed to be held in already.
+
+Lexemes are drawn from the lexed definitions of every token in the config,
+    plus a few unknown ones, at 10k, 100k & 1M lexemes by default.
+
+Usage:
+    python benchmarks/classify_batch.py
+    python benchmarks/classify_batch.py --sizes 10000 1000000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+import numpy as np
+
+from pylex import Tokenizer
+from pylex.tokens import kind_code
+
+
+def per_lexeme(tokenizer, lexemes):
+    """Classify lexemes 1 at a time, as the tokenizer pipeline does."""
+
+    operators = tokenizer.subtoken_configs
+    pylang_tokens = tokenizer.token_configs
+    kinds = []
+    for lexeme in lexemes:
+        key = operators.get(lexeme, 'potential_pylang_token')
+        if key == 'potential_pylang_token':
+            key = 'pylang_token' if lexeme in pylang_tokens else 'definition_extras'
+        kinds.append(kind_code(key))
+    return kinds
+
+
+def best_time(function, repeat):
+    """Return the min & median run times of function in seconds."""
+
+    times = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+
+    tokenizer = Tokenizer()
+    config = tokenizer.config
+    pool = ['unknown', 'lexemes', 'here']
+    for expression in config.expressions.values():
+        if expression:
+            pool.extend(tokenizer.lexer.lex_string(expression))
+
+    rng = random.Random(args.seed)
+    results = []
+
+    for size in args.sizes:
+        lexemes = [rng.choice(pool) for lexeme in range(size)]
+        expected = np.array(per_lexeme(tokenizer, lexemes), dtype=np.int32)
+
+        inputs = {'list': lexemes, 'ndarray': np.array(lexemes, dtype=str)}
+        if pd is not None:
+            inputs['categorical'] = pd.Categorical(lexemes)
+
+        result = {'lexemes': size}
+        base_min, base_median = best_time(lambda: per_lexeme(tokenizer, lexemes), args.repeat)
+        result['per_lexeme_s'] = base_min
+
+        for name, batch in inputs.items():
+            if not np.array_equal(tokenizer.classify_lexemes(batch), expected):
+                raise AssertionError('classify_lexemes({}) differs from the per-lexeme path'\
+                                     .format(name))
+            batch_min, batch_median = best_time(lambda: tokenizer.classify_lexemes(batch),
+                                                args.repeat)
+            result[name + '_s'] = batch_min
+            result[name + '_speedup'] = base_min / batch_min if batch_min else None
+
+        results.append(result)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
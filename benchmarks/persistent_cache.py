@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache benchmark: short-lived worker processes with & without a shared on-disk cache.
+
+Every run starts a fresh interpreter that builds a PyLex over a synthetic config
+    (see synthetic.py), then tokenizes --expressions expressions & normalizes every token,
+    the way a short-lived worker does.
+The first run with the cache starts from an empty cache file (cold);
+    the later ones read back what the earlier ones stored (warm).
+Each run reports its time & the hit rate of the persistent cache.
+
+Usage:
+    python benchmarks/persistent_cache.py
+    python benchmarks/persistent_cache.py --tokens 2000 --depth 6 --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+_benchmarks_dir = os.path.dirname(os.path.realpath(__file__))
+
+_probe = '''
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+from synthetic import synthetic_config, synthetic_expressions
+from pylex import PyLex
+from pylex.persistent import PersistentCache
+
+tokens, depth, expressions, cache_path = int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]), sys.argv[5]
+config = synthetic_config(tokens=tokens, depth=depth)
+inputs = synthetic_expressions(config, expressions)
+
+start = time.perf_counter()
+cache = PersistentCache(cache_path) if cache_path != '-' else None
+pylex = PyLex(config=config, interactive=False, persistent_cache=cache)
+for expression in inputs:
+    pylex.tokenize(expression)
+for token_name in config.token_names:
+    try:
+        pylex.normalize(token_name)
+    except (KeyError, ValueError):
+        pass
+seconds = time.perf_counter() - start
+
+print(json.dumps({'seconds': seconds,
+                  'hit_rate': cache.stats()['hit_rate'] if cache is not None else None}))
+'''
+
+
+def run_probe(args, cache_path):
+    """Run 1 worker process. Return its time & hit rate."""
+
+    output = subprocess.run([sys.executable, '-c', _probe, _benchmarks_dir, str(args.tokens),
+                             str(args.depth), str(args.expressions), cache_path],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tokens', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--expressions', type=int, default=2000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    uncached = [run_probe(args, '-') for run in range(args.runs)]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_path = os.path.join(cache_dir, 'results.sqlite3')
+        cold = run_probe(args, cache_path)
+        warm = [run_probe(args, cache_path) for run in range(args.runs)]
+
+    uncached_s = statistics.median(run['seconds'] for run in uncached)
+    warm_s = statistics.median(run['seconds'] for run in warm)
+
+    print(json.dumps({
+        'tokens': args.tokens,
+        'expressions': args.expressions,
+        'uncached_s_median': uncached_s,
+        'cold_s': cold['seconds'],
+        'cold_hit_rate': cold['hit_rate'],
+        'warm_s_median': warm_s,
+        'warm_hit_rate_min': min(run['hit_rate'] for run in warm),
+        'speedup': uncached_s / warm_s,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Reverse lookup benchmark: 1 merged TokenRecognizer vs matching every token separately.
+
+The baseline compiles 1 recognizer per token & tries each of them on every input,
+    which is what answering "which tokens can produce this string?" costs token by token.
+The merged recognizer answers the same question in a single pass over each input.
+Both must return the same tokens for every input.
+
+Runs on the real config & on a synthetic one (see synthetic.py) of --tokens tokens.
+
+Usage:
+    python benchmarks/recognizer.py
+    python benchmarks/recognizer.py --tokens 2000 --inputs 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from synthetic import synthetic_config
+
+from pylex import PyLex
+from pylex.config import load_config
+from pylex.recognizer import TokenRecognizer
+
+
+def sample_inputs(count, seed=0):
+    """Return count strings: identifiers, string literals, escapes, numbers & punctuation."""
+
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz_'
+    inputs = []
+    for i in range(count):
+        word = ''.join(rng.choice(letters) for char in range(rng.randint(1, 10)))
+        shape = i % 6
+        if shape == 0:
+            inputs.append(word)
+        elif shape == 1:
+            inputs.append('"{}"'.format(word))
+        elif shape == 2:
+            inputs.append("{}'{}'".format(rng.choice(['r', 'f', 'Rb', '']), word))
+        elif shape == 3:
+            inputs.append('\\' + word[0])
+        elif shape == 4:
+            inputs.append(str(rng.randint(0, 10 ** 6)))
+        else:
+            inputs.append(rng.choice(['...', '(', '+=', ' ', word + '-' + word]))
+    return inputs
+
+
+def run(pylex, inputs):
+    """Time building & matching with the merged recognizer & with 1 recognizer per token."""
+
+    start = time.perf_counter()
+    merged = TokenRecognizer.build(pylex)
+    build_s = time.perf_counter() - start
+
+    token_names = [name for name in pylex.config.token_names if name not in merged.errors]
+    start = time.perf_counter()
+    separate = [(name, TokenRecognizer.build(pylex, [name])) for name in token_names]
+    separate_build_s = time.perf_counter() - start
+
+    # 2 passes each: the first builds the lazy DFAs, the second is the steady state.
+    for timed_pass in range(2):
+        start = time.perf_counter()
+        merged_results = [merged.match(text) for text in inputs]
+        merged_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        separate_results = [tuple(name for name, recognizer in separate if recognizer.match(text))
+                            for text in inputs]
+        separate_s = time.perf_counter() - start
+
+        if timed_pass == 0:
+            cold = (merged_s, separate_s)
+
+    if merged_results != separate_results:
+        raise AssertionError('The merged recognizer disagrees with the per-token recognizers')
+
+    return {
+        'tokens': len(token_names),
+        'inputs': len(inputs),
+        'matched_inputs': sum(1 for result in merged_results if result),
+        'nfa_states': merged.nfa_size(),
+        'dfa_states': merged.dfa_size(),
+        'build_s': build_s,
+        'per_token_build_s': separate_build_s,
+        'cold_merged_s': cold[0],
+        'cold_per_token_s': cold[1],
+        'merged_s': merged_s,
+        'per_token_s': separate_s,
+        'speedup': separate_s / merged_s if merged_s else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tokens', type=int, default=500)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--inputs', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    inputs = sample_inputs(args.inputs, args.seed)
+
+    real = PyLex(config=load_config(), interactive=False)
+    synthetic = PyLex(config=synthetic_config(tokens=args.tokens, depth=args.depth,
+                                              seed=args.seed), interactive=False)
+
+    print(json.dumps({'config': run(real, inputs), 'synthetic': run(synthetic, inputs)},
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Load test of the PyLex server: latency percentiles under many concurrent clients.
+
+Unless --port or --unix points at a running server, a PyLexServer is started in-process
+    (on its own event loop thread) for the run.
+Each of --clients clients keeps 1 keep-alive connection open & sends requests back to back,
+    cycling through lookups, normal forms & tokenizing of the config's tokens,
+    until --requests requests have been sent in total.
+p50, p90, p99 & max latencies are reported per endpoint, along with the throughput
+    & the number of requests refused with 503 (backpressure).
+
+Usage:
+    python benchmarks/server_load.py --clients 64 --requests 20000
+    python benchmarks/server_load.py --port 8765 --clients 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex.config import load_config
+from pylex.server import PyLexServer
+
+
+def percentile(sorted_values, fraction):
+    """Return the value at fraction (0..1) of sorted_values (nearest rank)."""
+
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def request_mix(config):
+    """Return the list of (path, params) requests the clients cycle through."""
+
+    requests = []
+    for token_name in config.token_names:
+        requests.append(('/look_up_token', {'token': token_name}))
+        if config.expressions.get(token_name):
+            requests.append(('/normalize', {'token': token_name}))
+            requests.append(('/tokenize', {'expression': config.expressions[token_name]}))
+    return requests
+
+
+async def open_connection(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def send(reader, writer, host, path, params):
+    """Send 1 POST request & read its response. Return the status code."""
+
+    body = json.dumps(params).encode('utf-8')
+    writer.write('POST {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\n'\
+                 'Content-Length: {}\r\n\r\n'.format(path, host, len(body)).encode('latin-1')
+                 + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+
+    return status
+
+
+async def client(args, requests, counter, latencies, statuses):
+    reader, writer = await open_connection(args)
+    try:
+        while counter[0] < args.requests:
+            i = counter[0]
+            counter[0] += 1
+            path, params = requests[i % len(requests)]
+            start = time.perf_counter()
+            status = await send(reader, writer, args.host, path, params)
+            latencies.setdefault(path, []).append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_clients(args, requests):
+    counter = [0]
+    latencies = {}
+    statuses = {}
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(args, requests, counter, latencies, statuses)
+                           for each_client in range(args.clients)])
+    elapsed = time.perf_counter() - start
+
+    return elapsed, latencies, statuses
+
+
+def start_server(args, config):
+    """Start a PyLexServer on a background event loop thread. Return once it listens."""
+
+    server = PyLexServer(config=config, workers=args.workers, max_pending=args.max_pending)
+    ready = threading.Event()
+
+    def run():
+        async def serve():
+            listening = asyncio.Event()
+            task = asyncio.ensure_future(server.serve(args.host, args.port, path=args.unix,
+                                                      ready=listening))
+            await listening.wait()
+            ready.set()
+            await task
+        asyncio.run(serve())
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None,
+                        help='port of a running server (default: start one on port 8766)')
+    parser.add_argument('--unix', metavar='PATH', help='Unix socket of a running server')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=None, help='in-process server threads')
+    parser.add_argument('--max-pending', type=int, default=64,
+                        help='in-process server backpressure limit')
+    args = parser.parse_args(argv)
+
+    config = load_config()
+    requests = request_mix(config)
+
+    if args.port is None and args.unix is None:
+        args.port = 8766
+        start_server(args, config)
+
+    elapsed, latencies, statuses = asyncio.run(run_clients(args, requests))
+
+    results = {'clients': args.clients, 'requests': args.requests,
+               'seconds': elapsed, 'requests_per_s': args.requests / elapsed,
+               'statuses': statuses, 'endpoints': {}}
+
+    all_latencies = []
+    for path, values in sorted(latencies.items()):
+        values.sort()
+        all_latencies.extend(values)
+        results['endpoints'][path] = {
+            'count': len(values),
+            'p50_ms': percentile(values, 0.50) * 1e3,
+            'p90_ms': percentile(values, 0.90) * 1e3,
+            'p99_ms': percentile(values, 0.99) * 1e3,
+            'max_ms': values[-1] * 1e3,
+        }
+    all_latencies.sort()
+    results['p50_ms'] = percentile(all_latencies, 0.50) * 1e3
+    results['p99_ms'] = percentile(all_latencies, 0.99) * 1e3
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark: a cold `import pylex` followed by the first normal-form lookup.
+
+Every run starts a fresh interpreter, the way a short-lived CLI worker does.
+The disk cache of the compiled config is warmed once before timing,
+    so the runs measure the normal startup path (no Excel parsing).
+
+The benchmark fails (exit status 1) when the median import or first-lookup time
+    goes over its threshold, or when importing pylex loads pandas.
+
+Usage:
+    python benchmarks/startup.py [--runs 15] [--max-import-ms 150] [--max-lookup-ms 150]
+
+The dir holding the pylex package is found from this file's location;
+    use --pythonpath if the package dir is not named 'pylex'.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+_package_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+_probe = '''
+import json, sys, time
+start = time.perf_counter()
+import pylex
+imported = time.perf_counter()
+pandas_on_import = 'pandas' in sys.modules
+pylex.PyLex(interactive=False).normalize(sys.argv[1])
+looked_up = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000,
+                  'lookup_ms': (looked_up - imported) * 1000,
+                  'pandas_on_import': pandas_on_import}))
+'''
+
+
+def run_probe(pythonpath, token_name):
+    """Time 1 cold import + first lookup in a fresh interpreter. Return the probe's results."""
+
+    env = dict(os.environ, PYTHONPATH=pythonpath)
+    output = subprocess.run([sys.executable, '-c', _probe, token_name], env=env, cwd=pythonpath,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--token', default='identifier')
+    parser.add_argument('--max-import-ms', type=float, default=150.0)
+    parser.add_argument('--max-lookup-ms', type=float, default=150.0)
+    parser.add_argument('--pythonpath', default=os.path.dirname(_package_dir))
+    args = parser.parse_args(argv)
+
+    run_probe(args.pythonpath, args.token)     # Warm the compiled config cache
+
+    results = [run_probe(args.pythonpath, args.token) for run in range(args.runs)]
+
+    report = {
+        'runs': args.runs,
+        'import_ms_median': statistics.median(r['import_ms'] for r in results),
+        'lookup_ms_median': statistics.median(r['lookup_ms'] for r in results),
+        'pandas_on_import': any(r['pandas_on_import'] for r in results),
+        'max_import_ms': args.max_import_ms,
+        'max_lookup_ms': args.max_lookup_ms,
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if report['import_ms_median'] > args.max_import_ms:
+        failures.append('import is slower than {} ms'.format(args.max_import_ms))
+    if report['lookup_ms_median'] > args.max_lookup_ms:
+        failures.append('first lookup is slower than {} ms'.format(args.max_lookup_ms))
+    if report['pandas_on_import']:
+        failures.append('importing pylex loads pandas')
+
+    for failure in failures:
+        print('REGRESSION:', failure, file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
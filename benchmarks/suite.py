@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite: times each PyLex stage separately on a synthetic grammar.
+
+Stages:
+    xlsx_load        parse a workbook of the synthetic config (CompiledConfig.from_workbook)
+    lex_legacy       Lexer.lex_string(), engine='legacy'
+    lex_table        Lexer.lex_string(), engine='table'
+    lex_regex        Lexer.lex_string(), engine='regex'
+    tokenize         Tokenizer.tokenize()
+    tokenize_staged  Tokenizer.tokenize_staged()
+    normalize        PyLex.normalize() of every synthetic token, from an empty cache
+
+Every stage is repeated & its min & median times are kept.
+Results are written as JSON (--out). Given a previous results file (--baseline),
+    each stage's median is compared to the baseline's; a stage that is slower by more than
+    --tolerance is reported as a regression & the suite exits with status 1.
+
+Usage:
+    python benchmarks/suite.py --out bench.json
+    python benchmarks/suite.py --baseline bench.json --tokens 2000 --depth 6
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+from synthetic import synthetic_config, synthetic_expressions, write_workbook
+
+from pylex import Lexer, PyLex, Tokenizer
+from pylex.config import CompiledConfig
+
+
+def time_stage(function, repeat):
+    """Call function repeat times. Return its min & median run times in seconds."""
+
+    times = []
+    for run in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'min_s': min(times), 'median_s': statistics.median(times)}
+
+
+def run_suite(args):
+    """Run every stage. Return the results as a dict."""
+
+    config = synthetic_config(tokens=args.tokens, delimiters=args.delimiters,
+                              priority_seqs=args.priority_seqs, depth=args.depth, seed=args.seed)
+    expressions = synthetic_expressions(config, args.expressions, seed=args.seed)
+    token_names = [name for name in config.token_names if name.startswith('synthetic_')]
+
+    stages = {}
+
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            workbook = os.path.join(temp_dir, 'synthetic_configs.xlsx')
+            write_workbook(config, workbook)
+            stages['xlsx_load'] = time_stage(lambda: CompiledConfig.from_workbook(workbook),
+                                             args.repeat)
+            stages['xlsx_load']['items'] = 1
+    except ImportError as error:
+        print('Skipping xlsx_load: {}'.format(error), file=sys.stderr)
+
+    for engine in Lexer.engines:
+        lexer = Lexer(config=config, engine=engine)
+        stage = time_stage(lambda: [lexer.lex_string(e) for e in expressions], args.repeat)
+        stage['items'] = len(expressions)
+        stages['lex_' + engine] = stage
+
+    tokenizer = Tokenizer(config=config)
+    stages['tokenize'] = time_stage(lambda: [tokenizer.tokenize(e) for e in expressions],
+                                    args.repeat)
+    stages['tokenize']['items'] = len(expressions)
+    stages['tokenize_staged'] = time_stage(
+        lambda: [tokenizer.tokenize_staged(e) for e in expressions], args.repeat)
+    stages['tokenize_staged']['items'] = len(expressions)
+
+    def normalize_all():
+        pylex = PyLex(config=config, interactive=False, cache_size=None)
+        for name in token_names:
+            pylex.normalize(name)
+
+    stages['normalize'] = time_stage(normalize_all, args.repeat)
+    stages['normalize']['items'] = len(token_names)
+
+    for stage in stages.values():
+        stage['items_per_s'] = stage['items'] / stage['median_s'] if stage['median_s'] else None
+
+    return {
+        'params': {name: getattr(args, name) for name in
+                   ('tokens', 'delimiters', 'priority_seqs', 'depth', 'expressions',
+                    'repeat', 'seed')},
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'stages': stages,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare the median of every stage with the baseline.
+    Return a dict of stage -> ratio (current / baseline) & a list of regressed stages.
+    """
+
+    ratios = {}
+    regressions = []
+
+    for name, stage in results['stages'].items():
+        base_stage = baseline.get('stages', {}).get(name)
+        if not base_stage or not base_stage.get('median_s'):
+            continue
+        ratio = stage['median_s'] / base_stage['median_s']
+        ratios[name] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+
+    return ratios, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tokens', type=int, default=500)
+    parser.add_argument('--delimiters', type=int, default=10)
+    parser.add_argument('--priority-seqs', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--expressions', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.20,
+                        help='allowed slowdown over the baseline (0.20 = 20%%)')
+    args = parser.parse_args(argv)
+
+    results = run_suite(args)
+    status = 0
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('params') != results['params']:
+            print('Warning: the baseline was run with different params', file=sys.stderr)
+        ratios, regressions = compare(results, baseline, args.tolerance)
+        results['baseline'] = {'file': args.baseline, 'tolerance': args.tolerance,
+                               'ratios': ratios, 'regressions': regressions}
+        for name in regressions:
+            print('REGRESSION: {} is {:.0%} slower than the baseline'\
+                  .format(name, ratios[name] - 1), file=sys.stderr)
+        status = 1 if regressions else 0
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as out_file:
+            out_file.write(output + '\n')
+    print(output)
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic grammars & configs for benchmarking, scaled far beyond PyLex_configs.xlsx.
+
+synthetic_config() starts from the real compiled config (so every delimiter, operator
+    & phrase the engines rely on is there) & adds:
+    - extra delimiter chars, each with its own operator,
+    - extra priority sequences, made of 2 to 4 delimiter chars,
+    - layers of pylang tokens: tokens on level 0 are terminals,
+        tokens on level n refer to 2 or 3 tokens of level n - 1,
+        combined with alternation, repetition, grouping, options & phrases.
+
+write_workbook() saves a config in the layout of PyLex_configs.xlsx (needs pandas & openpyxl),
+    so loading the workbook itself can be benchmarked.
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex.config import CompiledConfig, load_config
+
+
+# Chars that are never used as extra delimiters: letters, digits, '_' & everything already used.
+_EXTRA_DELIMITER_POOL = '!#$%&,;?@^`{}~' + ''.join(chr(code) for code in range(0x2190, 0x2200))
+
+
+def synthetic_config(tokens=200, delimiters=0, priority_seqs=0, depth=4, seed=0, base=None):
+    """
+    Build a synthetic CompiledConfig.
+
+    Input:  tokens: number of pylang tokens (spread over depth + 1 levels)
+            delimiters: number of extra delimiter chars
+            priority_seqs: number of extra priority sequences
+            depth: nesting depth of the token definitions
+            base: config to extend (the real compiled config by default)
+    Output: CompiledConfig
+    """
+
+    rng = random.Random(seed)
+    if base is None:
+        base = load_config()
+
+    data = base.to_dict()
+    data['source_hash'] = None
+
+    extra_delimiters = _EXTRA_DELIMITER_POOL[:delimiters]
+    if len(extra_delimiters) < delimiters:
+        raise ValueError('At most {} extra delimiters are available'\
+                         .format(len(_EXTRA_DELIMITER_POOL)))
+
+    data['delimiters'] = set(data['delimiters']) | set(extra_delimiters)
+    data['operators'] = dict(data['operators'])
+    data['phrase_openers'] = dict(data['phrase_openers'])
+    data['phrase_closers'] = dict(data['phrase_closers'])
+    data['phrase_names'] = dict(data['phrase_names'])
+
+    for i, char in enumerate(extra_delimiters):
+        operator_name = 'synthetic_operator_{}'.format(i)
+        data['operators'][char] = operator_name
+        data['phrase_openers'][operator_name] = False
+        data['phrase_closers'][operator_name] = '"False"'
+        data['phrase_names'][operator_name] = '"False"'
+
+    seq_chars = ''.join(sorted(data['delimiters'] - set('<>\'"')))
+    seqs = list(data['priority_char_seqs'])
+    while len(seqs) < len(data['priority_char_seqs']) + priority_seqs:
+        seq = ''.join(rng.choice(seq_chars) for char in range(rng.randint(2, 4)))
+        if seq not in seqs:
+            seqs.append(seq)
+    data['priority_char_seqs'] = seqs
+
+    levels = [[] for level in range(depth + 1)]
+    token_names = list(data['token_names'])
+    expressions = dict(data['expressions'])
+
+    for i in range(tokens):
+        level = i % (depth + 1)
+        name = 'synthetic_{}_{}'.format(level, i)
+        if level == 0 or not levels[level - 1]:
+            expression = rng.choice(['"{}"'.format(name[-3:]), 'a…z', "'_'",
+                                     '<any synthetic character {}>'.format(i)])
+        else:
+            expression = _synthetic_definition(rng, levels[level - 1])
+        levels[level].append(name)
+        token_names.append(name)
+        expressions[name] = expression
+
+    data['token_names'] = token_names
+    data['expressions'] = expressions
+
+    return CompiledConfig.from_dict(data)
+
+
+def _synthetic_definition(rng, names):
+    """Combine 2 or 3 token names from the level below into a definition."""
+
+    parts = rng.sample(names, min(len(names), rng.randint(2, 3)))
+    shape = rng.randrange(5)
+
+    if shape == 0:
+        return ' | '.join(parts)
+    if shape == 1:
+        return '{} ({})*'.format(parts[0], ' | '.join(parts[1:]))
+    if shape == 2:
+        return '[{}] {}'.format(parts[0], ' '.join(parts[1:]))
+    if shape == 3:
+        return '{} "..." {}+'.format(parts[0], parts[-1])
+    return '<{} phrase> {}'.format(parts[0], ' '.join(parts))
+
+
+def synthetic_expressions(config, count, length=8, seed=0):
+    """
+    Build count expressions of about length pieces each,
+        out of the config's token names, expressions, delimiters & priority sequences.
+
+    Input: CompiledConfig, int
+    Output: list of str
+    """
+
+    rng = random.Random(seed)
+    pieces = list(config.token_names) + sorted(config.delimiters)
+    pieces += [expression for expression in config.expressions.values() if expression]
+    pieces += list(config.priority_char_seqs) + ['abc', 'a…z']
+
+    return [' '.join(rng.choice(pieces) for piece in range(length)) for expression in range(count)]
+
+
+def write_workbook(config, path):
+    """
+    Save a compiled config as an xlsx workbook in the layout of PyLex_configs.xlsx.
+    Requires pandas & openpyxl.
+    """
+
+    import pandas as pd
+
+    def quote(value):
+        return None if value is None else '"{}"'.format(value)
+
+    lexer_rows = max(len(config.delimiters), len(config.priority_char_seqs))
+    delimiters = sorted(config.delimiters)
+    lexer_df = pd.DataFrame({
+        'delimiter': [quote(value) for value in delimiters] + [None] * (lexer_rows - len(delimiters)),
+        'priority_char_seqs': [quote(value) for value in config.priority_char_seqs]
+                              + [None] * (lexer_rows - len(config.priority_char_seqs)),
+    })
+
+    symbols = {operator_name: symbol for symbol, operator_name in config.operators.items()}
+    operator_names = list(config.phrase_openers)
+    tokenizer_df = pd.DataFrame({
+        'operator_name': operator_names,
+        'operator': [quote(symbols.get(name)) for name in operator_names],
+        'phrase_opener': [config.phrase_openers[name] for name in operator_names],
+        'phrase_closer': [config.phrase_closers[name] for name in operator_names],
+        'phrase_name': [config.phrase_names[name] for name in operator_names],
+    })
+
+    pylex_df = pd.DataFrame({
+        'token_name': list(config.token_names),
+        'expression_string': [quote(config.expressions.get(name)) for name in config.token_names],
+    })
+
+    with pd.ExcelWriter(path) as writer:
+        lexer_df.to_excel(writer, sheet_name='Lexer_configs', index=False)
+        tokenizer_df.to_excel(writer, sheet_name='Tokenizer_configs', index=False)
+        pylex_df.to_excel(writer, sheet_name='PyLex_configs', index=False)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk tokenization of large expression corpora on a pool of processes.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from pylex import _config_file
+from .config import CompiledConfig, load_config
+from .tokenizer import Tokenizer
+
+
+# The object a worker process works with (a Tokenizer, a PyLex, ...), built once by _init_worker().
+_worker = None
+
+
+class BulkTokenizer(object):
+
+    """
+    BulkTokenizer spreads the tokenizing of many expressions across a ProcessPoolExecutor.
+
+    Each worker process receives the compiled config once, when it starts,
+        & builds its own Tokenizer from it. Neither Excel nor the disk cache is read by workers.
+    Expressions are sent to workers in chunks of chunksize expressions,
+        & results are streamed back in the same order as the expressions,
+        with at most max_pending chunks in flight, so memory stays bounded
+        no matter how long the input is.
+
+    The pool is started on first use & kept until close() (or the end of a with block),
+        so it can be reused for several corpora.
+
+    Example:
+
+        with BulkTokenizer(workers=4) as bulk:
+            for tokens in bulk.tokenize(expressions):
+                ...
+
+    """
+
+
+    def __init__(self, config_file=_config_file, config=None, workers=None, chunksize=None,
+                 lexer_engine='legacy', max_pending=None):
+        """Instantiate a bulk tokenizer. No processes are started until tokenize() is called.
+        workers defaults to the number of CPUs.
+        chunksize defaults to an automatic size (see suggest_chunksize()).
+        max_pending defaults to 4 chunks per worker."""
+
+        if config is None:
+            config = load_config(config_file)
+        self.config = config
+
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.lexer_engine = lexer_engine
+        self.max_pending = max_pending or 4 * self.workers
+
+        self._pool = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def close(self):
+        """Shut the worker processes down."""
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+    def pool(self):
+        """Return the process pool, starting it if needed."""
+
+        if self._pool is None:
+            self._pool = worker_pool(self.workers, _build_tokenizer,
+                                     self.config.to_dict(), self.lexer_engine)
+        return self._pool
+
+
+    def tokenize(self, expressions):
+        """
+        Tokenize every expression on the process pool.
+        Yield the list of tokens of each expression, in the same order as the expressions.
+
+        Input: iterable of str
+        Output: generator of lists of tokens
+        """
+
+        chunksize = self.chunksize
+        if chunksize is None:
+            try:
+                chunksize = suggest_chunksize(len(expressions), self.workers)
+            except TypeError:
+                chunksize = suggest_chunksize(None, self.workers)
+
+        for tokens in map_chunks(self.pool(), _tokenize_chunk, expressions,
+                                 chunksize, self.max_pending):
+            yield tokens
+
+
+
+def tokenize_bulk(expressions, workers=None, chunksize=None, config=None,
+                  lexer_engine='legacy'):
+    """
+    Tokenize every expression on a temporary pool of processes (see BulkTokenizer).
+    Yield the list of tokens of each expression, in the same order as the expressions.
+
+    Input: iterable of str
+    Output: generator of lists of tokens
+    """
+
+    with BulkTokenizer(config=config, workers=workers, chunksize=chunksize,
+                       lexer_engine=lexer_engine) as bulk:
+        for tokens in bulk.tokenize(expressions):
+            yield tokens
+
+
+def suggest_chunksize(count, workers):
+    """
+    Return a chunk size that gives each worker about 8 chunks of a corpus of count expressions:
+        large enough to amortise the cost of sending a chunk to a process,
+        small enough to keep all workers busy until the end.
+    Without a count (e.g. for a generator of expressions), return a fixed 256.
+
+    Input: int or None, int
+    Output: int
+    """
+
+    if count is None:
+        return 256
+
+    return max(16, min(4096, -(-count // (workers * 8))))
+
+
+def worker_pool(workers, build, *args):
+    """
+    Start a ProcessPoolExecutor whose worker processes each call build(*args) once, when they start.
+    Functions run on the pool get what build() returned with worker().
+    build must be picklable (a module-level function), & so must args:
+        send a config as CompiledConfig.to_dict(), not as a CompiledConfig.
+
+    Input: int, callable, picklable args
+    Output: ProcessPoolExecutor
+    """
+
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(build,) + args)
+
+
+def worker():
+    """Return the object built by the worker_pool() initializer of this worker process."""
+
+    return _worker
+
+
+def map_chunks(pool, function, items, chunksize, max_pending, *args):
+    """
+    Call function(chunk, *args) on the pool for each chunk of chunksize items.
+    function returns a list with 1 result per item of its chunk.
+    Yield the results, in the same order as the items, with at most max_pending chunks in flight,
+        so memory stays bounded no matter how long items is.
+
+    Input: Executor, callable, iterable, int, int, args of function
+    Output: generator of results
+    """
+
+    items = iter(items)
+    pending = deque()
+
+    while True:
+        while len(pending) < max_pending:
+            chunk = list(islice(items, chunksize))
+            if not chunk:
+                break
+            pending.append(pool.submit(function, chunk, *args))
+
+        if not pending:
+            return
+
+        yield from pending.popleft().result()
+
+
+def _init_worker(build, *args):
+    """Build the object a worker process works with (see worker_pool())."""
+
+    global _worker
+    _worker = build(*args)
+
+
+def _build_tokenizer(config_data, lexer_engine):
+    """Build the Tokenizer of a worker process from the compiled config sent to it."""
+
+    return Tokenizer(config=CompiledConfig.from_dict(config_data), lexer_engine=lexer_engine)
+
+
+def _tokenize_chunk(expressions):
+    """Tokenize a chunk of expressions in a worker process."""
+
+    tokenize = worker().tokenize
+    return [tokenize(expression) for expression in expressions]
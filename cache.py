@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded in-memory caches used by PyLex.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    """
+    LRUCache is a bounded, least-recently-used cache with hit/miss/eviction counters.
+
+    Once maxsize entries are held, storing a new key evicts the entry
+        that was read or written least recently.
+    A maxsize of None makes the cache unbounded; a maxsize of 0 disables it.
+
+    Example:
+        cache = LRUCache(maxsize=2)
+        cache.put('identifier', ('...',))
+        cache.get('identifier')   -> ('...',)   (hit)
+        cache.get('name')         -> None       (miss)
+        cache.stats()             -> {'hits': 1, 'misses': 1, 'evictions': 0, ...}
+
+    """
+
+
+    def __init__(self, maxsize=256):
+        """Instantiate an empty cache holding at most maxsize entries."""
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key, default=None):
+        """Return the value cached for key (marking it as recently used), or default."""
+
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+
+    def put(self, key, value):
+        """Cache value under key, evicting the least recently used entries if full."""
+
+        if self.maxsize == 0:
+            return
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+
+    def discard(self, key):
+        """Remove key from the cache if it is there."""
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+    def clear(self):
+        """Remove every entry. The counters are kept."""
+
+        with self._lock:
+            self._entries.clear()
+
+
+    def items(self):
+        """Return a list of the (key, value) entries, least recently used first.
+        Reading it does not count as a hit nor change the order."""
+
+        with self._lock:
+            return list(self._entries.items())
+
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def stats(self):
+        """Return the cache counters as a dict."""
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
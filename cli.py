@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Batch command line: python -m pylex [files...]
+
+Reads 1 token name or raw expression per line, from the files given or from stdin,
+    & writes 1 JSON line per input to stdout, in input order, as soon as it is ready:
+
+    {"input": "name", "kind": "token", "definition": "lc_letter (lc_letter | '_')*",
+     "tokens": [{"pylang_token": "lc_letter"}, ...], "normal_form": ["a…z", " ", ...],
+     "seconds": 0.0001}
+
+A line is read as a token name if it is one (--mode auto, the default), else as an expression.
+For an expression, "normal_form" is the expression with every pylang token in it evaluated.
+An input that cannot be evaluated gets an "error" instead of a "normal_form".
+
+With --cache, tokens & normal forms are kept in a persistent on-disk cache (see persistent.py),
+    shared by every run & every worker, & the cache's hit rate is written to stderr at the end.
+
+Examples:
+    python -m pylex < token_names.txt
+    python -m pylex --all --workers 4 > normal_forms.jsonl
+    echo "lc_letter*" | python -m pylex --mode expression
+    python -m pylex --all --cache ~/.cache/pylex.sqlite3 > normal_forms.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from pylex import _config_file
+from .bulk import map_chunks, worker, worker_pool
+from .config import CompiledConfig, load_config
+from .expansion import ExpansionCycleError
+from .persistent import PersistentCache
+from .pylex import PyLex
+
+
+def evaluate(pylex, text, mode='auto'):
+    """
+    Evaluate 1 input: look a token up, tokenize its definition & compute its normal form,
+        or tokenize an expression & evaluate every pylang token in it.
+
+    Input: PyLex, str, 'auto', 'token' or 'expression'
+    Output: dict (JSON-able)
+    """
+
+    start = perf_counter()
+
+    if mode == 'token' or (mode == 'auto' and text in pylex.config.token_name_set):
+        result = {'input': text, 'kind': 'token'}
+        expression = pylex.definition(text)
+        result['definition'] = expression
+    else:
+        result = {'input': text, 'kind': 'expression'}
+        expression = text
+
+    try:
+        if expression is None and text in pylex.config.token_name_set:
+            raise KeyError('The token {!r} has a blank definition.'.format(text))
+        if expression is None:
+            raise KeyError('The token name {!r} is not found in the list of tokens '\
+                           'used by the Python lexical analyzer.'.format(text))
+        result['tokens'] = pylex.tokenize(expression)
+
+        if result['kind'] == 'token':
+            result['normal_form'] = pylex.normalize(text)
+        else:
+            normal_form = []
+            for segment, is_pylang_token in pylex.expansion.tokenize(expression):
+                if is_pylang_token:
+                    normal_form.extend(pylex.normalize(segment))
+                else:
+                    normal_form.append(segment)
+            result['normal_form'] = normal_form
+
+    except (KeyError, ExpansionCycleError) as error:
+        result['error'] = error.args[0] if error.args else str(error)
+
+    result['seconds'] = perf_counter() - start
+    return result
+
+
+def run(lines, output, pylex, mode='auto', workers=1, parallel='processes', chunksize=64):
+    """
+    Evaluate every line & write its JSON line to output, in input order.
+    Output is flushed after every chunk of chunksize lines.
+    With workers > 1, chunks are evaluated on a pool of processes (or threads),
+        with at most 2 chunks per worker in flight.
+
+    Input: iterable of str, text file, PyLex
+    Output: number of inputs evaluated
+    """
+
+    inputs = (line.rstrip('\r\n') for line in lines)
+    inputs = (text for text in inputs if text.strip())
+    count = 0
+
+    if workers == 1:
+        for text in inputs:
+            output.write(json.dumps(evaluate(pylex, text, mode), ensure_ascii=False) + '\n')
+            count += 1
+            if count % chunksize == 0:
+                output.flush()
+        output.flush()
+        return count
+
+    if parallel == 'processes':
+        persistent = pylex.persistent_cache
+        cache_args = None if persistent is None else (persistent.path, persistent.max_bytes)
+        pool = worker_pool(workers, _build_pylex, pylex.config.to_dict(), cache_args)
+        evaluate_chunk = _evaluate_chunk
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        evaluate_chunk = lambda chunk, mode: [evaluate(pylex, text, mode) for text in chunk]
+
+    with pool:
+        for result in map_chunks(pool, evaluate_chunk, inputs, chunksize, 2 * workers, mode):
+            output.write(json.dumps(result, ensure_ascii=False) + '\n')
+            count += 1
+            if count % chunksize == 0:
+                output.flush()
+        output.flush()
+
+    return count
+
+
+def _build_pylex(config_data, cache_args=None):
+    """Build the PyLex of a worker process from the compiled config sent to it,
+        opening its own connection to the persistent cache if there is one."""
+
+    persistent = None if cache_args is None else PersistentCache(*cache_args)
+    return PyLex(config=CompiledConfig.from_dict(config_data), interactive=False,
+                 persistent_cache=persistent)
+
+
+def _evaluate_chunk(chunk, mode):
+    """Evaluate a chunk of inputs in a worker process."""
+
+    pylex = worker()
+    return [evaluate(pylex, text, mode) for text in chunk]
+
+
+def _read_lines(paths):
+    """Yield the lines of every file in paths ('-' for stdin), 1 file after the other."""
+
+    for path in paths:
+        if path == '-':
+            yield from sys.stdin
+        else:
+            with open(path, encoding='utf-8') as source:
+                yield from source
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m pylex',
+        description='Look up & evaluate token names or expressions, 1 JSON line per input.')
+    parser.add_argument('files', nargs='*', default=['-'],
+                        help="files of 1 input per line ('-' or nothing for stdin)")
+    parser.add_argument('--all', action='store_true',
+                        help='evaluate every token in the config instead of reading inputs')
+    parser.add_argument('--mode', choices=('auto', 'token', 'expression'), default='auto',
+                        help='read inputs as token names, expressions, or whichever fits')
+    parser.add_argument('--config', default=_config_file, help='path of PyLex_configs.xlsx')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='evaluate inputs in parallel (0 for 1 per CPU)')
+    parser.add_argument('--parallel', choices=('processes', 'threads'), default='processes')
+    parser.add_argument('--chunksize', type=int, default=64,
+                        help='inputs per chunk sent to a worker & per flush of the output')
+    parser.add_argument('--cache', metavar='PATH',
+                        help="persistent cache file ('default' for the one next to the config)")
+    parser.add_argument('--cache-mb', type=float, default=64.0,
+                        help='size of the persistent cache, in MB')
+    args = parser.parse_args(argv)
+
+    persistent = None
+    if args.cache:
+        persistent = PersistentCache(None if args.cache == 'default' else args.cache,
+                                     max_bytes=int(args.cache_mb * (1 << 20)),
+                                     config_file=args.config)
+
+    pylex = PyLex(config=load_config(args.config), interactive=False, persistent_cache=persistent)
+    workers = args.workers or os.cpu_count() or 1
+
+    if args.all:
+        lines = pylex.config.token_names
+    else:
+        lines = _read_lines(args.files)
+
+    try:
+        run(lines, sys.stdout, pylex, args.mode, workers, args.parallel, args.chunksize)
+    except BrokenPipeError:
+        # The reader went away (e.g. | head): stop quietly. Output still buffered for stdout
+        #   is sent to devnull, so flushing it at exit raises nothing.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+    if persistent is not None:
+        # With worker processes, the lookups are counted in the workers, not here.
+        sys.stderr.write('persistent cache: {}\n'.format(json.dumps(persistent.stats())))
+
+    return 0
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed whole-grammar closure: every normal form plus a reverse dependency index.
+"""
+
+import os
+
+from pylex import _config_file
+from .config import default_cache_dir, dump_cache, load_config, read_cache
+from .expansion import ExpansionEngine
+from .tokenizer import Tokenizer
+
+
+class GrammarIndex(object):
+
+    """
+    GrammarIndex is an offline build of the whole PyLex_configs sheet.
+
+    Building it:
+        1. Tokenizes every expression_string once.
+        2. Builds the dependency graph: token -> the pylang tokens its definition refers to.
+        3. Orders the tokens topologically (dependencies first)
+            & computes every normal form in that order, reusing those already computed.
+        4. Builds the reverse index: token -> the tokens whose definitions refer to it.
+
+    Afterwards, the normal form of any token is a dict lookup (normal_form()),
+        & the reverse index answers impact queries (dependents_of(), impacted_by()):
+        which tokens must be re-evaluated when a definition in the config changes.
+
+    Tokens that cannot be evaluated (blank definitions, references to undefined tokens
+        & cycles) are listed in errors instead of normal_forms.
+
+    The index is persisted next to the config cache, keyed on the config's contents.
+    See: load_index().
+
+    Example:
+
+        index = load_index()
+        index.normal_form('name')          -> ('a…z', ' ', '(', 'a…z', ...)
+        index.dependents_of('lc_letter')   -> frozenset({'name'})
+        index.impacted_by(['id_start'])    -> {'id_start'}
+
+    """
+
+
+    def __init__(self, dependencies, normal_forms, errors, order, content_hash=None):
+        """Instantiate an index from already-computed plain data."""
+
+        self.dependencies = dict(dependencies)
+        self.normal_forms = dict(normal_forms)
+        self.errors = dict(errors)
+        self.order = tuple(order)
+        self.content_hash = content_hash
+
+        dependents = {}
+        for token_name, token_dependencies in self.dependencies.items():
+            for dependency in token_dependencies:
+                dependents.setdefault(dependency, []).append(token_name)
+        self.dependents = {token_name: tuple(names) for token_name, names in dependents.items()}
+
+
+    @classmethod
+    def build(cls, config, tokenizer=None):
+        """
+        Build the index for a compiled config.
+
+        Input: CompiledConfig
+        Output: GrammarIndex
+        """
+
+        if tokenizer is None:
+            tokenizer = Tokenizer(config=config)
+
+        engine = ExpansionEngine(tokenizer, config.expressions)
+
+        dependencies = {}
+        errors = {}
+
+        for token_name in config.token_names:
+            if config.expressions.get(token_name) is None:
+                errors[token_name] = 'blank definition'
+                continue
+            token_dependencies = []
+            for text, is_pylang_token in engine.token_segments(token_name):
+                if is_pylang_token and text not in token_dependencies:
+                    token_dependencies.append(text)
+            dependencies[token_name] = tuple(token_dependencies)
+
+        order = topological_order(dependencies)
+
+        normal_forms = {}
+        for token_name in order:
+            missing = [dependency for dependency in dependencies[token_name]
+                       if dependency not in normal_forms]
+            if missing:
+                errors[token_name] = 'refers to tokens that cannot be evaluated: {}'\
+                                     .format(', '.join(missing))
+                continue
+            parts = []
+            for text, is_pylang_token in engine.token_segments(token_name):
+                if is_pylang_token:
+                    parts.extend(normal_forms[text])
+                else:
+                    parts.append(text)
+            normal_forms[token_name] = tuple(parts)
+
+        ordered = set(order)
+        for token_name in dependencies:
+            if token_name not in ordered:
+                errors[token_name] = 'part of, or refers to, a recursive definition'
+
+        return cls(dependencies, normal_forms, errors, order, config.content_hash())
+
+
+    def normal_form(self, token_name):
+        """
+        Return the precomputed normal form of a pylang token.
+        Raise KeyError if the token is unknown or could not be evaluated.
+
+        Input: str (token name)
+        Output: tuple of lexemes
+        """
+
+        try:
+            return self.normal_forms[token_name]
+        except KeyError:
+            reason = self.errors.get(token_name, 'not in the config')
+            raise KeyError('The token {!r} has no normal form: {}'.format(token_name, reason))
+
+
+    def dependents_of(self, token_name, transitive=False):
+        """
+        Return the tokens whose definitions refer to token_name.
+        If transitive, also return the tokens that depend on those, & so on.
+
+        Input: str (token name)
+        Output: frozenset of token names
+        """
+
+        if not transitive:
+            return frozenset(self.dependents.get(token_name, ()))
+
+        found = set()
+        stack = [token_name]
+        while stack:
+            for dependent in self.dependents.get(stack.pop(), ()):
+                if dependent not in found:
+                    found.add(dependent)
+                    stack.append(dependent)
+        return frozenset(found)
+
+
+    def impacted_by(self, token_names):
+        """
+        Return every token whose normal form may change when the given tokens' definitions change:
+            the tokens themselves & everything that depends on them, directly or not.
+
+        Input: iterable of token names
+        Output: set of token names
+        """
+
+        impacted = set()
+        for token_name in token_names:
+            if token_name not in impacted:
+                impacted.add(token_name)
+                impacted.update(self.dependents_of(token_name, transitive=True))
+        return impacted
+
+
+    def to_dict(self):
+        """Return the index as a dict of plain Python data (suitable for pickling)."""
+
+        return {
+            'dependencies': self.dependencies,
+            'normal_forms': self.normal_forms,
+            'errors': self.errors,
+            'order': self.order,
+            'content_hash': self.content_hash,
+        }
+
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an index from the output of to_dict()."""
+
+        return cls(**data)
+
+
+    def save(self, path):
+        """Pickle the index to path. The file is replaced atomically."""
+
+        dump_cache(path, self.to_dict())
+
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index pickled by save().
+        Return None if the file is missing, unreadable or from another cache version.
+        """
+
+        data = read_cache(path)
+        if data is None:
+            return None
+
+        return cls.from_dict(data)
+
+
+
+def topological_order(dependencies):
+    """
+    Order tokens so that every token comes after the tokens it depends on (Kahn's algorithm).
+    Dependencies on tokens outside the graph are ignored.
+    Tokens on, or depending on, a cycle are left out.
+
+    Input: dict of token_name -> iterable of token names
+    Output: list of token names
+    """
+
+    waiting_on = {}
+    dependents = {}
+
+    for token_name, token_dependencies in dependencies.items():
+        inside = [dependency for dependency in set(token_dependencies)
+                  if dependency in dependencies]
+        waiting_on[token_name] = len(inside)
+        for dependency in inside:
+            dependents.setdefault(dependency, []).append(token_name)
+
+    ready = [token_name for token_name in dependencies if waiting_on[token_name] == 0]
+    order = []
+
+    while ready:
+        token_name = ready.pop()
+        order.append(token_name)
+        for dependent in dependents.get(token_name, ()):
+            waiting_on[dependent] -= 1
+            if waiting_on[dependent] == 0:
+                ready.append(dependent)
+
+    return order
+
+
+def load_index(config_file=_config_file, config=None, cache_dir=None):
+    """
+    Return the GrammarIndex for a config, building it only if no up-to-date one is on disk.
+    The index is cached in the same dir as the compiled config (see config.load_config()).
+
+    Input: path to an xlsx config file, or an already compiled config
+    Output: GrammarIndex
+    """
+
+    if config is None:
+        config = load_config(config_file, cache_dir=cache_dir)
+    if cache_dir is None:
+        cache_dir = default_cache_dir(config_file)
+
+    content_hash = config.content_hash()
+    cache_path = os.path.join(cache_dir, 'PyLex_index.{}.pickle'.format(content_hash[:16]))
+
+    index = GrammarIndex.load(cache_path)
+
+    if index is None or index.content_hash != content_hash:
+        index = GrammarIndex.build(config)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            index.save(cache_path)
+        except OSError:
+            pass
+
+    return index
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled, cached snapshot of the PyLex config workbook.
+"""
+
+import hashlib
+import os
+import pickle
+from time import perf_counter
+
+from pylex import _config_file
+
+
+# Bump whenever the layout of CompiledConfig changes so stale disk caches are ignored.
+_CACHE_VERSION = 1
+
+# In-process snapshots, keyed on (path, sheet names) and validated by file mtime & size.
+_snapshots = {}
+
+
+class CompiledConfig(object):
+
+    """
+    CompiledConfig is a read-only snapshot of everything Lexer, Tokenizer and PyLex
+        need from the config workbook (PyLex_configs.xlsx).
+
+    Reading the workbook with pandas is by far the most expensive thing PyLex does.
+    CompiledConfig reads each of the 3 sheets once and reduces them to plain
+        dicts, frozensets & tuples that can be looked up in constant time.
+    Config values wrapped in double quotes in the workbook (e.g. '"..."')
+        are stored with the quotes stripped.
+
+    A compiled snapshot is pickled to a disk cache next to the workbook,
+        keyed on a hash of the workbook's contents.
+    Any later process (including worker processes) can then load the snapshot
+        without parsing Excel at all. See: load_config().
+
+    Lexer data:
+        delimiters:         frozenset of single delimiter chars
+        priority_char_seqs: tuple of priority sequences, in config row order
+
+    Tokenizer data:
+        operators:          dict of operator symbol -> operator_name
+        phrase_openers:     dict of operator_name -> bool
+        phrase_closers:     dict of operator_name -> operator_name that closes the phrase
+        phrase_names:       dict of operator_name -> name of the phrase it closes
+
+    PyLex data:
+        token_names:        tuple of pylang token names, in config row order
+        token_name_set:     frozenset of the same names
+        expressions:        dict of token_name -> expression (None if blank)
+
+    """
+
+
+    def __init__(self, delimiters, priority_char_seqs, operators, phrase_openers,
+                 phrase_closers, phrase_names, token_names, expressions, source_hash=None):
+        """Instantiate a snapshot from already-compiled plain data."""
+
+        self.delimiters = frozenset(delimiters)
+        self.priority_char_seqs = tuple(priority_char_seqs)
+
+        self.operators = dict(operators)
+        self.phrase_openers = dict(phrase_openers)
+        self.phrase_closers = dict(phrase_closers)
+        self.phrase_names = dict(phrase_names)
+
+        self.token_names = tuple(token_names)
+        self.token_name_set = frozenset(token_names)
+        self.expressions = dict(expressions)
+
+        self.source_hash = source_hash
+
+
+    @classmethod
+    def from_workbook(cls, config_file=_config_file,
+                      lexer_sheet_name="Lexer_configs",
+                      tokenizer_sheet_name="Tokenizer_configs",
+                      pylex_sheet_name="PyLex_configs"):
+        """
+        Parse the config workbook with pandas and compile it.
+        pandas (& openpyxl) are only imported here, so they are never loaded
+            when a cached snapshot is available.
+
+        Input: path to an xlsx config file
+        Output: CompiledConfig
+        """
+
+        import pandas as pd
+
+        lexer_df = pd.read_excel(config_file, lexer_sheet_name)
+        tokenizer_df = pd.read_excel(config_file, tokenizer_sheet_name)
+        pylex_df = pd.read_excel(config_file, pylex_sheet_name)
+
+        delimiters = [_unquote(value) for value in lexer_df.delimiter.values
+                      if _is_value(value)]
+        priority_char_seqs = [_unquote(value) for value in lexer_df.priority_char_seqs.values
+                              if _is_value(value)]
+
+        operators = {}
+        phrase_openers = {}
+        phrase_closers = {}
+        phrase_names = {}
+
+        for row in tokenizer_df.itertuples(index=False):
+            if not _is_value(row.operator_name):
+                continue
+            if _is_value(row.operator):
+                operators.setdefault(_unquote(row.operator), row.operator_name)
+            phrase_openers[row.operator_name] = bool(row.phrase_opener)
+            phrase_closers[row.operator_name] = row.phrase_closer
+            phrase_names[row.operator_name] = row.phrase_name
+
+        token_names = []
+        expressions = {}
+
+        for row in pylex_df.itertuples(index=False):
+            if not _is_value(row.token_name):
+                continue
+            token_names.append(row.token_name)
+            if _is_value(row.expression_string):
+                expressions[row.token_name] = row.expression_string[1:-1]
+            else:
+                expressions[row.token_name] = None
+
+        return cls(delimiters, priority_char_seqs, operators, phrase_openers,
+                   phrase_closers, phrase_names, token_names, expressions,
+                   source_hash=_hash_file(config_file))
+
+
+    def to_dict(self):
+        """Return the snapshot as a dict of plain Python data (suitable for pickling)."""
+
+        return {
+            'delimiters': self.delimiters,
+            'priority_char_seqs': self.priority_char_seqs,
+            'operators': self.operators,
+            'phrase_openers': self.phrase_openers,
+            'phrase_closers': self.phrase_closers,
+            'phrase_names': self.phrase_names,
+            'token_names': self.token_names,
+            'expressions': self.expressions,
+            'source_hash': self.source_hash,
+        }
+
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a snapshot from the output of to_dict()."""
+
+        return cls(**data)
+
+
+    def content_hash(self):
+        """
+        Return a sha1 hex digest of the compiled data.
+        Unlike source_hash, it only changes when something PyLex reads has changed,
+            and it is the same in every process.
+        """
+
+        content = (
+            sorted(self.delimiters),
+            self.priority_char_seqs,
+            sorted(self.operators.items()),
+            sorted(self.phrase_openers.items()),
+            sorted(self.phrase_closers.items()),
+            sorted(self.phrase_names.items()),
+            self.token_names,
+            sorted(self.expressions.items()),
+        )
+        return hashlib.sha1(repr(content).encode()).hexdigest()
+
+
+    def save(self, path):
+        """Pickle the snapshot to path. The file is replaced atomically."""
+
+        dump_cache(path, self.to_dict())
+
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a snapshot pickled by save().
+        Return None if the file is missing, unreadable or from another cache version.
+        """
+
+        data = read_cache(path)
+        if data is None:
+            return None
+
+        return cls.from_dict(data)
+
+
+
+def load_config(config_file=_config_file,
+                lexer_sheet_name="Lexer_configs",
+                tokenizer_sheet_name="Tokenizer_configs",
+                pylex_sheet_name="PyLex_configs",
+                cache_dir=None, stats=None, refresh=False):
+    """
+    Return the CompiledConfig for a config workbook, parsing Excel only when necessary.
+
+    Lookup order:
+        1. The in-process snapshot, if the workbook's mtime & size are unchanged.
+        2. The disk cache, keyed on a hash of the workbook's contents.
+        3. A fresh parse of the workbook, which is then written to the disk cache.
+
+    The disk cache lives in a __pycache__ dir next to the workbook unless cache_dir is given.
+    If the cache dir is not writable, the snapshot is simply kept in memory.
+    If refresh, the in-process snapshot is skipped (e.g. when the workbook was rewritten
+        without its mtime & size changing).
+    stats, a Stats object (see stats.py), records which of the 3 paths was taken & its time.
+
+    Input: path to an xlsx config file
+    Output: CompiledConfig
+    """
+
+    config_file = os.path.abspath(config_file)
+    sheet_names = (lexer_sheet_name, tokenizer_sheet_name, pylex_sheet_name)
+    key = (config_file,) + sheet_names
+
+    stat = os.stat(config_file)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    snapshot = _snapshots.get(key)
+    if snapshot is not None and snapshot[0] == stamp and not refresh:
+        if stats is not None:
+            stats.count('config.memory_hits')
+        return snapshot[1]
+
+    start = perf_counter()
+
+    cache_path = _cache_path(config_file, sheet_names, cache_dir)
+    config = CompiledConfig.load(cache_path)
+
+    if config is not None and stats is not None:
+        stats.add_time('config.disk_cache_load', perf_counter() - start)
+
+    if config is None:
+        config = CompiledConfig.from_workbook(config_file, *sheet_names)
+        if stats is not None:
+            stats.add_time('config.xlsx_parse', perf_counter() - start)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            config.save(cache_path)
+        except OSError:
+            pass
+
+    _snapshots[key] = (stamp, config)
+    return config
+
+
+
+def read_sheet(config_file, sheet_name):
+    """
+    Read 1 sheet of the config workbook as a pandas DataFrame, uncompiled.
+    Only kept for the deprecated DataFrame attributes of Lexer, Tokenizer & PyLex.
+
+    Input: path to an xlsx config file, sheet name
+    Output: DataFrame
+    """
+
+    import pandas as pd
+
+    return pd.read_excel(config_file, sheet_name)
+
+
+def dump_cache(path, data):
+    """Pickle data to a cache file, tagged with the cache version. Replace it atomically."""
+
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'wb') as cache:
+        pickle.dump((_CACHE_VERSION, data), cache, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def read_cache(path):
+    """
+    Return the data pickled by dump_cache().
+    Return None if the file is missing, unreadable or from another cache version.
+    """
+
+    try:
+        with open(path, 'rb') as cache:
+            version, data = pickle.load(cache)
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        return None
+
+    if version != _CACHE_VERSION:
+        return None
+
+    return data
+
+
+def default_cache_dir(config_file=_config_file):
+    """Return the dir disk caches are kept in by default: __pycache__ next to the workbook."""
+
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), '__pycache__')
+
+
+def _cache_path(config_file, sheet_names, cache_dir=None):
+    """Return the disk cache path for a workbook, based on its contents & sheet names."""
+
+    digest = hashlib.sha1(_hash_file(config_file).encode())
+    for sheet_name in sheet_names:
+        digest.update(b'\0' + sheet_name.encode())
+
+    if cache_dir is None:
+        cache_dir = default_cache_dir(config_file)
+
+    file_name = os.path.splitext(os.path.basename(config_file))[0]
+    return os.path.join(cache_dir, '{}.{}.pickle'.format(file_name, digest.hexdigest()[:16]))
+
+
+def _hash_file(path):
+    """Return the sha1 hex digest of a file's contents."""
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _is_value(value):
+    """Return False for blank cells (NaN/None) read from the workbook."""
+
+    return isinstance(value, str)
+
+
+def _unquote(value):
+    """Strip the double quotes wrapped around a config value: '"..."' -> '...'."""
+
+    return value[1:-1]
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Normal forms held as a compressed DAG: each sub-token expansion stored once & referenced.
+"""
+
+from bisect import bisect_right
+
+
+class NormalFormNode(object):
+
+    """
+    NormalFormNode is the normal form of 1 pylang token, without materialising it.
+
+    Its parts are lexemes (str) & other nodes: the normal forms of the sub-tokens
+        its definition refers to. A sub-token referred to many times, anywhere in the grammar,
+        is 1 node referred to many times, so the DAG grows with the size of the definitions,
+        not with the size of the normal forms.
+    Nodes are hash-consed (see NodeTable): 2 tokens with the same parts share 1 node.
+
+    The length of the normal form (in lexemes & in chars) is computed when the node is built,
+        from the lengths of its parts. Lexemes are only produced when iterated over,
+        & any single lexeme or slice can be reached without expanding what comes before it.
+
+    Example:
+
+        node = pylex.normalize_dag('name')
+        len(node)          -> 10       (lexemes in the normal form)
+        node.size          -> 24       (chars in the normal form)
+        node[3]            -> 'a…z'
+        list(node)         -> ['a…z', ' ', '(', 'a…z', ' ', '|', ' ', "'_'", ')', '*']
+        ''.join(node.iter_range(0, 3))
+
+    """
+
+    __slots__ = ('parts', 'length', 'size', 'offsets')
+
+
+    def __init__(self, parts):
+        """Instantiate a node from a tuple of lexemes & nodes."""
+
+        self.parts = parts
+
+        offsets = []
+        length = 0
+        size = 0
+        for part in parts:
+            offsets.append(length)
+            if part.__class__ is str:
+                length += 1
+                size += len(part)
+            else:
+                length += part.length
+                size += part.size
+
+        self.offsets = offsets     # Index of the first lexeme of each part
+        self.length = length
+        self.size = size
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __iter__(self):
+        return self.iter_range(0, self.length)
+
+
+    def __getitem__(self, index):
+        """Return 1 lexeme of the normal form, walking down only the nodes that hold it."""
+
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step != 1:
+                return list(self.iter_range(start, stop))[::step]
+            return list(self.iter_range(start, stop))
+
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError('normal form index out of range')
+
+        node = self
+        while True:
+            i = bisect_right(node.offsets, index) - 1
+            part = node.parts[i]
+            if part.__class__ is str:
+                return part
+            index -= node.offsets[i]
+            node = part
+
+
+    def iter_range(self, start=0, stop=None):
+        """
+        Yield the lexemes of the normal form from index start up to stop, lazily & depth first.
+        Parts that end before start are skipped whole, without being expanded.
+        """
+
+        if stop is None or stop > self.length:
+            stop = self.length
+        if start < 0:
+            start = 0
+        remaining = stop - start
+        if remaining <= 0:
+            return
+
+        i = bisect_right(self.offsets, start) - 1
+        skip = start - self.offsets[i]
+        stack = [(self.parts, i)]
+
+        while stack:
+            parts, i = stack.pop()
+            while i < len(parts):
+                part = parts[i]
+                i += 1
+                if part.__class__ is str:
+                    yield part
+                    remaining -= 1
+                    if not remaining:
+                        return
+                    continue
+                if skip:
+                    j = bisect_right(part.offsets, skip) - 1
+                    skip -= part.offsets[j]
+                else:
+                    j = 0
+                stack.append((parts, i))
+                parts, i = part.parts, j
+
+            skip = 0
+
+
+    def flatten(self):
+        """Materialise the whole normal form as a tuple of lexemes."""
+
+        return tuple(self)
+
+
+    def count_nodes(self):
+        """Return the number of distinct nodes reachable from this one (itself included)."""
+
+        seen = {id(self)}
+        stack = [self]
+        while stack:
+            for part in stack.pop().parts:
+                if part.__class__ is not str and id(part) not in seen:
+                    seen.add(id(part))
+                    stack.append(part)
+        return len(seen)
+
+
+    def __repr__(self):
+        return '<NormalFormNode: {} lexemes, {} parts>'.format(self.length, len(self.parts))
+
+
+
+class NodeTable(object):
+
+    """
+    NodeTable hash-conses normal form nodes: building a node with the same parts
+        as an existing node returns the existing node.
+    A node made of a single other node is that node.
+    """
+
+
+    def __init__(self):
+        self.nodes = {}
+
+
+    def node(self, parts):
+        """Return the node for a sequence of lexemes & nodes."""
+
+        parts = tuple(parts)
+        if len(parts) == 1 and parts[0].__class__ is not str:
+            return parts[0]
+
+        # Nodes compare by identity, so equal keys mean equal parts.
+        node = self.nodes.get(parts)
+        if node is None:
+            node = self.nodes.setdefault(parts, NormalFormNode(parts))
+        return node
+
+
+    def __len__(self):
+        return len(self.nodes)
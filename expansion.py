@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental expansion of pylang token definitions.
+"""
+
+from time import perf_counter
+
+from .cache import LRUCache
+from .dag import NodeTable
+from .tokens import PYLANG_TOKEN
+
+
+class ExpansionCycleError(ValueError):
+
+    """Raised when a pylang token's definition refers back to itself, directly or not."""
+
+    def __init__(self, cycle):
+        self.cycle = tuple(cycle)
+        super().__init__('Recursive definition, the expansion would never end: {}'\
+                         .format(' -> '.join(self.cycle)))
+
+
+
+class ExpansionEngine(object):
+
+    """
+    ExpansionEngine expands pylang tokens into their definitions without re-tokenizing.
+
+    An expression is held as a list of segments: (text, is_pylang_token) pairs,
+        1 per token produced by the tokenizer.
+    The definition of each pylang token is tokenized only once, the first time it is needed,
+        & cached as a tuple of segments.
+    Substituting a pylang token then just splices its cached segments into place,
+        instead of concatenating strings & re-tokenizing the whole remainder every round.
+
+    Before any expansion, the token graph reachable from the expression is checked for cycles,
+        so a recursive definition raises ExpansionCycleError instead of expanding forever.
+
+    Example:
+
+        engine = ExpansionEngine(tokenizer, config.expressions)
+        segments = engine.tokenize('lc_letter*')       -> [('lc_letter', True), ('*', False)]
+        master_list = []
+        engine.substitute(segments, master_list)       -> [('a…z', False), ('*', False)]
+        engine.normal_form('name')                     -> ('a…z', ' ', '(', 'a…z', ...)
+        engine.normal_form_dag('name')                 -> <NormalFormNode: 10 lexemes, ...>
+
+    """
+
+
+    def __init__(self, tokenizer, expressions, normal_forms=None, stats=None):
+        """Instantiate an engine over a tokenizer & a dict of token_name -> expression.
+        Fully evaluated normal forms are kept in normal_forms (an LRUCache).
+        stats, a Stats object (see stats.py), switches instrumentation on."""
+
+        self.tokenizer = tokenizer
+        self.expressions = expressions
+        self.stats = stats
+
+        if normal_forms is None:
+            normal_forms = LRUCache(None)
+        self.normal_forms = normal_forms
+
+        self.definitions = {}    # token_name -> tuple of segments
+
+        self.dags = {}           # token_name -> NormalFormNode (see normal_form_dag())
+        self.node_table = NodeTable()
+
+
+    def tokenize(self, expression):
+        """
+        Tokenize an expression into segments.
+
+        Input: str
+        Output: list of (text, is_pylang_token) pairs
+        """
+
+        token_buffer = self.tokenizer.tokenize_buffer(expression)
+
+        return [(expression[start:end], kind == PYLANG_TOKEN) for kind, start, end
+                in zip(token_buffer.kinds, token_buffer.starts, token_buffer.ends)]
+
+
+    def token_segments(self, token_name):
+        """
+        Return the tokenized definition of a pylang token. Each definition is tokenized once.
+        Raise KeyError if the token has no definition.
+
+        Input: str (token name)
+        Output: tuple of (text, is_pylang_token) pairs
+        """
+
+        segments = self.definitions.get(token_name)
+
+        if segments is None:
+            expression = self.expressions.get(token_name)
+            if expression is None:
+                raise KeyError('The token name {!r} is not found in the list of tokens '\
+                               'used by the Python lexical analyzer.'.format(token_name))
+            segments = tuple(self.tokenize(expression))
+            self.definitions[token_name] = segments
+            if self.stats is not None:
+                self.stats.count('definitions_tokenized')
+
+        return segments
+
+
+    def check_cycles(self, segments):
+        """
+        Walk every pylang token reachable from segments, depth first.
+        Raise ExpansionCycleError if any of them refers back to itself.
+
+        Input: iterable of (text, is_pylang_token) pairs
+        """
+
+        done = set()
+
+        for text, is_pylang_token in segments:
+            if not is_pylang_token or text in done:
+                continue
+
+            path = [text]
+            stack = [iter(self.token_segments(text))]
+
+            while stack:
+                for sub_text, sub_is_pylang_token in stack[-1]:
+                    if not sub_is_pylang_token or sub_text in done:
+                        continue
+                    if sub_text in path:
+                        raise ExpansionCycleError(path[path.index(sub_text):] + [sub_text])
+                    path.append(sub_text)
+                    stack.append(iter(self.token_segments(sub_text)))
+                    break
+                else:
+                    done.add(path.pop())
+                    stack.pop()
+
+
+    def substitute(self, segments, master_list, look_up=None):
+        """
+        Run 1 evaluation round over segments.
+        Segments before the first pylang token are final: their text goes to master_list.
+        From the first pylang token on, every pylang token is replaced by its definition.
+        look_up, if given, is called with each pylang token substituted (e.g. to print it).
+
+        Input: list of segments, list to collect final lexemes in
+        Output: list of segments (the remainder, empty once fully evaluated)
+        """
+
+        stats = self.stats
+        if stats is not None:
+            start = perf_counter()
+
+        remainder = []
+        i = 0
+        length = len(segments)
+
+        while i < length and not segments[i][1]:
+            master_list.append(segments[i][0])
+            i += 1
+
+        for text, is_pylang_token in segments[i:]:
+            if is_pylang_token:
+                if look_up is not None:
+                    look_up(text)
+                remainder.extend(self.token_segments(text))
+            else:
+                remainder.append((text, is_pylang_token))
+
+        if stats is not None:
+            stats.add_time('expansion_round', perf_counter() - start)
+            stats.count('expansion_rounds')
+
+        return remainder
+
+
+    def normal_form(self, token_name):
+        """
+        Evaluate a pylang token to its normal form, depth first, with no recursion limit.
+        Normal forms of the token & of all of its sub-tokens are cached in normal_forms.
+        Raise ExpansionCycleError for a recursive definition.
+
+        Input: str (token name)
+        Output: tuple of lexemes
+        """
+
+        normal_form = self.normal_forms.get(token_name)
+        if normal_form is not None:
+            return normal_form
+
+        path = [token_name]
+        stack = [(iter(self.token_segments(token_name)), [])]
+
+        while True:
+            segments, parts = stack[-1]
+
+            for text, is_pylang_token in segments:
+                if not is_pylang_token:
+                    parts.append(text)
+                    continue
+                normal_form = self.normal_forms.get(text)
+                if normal_form is not None:
+                    parts.extend(normal_form)
+                    continue
+                if text in path:
+                    raise ExpansionCycleError(path[path.index(text):] + [text])
+                path.append(text)
+                stack.append((iter(self.token_segments(text)), []))
+                break
+
+            else:
+                normal_form = tuple(parts)
+                self.normal_forms.put(path.pop(), normal_form)
+                stack.pop()
+                if not stack:
+                    return normal_form
+                stack[-1][1].extend(normal_form)
+
+
+    def normal_form_dag(self, token_name):
+        """
+        Evaluate a pylang token to its normal form held as a compressed DAG (see dag.py):
+            every sub-token's normal form is built once, as 1 node, & referenced wherever
+            the sub-token is used. Nothing is flattened: the size of the DAG is that of
+            the definitions, however big the normal form.
+        Nodes of the token & of all of its sub-tokens are kept in dags.
+        Raise ExpansionCycleError for a recursive definition.
+
+        Input: str (token name)
+        Output: NormalFormNode
+        """
+
+        dags = self.dags
+        node = dags.get(token_name)
+        if node is not None:
+            return node
+
+        path = [token_name]
+        stack = [(iter(self.token_segments(token_name)), [])]
+
+        while True:
+            segments, parts = stack[-1]
+
+            for text, is_pylang_token in segments:
+                if not is_pylang_token:
+                    parts.append(text)
+                    continue
+                node = dags.get(text)
+                if node is not None:
+                    parts.append(node)
+                    continue
+                if text in path:
+                    raise ExpansionCycleError(path[path.index(text):] + [text])
+                path.append(text)
+                stack.append((iter(self.token_segments(text)), []))
+                break
+
+            else:
+                node = self.node_table.node(parts)
+                dags[path.pop()] = node
+                stack.pop()
+                if not stack:
+                    return node
+                stack[-1][1].append(node)
+
+
+
+def segments_text(segments):
+    """Join segments back into the expression string they were tokenized from."""
+
+    return ''.join([text for text, is_pylang_token in segments])
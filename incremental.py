@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental re-lexing & re-tokenizing of an expression after a small edit.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from .tokens import LEXEME, TokenBuffer, kind_code
+
+
+class StreamChange(namedtuple('StreamChange', 'first old_stop new_stop start old_end new_end')):
+
+    """
+    The part of a token stream changed by an edit:
+        tokens[first:old_stop] of the old stream were replaced by tokens[first:new_stop]
+        of the new one, covering chars start:old_end of the old source
+        & start:new_end of the new one. Tokens after them are the same, shifted.
+    """
+
+    __slots__ = ()
+
+
+
+class TokenStream(object):
+
+    """
+    TokenStream is a tokenized source string, kept for incremental updates:
+        its lexemes (a TokenBuffer of LEXEME kinds) & its tokens (a TokenBuffer).
+    """
+
+    __slots__ = ('source', 'lexemes', 'tokens')
+
+
+    def __init__(self, source, lexemes, tokens):
+        self.source = source
+        self.lexemes = lexemes
+        self.tokens = tokens
+
+
+    def __len__(self):
+        return len(self.tokens)
+
+
+    def to_dicts(self):
+        """Return the tokens as the list of single key-value pair dicts used by tokenize()."""
+
+        return self.tokens.to_dicts()
+
+
+
+class IncrementalTokenizer(object):
+
+    """
+    IncrementalTokenizer updates a token stream after an edit without re-tokenizing it all.
+
+    An edit replaces deleted chars at offset with inserted text.
+    Lexing restarts at the start of the token holding the first lexeme that the edit
+        can affect: the Lexer only reads lookahead chars ahead of an index
+        (see Lexer.lookahead()), so lexemes starting more than lookahead chars
+        before the edit are unchanged.
+    Re-lexing stops at the first lexeme boundary after the edit that was a boundary before it:
+        from there on the lexemes are the old ones, shifted.
+    Re-tokenizing then runs over the re-lexed lexemes & on into the old ones, until a token
+        starts where an old token started: no phrase is open there, so from there on the
+        tokens are the old ones, shifted. An edit that opens a phrase (e.g. inserts '<'
+        or a quote) or closes one thus re-tokenizes as far as the phrase now reaches.
+    The change reported leaves out the re-tokenized tokens before the edit that came out
+        the same: it starts at the first token that differs from the old stream.
+
+    The result is always the same as tokenizing the new source from scratch
+        (with Tokenizer.tokenize_buffer()).
+
+    Example:
+
+        incremental = IncrementalTokenizer(Tokenizer())
+        stream = incremental.tokenize('lc_letter (lc_letter)*')
+        stream, change = incremental.edit(stream, 11, 9, 'name')
+        stream.to_dicts()  -> [{'pylang_token': 'lc_letter'}, ..., {'pylang_token': 'name'}, ...]
+        change             -> StreamChange(first=3, old_stop=4, new_stop=4, start=11,
+                                           old_end=20, new_end=15)
+
+    """
+
+
+    def __init__(self, tokenizer):
+        """Instantiate over a Tokenizer (& its Lexer)."""
+
+        self.tokenizer = tokenizer
+        self.lexer = tokenizer.lexer
+        self.lookahead = self.lexer.lookahead()
+
+
+    def tokenize(self, source):
+        """
+        Tokenize a source string from scratch into a TokenStream.
+
+        Input: str
+        Output: TokenStream
+        """
+
+        lexemes = self.lexer.lex_buffer(source)
+        return TokenStream(source, lexemes, self.tokenizer.tokenize_buffer(lexemes))
+
+
+    def edit(self, stream, offset, deleted, inserted):
+        """
+        Apply an edit to a tokenized source: delete deleted chars at offset, then insert text.
+        Re-lex & re-tokenize only the damaged region.
+
+        Input: TokenStream, int, int, str
+        Output: (TokenStream, StreamChange)
+        """
+
+        source = stream.source
+        if offset < 0 or deleted < 0 or offset + deleted > len(source):
+            raise ValueError('Edit out of range: offset {}, {} chars deleted, source of {} chars'\
+                             .format(offset, deleted, len(source)))
+
+        new_source = source[:offset] + inserted + source[offset + deleted:]
+        delta = len(inserted) - deleted
+        old_edit_end = offset + deleted
+        new_edit_end = offset + len(inserted)
+
+        old_lexemes = stream.lexemes
+        old_tokens = stream.tokens
+        lexeme_starts = old_lexemes.starts
+        token_starts = old_tokens.starts
+
+        # Where lexing & tokenizing restart: both positions are unaffected by the edit.
+        lexeme_index = max(0, bisect_right(lexeme_starts, offset - self.lookahead) - 1)
+        lex_start = lexeme_starts[lexeme_index] if len(lexeme_starts) else 0
+        first = max(0, bisect_right(token_starts, lex_start) - 1)
+        token_start = token_starts[first] if len(token_starts) else 0
+
+        relexed, resume = self._relex(new_source, lex_start, new_edit_end, old_lexemes,
+                                      old_edit_end, delta)
+
+        new_lexemes = TokenBuffer(new_source)
+        new_lexemes.kinds = old_lexemes.kinds[:lexeme_index]
+        new_lexemes.starts = old_lexemes.starts[:lexeme_index]
+        new_lexemes.ends = old_lexemes.ends[:lexeme_index]
+        start = lex_start
+        for lexeme in relexed:
+            new_lexemes.append(LEXEME, start, start + len(lexeme))
+            start += len(lexeme)
+        resync_at = start      # The first lexeme boundary shared with the old stream
+        _extend_shifted(new_lexemes, old_lexemes, resume, delta)
+
+        # Re-tokenize from token_start, over the new lexemes, until the token streams meet again.
+        new_tokens = TokenBuffer(new_source)
+        new_tokens.kinds = old_tokens.kinds[:first]
+        new_tokens.starts = old_tokens.starts[:first]
+        new_tokens.ends = old_tokens.ends[:first]
+
+        lexeme_starts = new_lexemes.starts
+        lexeme_ends = new_lexemes.ends
+        texts = (new_source[lexeme_starts[i]:lexeme_ends[i]]
+                 for i in range(bisect_left(lexeme_starts, token_start), len(lexeme_starts)))
+
+        old_resume = len(old_tokens)
+        for key, span_start, span_end, text in self.tokenizer.stream_token_spans(texts):
+            span_start += token_start
+            if span_start >= resync_at and span_start >= new_edit_end:
+                i = bisect_left(token_starts, span_start - delta)
+                if i < len(token_starts) and token_starts[i] == span_start - delta:
+                    old_resume = i
+                    break
+            new_tokens.append(kind_code(key), span_start, span_end + token_start)
+
+        new_stop = len(new_tokens)
+
+        # Leave out the re-tokenized tokens that came out the same, before the edit.
+        while (first < new_stop and first < old_resume
+               and new_tokens.ends[first] <= offset
+               and new_tokens.kinds[first] == old_tokens.kinds[first]
+               and new_tokens.starts[first] == old_tokens.starts[first]
+               and new_tokens.ends[first] == old_tokens.ends[first]):
+            first += 1
+
+        old_end = old_tokens.starts[old_resume] if old_resume < len(old_tokens) else len(source)
+        start = min(new_tokens.starts[first] if first < new_stop else old_end,
+                    old_tokens.starts[first] if first < old_resume else old_end)
+        change = StreamChange(first, old_resume, new_stop, start, old_end,
+                              new_tokens.ends[-1] if new_stop > first else start)
+        _extend_shifted(new_tokens, old_tokens, old_resume, delta)
+
+        return TokenStream(new_source, new_lexemes, new_tokens), change
+
+
+    def _relex(self, new_source, lex_start, new_edit_end, old_lexemes, old_edit_end, delta):
+        """
+        Lex new_source from lex_start until its lexemes meet the old ones again.
+        Return the new lexemes & the index of the first old lexeme that follows them.
+        """
+
+        lookahead = self.lookahead
+        old_starts = old_lexemes.starts
+        length = len(new_source)
+
+        # Lex a window reaching a little past the edit, & widen it until a shared boundary is found.
+        reach = lookahead
+        while True:
+            i = bisect_left(old_starts, old_edit_end + reach)
+            window_end = old_starts[i] + delta if i < len(old_starts) else length
+            final = window_end >= length
+            if final:
+                window_end = length
+
+            lexemes = self.lexer.lex_string(new_source[lex_start:window_end])
+
+            # Boundaries further than window_end - lookahead may change once the window widens.
+            limit = length if final else window_end - lookahead
+            boundary = lex_start
+            for m, lexeme in enumerate(lexemes):
+                if boundary > limit:
+                    break
+                if boundary >= new_edit_end:
+                    j = bisect_left(old_starts, boundary - delta)
+                    if j < len(old_starts) and old_starts[j] == boundary - delta:
+                        return lexemes[:m], j
+                boundary += len(lexeme)
+
+            if final:
+                return lexemes, len(old_starts)
+
+            reach *= 4
+
+
+
+def _extend_shifted(buffer, old_buffer, start, delta):
+    """Append the tokens old_buffer[start:] to buffer, with their offsets shifted by delta."""
+
+    buffer.kinds.extend(old_buffer.kinds[start:])
+    buffer.starts.extend(_shifted(old_buffer.starts[start:], delta))
+    buffer.ends.extend(_shifted(old_buffer.ends[start:], delta))
+
+
+def _shifted(values, delta):
+    """Return an array('i') of values + delta. Vectorised with NumPy when it is installed."""
+
+    if not delta or not values:
+        return values
+
+    try:
+        import numpy as np
+    except ImportError:
+        return array('i', map(delta.__add__, values))
+
+    shifted = array('i')
+    shifted.frombytes((np.frombuffer(values, dtype=np.intc) + delta).tobytes())
+    return shifted
@@ -4,8 +4,15 @@ Created on Mon Apr 15 10:45:57 2019
 
 @author: Raphael David
 """
-import pandas as pd
+import codecs
+import mmap
+import os
+import re
+from time import perf_counter
+
 from pylex import _config_file
+from .config import load_config, read_sheet
+from .tokens import TokenBuffer
 
 class Lexer(object):
 
@@ -36,8 +43,8 @@ class Lexer(object):
                 that match sequences designated by a config file available to the user.
             It then isolates these sequences as priority sequences
                 to prevent them from being sent to the slicing scanner.
-            An instance var master sequence is used to hold all sequences of chars,
-                both those that are priorities and those that are not.
+            A master sequence, local to each call of lex_string(), is used to hold
+                all sequences of chars, both those that are priorities and those that are not.
             The master sequence is read by the control method (lex_string()).
             lex_string() sends the priority sequences directly to an output list of lexemes
                 and sends the none-priority sequences to the slicing scanner
@@ -79,7 +86,7 @@ class Lexer(object):
 
         4. some_string_value is scanned by isolate_priority_lexemes() for priority sequences.
         isolate_priority_lexemes() segregates ellipses away from the rest of the chars
-            and fills up empty instance var master_seq with the segregated sequences.
+            and fills up an empty master_seq with the segregated sequences.
         master_seq is a list of dicts, each with only 1 key-value pair.
         Priority sequences are keyed as 'lexeme'.
         All other char sequences are keyed as 'string'.
@@ -101,25 +108,97 @@ class Lexer(object):
 
         The lexemes in lexeme_seq can now be tokenized by a tokenizer.
 
+
+    Table-driven engine (engine='table'):
+
+        Instead of the 2 processors above, Lexer can lex with a single scanner
+            (scan_string()) compiled from the config file:
+            a trie over the priority sequences & the set of delimiter chars.
+        The input string is read once, left to right.
+        At each char, the trie is walked to find priority sequences starting there.
+            When several priority sequences start at the same char,
+                the one on the higher row of the config file wins
+                (ties go to the longer sequence).
+        Otherwise the char is sliced off if it is a delimiter,
+            or added to the current lexeme if it is not.
+        Unlike isolate_priority_lexemes(), which only reads the first priority row,
+            scan_string() honours every row up to config_row_count_priority_seq_chars.
+        For inputs without lower-ranked priority sequences the output is identical.
+
+    Regex engine (engine='regex'):
+
+        The same rules as the table-driven engine, compiled into 1 regular expression
+            (see lexeme_pattern()): the priority sequences in row order,
+            then any delimiter char, then a run of other chars.
+        The lexemes are identical to scan_string()'s, but the scanning loop runs in C.
+
+
+    Streaming (iter_lex() & lex_file()):
+
+        Inputs too big to hold as 1 str are read from a file in chunks of chunk_size chars,
+            & their lexemes are yielded one at a time, with any engine.
+        The lexemes near the end of a chunk are held back & lexed again with the next chunk,
+            so a priority sequence or a run of non-delimiter chars split across 2 chunks
+            comes out exactly as lex_string() would lex it: the lexemes are the same.
+        Phrases (angle brackets, quotes...) are grouped by the Tokenizer, which reads lexemes
+            as a stream: see Tokenizer.iter_tokens_from().
+
     """
 
 
 
-    print('Lexer reporting for duty')
+    engines = ('legacy', 'table', 'regex')
+
 
+    def __init__(self, config_file=_config_file, config_sheet_name="Lexer_configs", config=None,
+                 engine='legacy', stats=None):
+        """Instantiate an instance of the Lexer class.
+        An already compiled config (see config.load_config()) can be passed in via config.
+        engine selects the lexing engine: 'legacy', 'table' or 'regex' (see class docstring).
+        stats, a Stats object (see stats.py), switches instrumentation on."""
 
-    def __init__(self, config_file=_config_file, config_sheet_name="Lexer_configs"):
-        """Instantiate an instance of the Lexer class."""
+        if engine not in self.engines:
+            raise ValueError('Unknown lexer engine {!r}. Choose one of: {}'\
+                             .format(engine, ', '.join(self.engines)))
+        self.engine = engine
 
         self.master_seq = []
+        self.stats = stats
 
-        self.df = pd.read_excel(config_file, config_sheet_name)
+        if config is None:
+            config = load_config(config_file, lexer_sheet_name=config_sheet_name, stats=stats)
+        self.config = config
 
-        self.delimiter_configs = self.df.delimiter.values
+        # Where the deprecated df attribute is read from.
+        self._config_file = config_file
+        self._config_sheet_name = config_sheet_name
+        self._df = None
+
+        self.delimiter_configs = self.config.delimiters
+        self.priority_configs = self.config.priority_char_seqs
 
         # Select the number of rows in the config file that contain priority lexemes.
         self.config_row_count_priority_seq_chars = 2
 
+        self.priority_trie = compile_priority_trie(
+            self.priority_configs[0:self.config_row_count_priority_seq_chars])
+
+        self.lexeme_regex = None
+        if engine == 'regex':
+            self.lexeme_regex = re.compile(lexeme_pattern(
+                self.delimiter_configs,
+                self.priority_configs[0:self.config_row_count_priority_seq_chars]))
+
+
+    @property
+    def df(self):
+        """Deprecated: the Lexer_configs sheet as a DataFrame, read from the workbook
+            on first use. The Lexer itself only reads the compiled config."""
+
+        if self._df is None:
+            self._df = read_sheet(self._config_file, self._config_sheet_name)
+        return self._df
+
 
 
     def lex_string(self, input_string):
@@ -132,21 +211,40 @@ class Lexer(object):
         Output: list of lexemes
         """
 
+        stats = self.stats
+        if stats is not None:
+            start = perf_counter()
+
+        if self.engine != 'legacy':
+            if self.lexeme_regex is not None:
+                lexemes = self.lexeme_regex.findall(input_string)
+            else:
+                lexemes = self.scan_string(input_string)
+            if stats is not None:
+                stats.add_time('lex', perf_counter() - start)
+                stats.count('lexemes', len(lexemes))
+            return lexemes
 
         # Isolate & extract:
 
+        master_seq = []    # Local to this call, so 1 Lexer can serve several threads at once
+
         intermediate_seq = [{'string': input_string}]
 
         while len(intermediate_seq) != 0:
-            intermediate_seq = self.isolate_priority_lexemes(intermediate_seq)
+            intermediate_seq = self.isolate_priority_lexemes(intermediate_seq, master_seq)
             continue
 
+        if stats is not None:
+            isolated = perf_counter()
+            stats.add_time('lex.priority_isolation', isolated - start)
+
 
         # Scan & slice:
 
         lexemes = []
 
-        for element in self.master_seq:
+        for element in master_seq:
             for key in element:
                 if key == 'lexeme':
                     lexemes.append(str(element.get(key)))
@@ -155,29 +253,126 @@ class Lexer(object):
                         lexemes.append(result)
         else:
 #             print('\nLexemes: ', lexemes, end = '\n\n\n')
-            self.master_seq.clear()
+            if stats is not None:
+                end = perf_counter()
+                stats.add_time('lex.delimiter_slicing', end - isolated)
+                stats.add_time('lex', end - start)
+                stats.count('lexemes', len(lexemes))
             return lexemes
 
 
 
-    def isolate_priority_lexemes(self, intermediate_seq):
+    def lex_buffer(self, input_string):
+        """Lex an input string into a TokenBuffer of lexemes (offsets only, see tokens.py).
+        The buffer can be fed straight to Tokenizer.tokenize_buffer().
+        Input: str
+        Output: TokenBuffer of lexemes
+        """
+
+        return TokenBuffer.from_lexemes(input_string, self.lex_string(input_string))
+
+
+
+    def iter_lex(self, fileobj, chunk_size=1 << 16, encoding='utf-8'):
+        """
+        Lex the contents of a file in chunks. Yield lexemes one at a time.
+        Memory is bounded by chunk_size & the longest lexeme, not by the size of the file.
+
+        Input: object with a read(size) method returning str, or bytes (decoded with encoding),
+            e.g. a file opened in text or binary mode, or an mmap
+        Output: generator of lexemes
+        """
+
+        lookahead = self.lookahead()
+        decoder = None
+        pending = ''
+
+        while True:
+            chunk = fileobj.read(chunk_size)
+            end_of_file = not chunk
+
+            if isinstance(chunk, bytes):
+                if decoder is None:
+                    decoder = codecs.getincrementaldecoder(encoding)()
+                chunk = decoder.decode(chunk, final=end_of_file)
+
+            pending += chunk
+
+            if end_of_file:
+                if pending:
+                    yield from self.lex_string(pending)
+                return
+            lexemes = self.lex_string(pending)
+
+            # Only lexemes followed by 1 that starts early enough to have been lexed
+            # with its full lookahead are final. The rest is lexed again with the next chunk.
+            limit = len(pending) - lookahead
+            held = cut = start = 0
+            for i, lexeme in enumerate(lexemes):
+                if start > limit:
+                    break
+                held, cut = i, start
+                start += len(lexeme)
+
+            yield from lexemes[:held]
+            pending = pending[cut:]
+
+
+
+    def lookahead(self):
+        """
+        Return how many chars the lexer reads from an index to decide how to lex it:
+            the length of the longest priority sequence the engine honours (at least 1).
+        Lexing decisions at an index never depend on chars further on,
+            which is what lets iter_lex() & incremental re-lexing stop early.
+        """
+
+        if self.engine != 'legacy':
+            char_seqs = self.priority_configs[0:self.config_row_count_priority_seq_chars]
+        else:
+            char_seqs = self.priority_configs[0:1]
+
+        return max([len(char_seq) for char_seq in char_seqs] + [1])
+
+
+
+    def lex_file(self, path, chunk_size=1 << 16, encoding='utf-8'):
+        """
+        Lex a file through a read-only memory map. Yield lexemes one at a time (see iter_lex()).
+
+        Input: path to a file
+        Output: generator of lexemes
+        """
+
+        with open(path, 'rb') as source:
+            if os.fstat(source.fileno()).st_size == 0:
+                return
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield from self.iter_lex(mapped, chunk_size, encoding)
+
+
+
+    def isolate_priority_lexemes(self, intermediate_seq, master_seq=None):
         """
         Isolate certain char sequences to prevent them from being included elsewhere.
         These 'priority' sequences are ranked such that the top row in the config file
             is considered first before all others, the second considered second, etc.
         Thus, the user can prioritize which sequences are higher in priority.
+        Finished sequences are appended to master_seq (instance var master_seq if None).
 
         Input: list of dicts
         Output: list of dicts
 
         """
+        if master_seq is None:
+            master_seq = self.master_seq
+
         pair = intermediate_seq[0]  # Key-value pair
         for key in pair:    # List level
             if key == 'lexeme':
-                self.master_seq.append(intermediate_seq.pop(0))
+                master_seq.append(intermediate_seq.pop(0))
                 return intermediate_seq
-            for char_seq in self.df.priority_char_seqs.values[0:1]:  # Row in config file
-                lookup = char_seq[1:-1]
+            for lookup in self.priority_configs[0:1]:  # Row in config file
                 if lookup in pair.get(key):
                     i = pair.get(key).index(lookup)  # index where the seq starts
                     j = i + len(lookup)              # index immediately after the seq
@@ -195,7 +390,7 @@ class Lexer(object):
                     continue        # Continue to cycle thru the priority list
 
             else:
-                self.master_seq.append(intermediate_seq.pop(0))
+                master_seq.append(intermediate_seq.pop(0))
                 return intermediate_seq
 
 
@@ -217,9 +412,8 @@ class Lexer(object):
         lexeme = ''
 
         for char in input_string:
-            item = '"' + char + '"'
 
-            if item not in self.delimiter_configs:
+            if char not in self.delimiter_configs:
                 lexeme = str(lexeme) + char
                 continue
 
@@ -234,3 +428,138 @@ class Lexer(object):
             lexeme_seq.append(lexeme)
 
         return lexeme_seq
+
+
+    def scan_string(self, input_string):
+        """
+        Lex an input string in a single left-to-right pass (the table-driven engine).
+        Priority sequences are matched with the priority trie,
+            delimiters are sliced off as individual lexemes,
+            & contiguous remaining chars are clustered into lexemes.
+
+        Input: str
+        Output: list of lexemes
+        """
+
+        lexeme_seq = []
+
+        trie = self.priority_trie
+        delimiters = self.delimiter_configs
+
+        start = 0      # index where the current non-delimiter lexeme starts
+        i = 0
+        length = len(input_string)
+
+        while i < length:
+            char = input_string[i]
+
+            if char in trie:
+                j = match_priority_seq(trie, input_string, i)
+                if j:
+                    if start < i:
+                        lexeme_seq.append(input_string[start:i])
+                    lexeme_seq.append(input_string[i:j])
+                    i = start = j
+                    continue
+
+            if char in delimiters:
+                if start < i:
+                    lexeme_seq.append(input_string[start:i])
+                lexeme_seq.append(char)
+                start = i + 1
+
+            i += 1
+
+        if start < length:
+            lexeme_seq.append(input_string[start:length])
+
+        return lexeme_seq
+
+
+
+def compile_priority_trie(priority_seqs):
+    """
+    Compile priority sequences into a trie of nested dicts, keyed by char.
+    A node that ends a sequence holds the sequence's rank (its row in the config file)
+        under the key None.
+    Where a sequence is listed on more than 1 row, its highest row is kept.
+
+    Input: sequence of str, highest priority first
+    Output: dict
+    """
+
+    trie = {}
+
+    for rank, char_seq in enumerate(priority_seqs):
+        if not char_seq:
+            continue
+        node = trie
+        for char in char_seq:
+            node = node.setdefault(char, {})
+        node.setdefault(None, rank)
+
+    return trie
+
+
+def match_priority_seq(trie, input_string, i):
+    """
+    Walk the priority trie from index i of the input string.
+    Return the index immediately after the best priority sequence starting at i:
+        the highest ranked, then the longest.
+    Return 0 if no priority sequence starts at i.
+    """
+
+    best_rank = None
+    best_end = 0
+
+    node = trie
+    length = len(input_string)
+    j = i
+
+    while j < length:
+        node = node.get(input_string[j])
+        if node is None:
+            break
+        j += 1
+        rank = node.get(None)
+        if rank is not None and (best_rank is None or rank <= best_rank):
+            best_rank = rank
+            best_end = j
+
+    return best_end
+
+
+def lexeme_pattern(delimiters, priority_seqs):
+    """
+    Return a regular expression (as a str) that lexes exactly like scan_string():
+        every match is 1 lexeme & the matches tile the input string.
+    Alternatives are tried in order, so the priority sequences are listed by rank:
+        the first 1 that matches at an index is the highest ranked.
+    A run of non-delimiter chars stops where a priority sequence starts,
+        which only needs checking for sequences that do not start with a delimiter.
+    The pattern has no capturing groups, so re.findall() returns the lexemes.
+
+    Input: set of delimiter chars, sequence of str, highest priority first
+    Output: str
+    """
+
+    char_seqs = [char_seq for char_seq in dict.fromkeys(priority_seqs) if char_seq]
+    alternatives = [re.escape(char_seq) for char_seq in char_seqs]
+
+    inner_seqs = [re.escape(char_seq) for char_seq in char_seqs
+                  if char_seq[0] not in delimiters]
+    guard = '(?!{})'.format('|'.join(inner_seqs)) if inner_seqs else ''
+
+    if delimiters:
+        delimiter_class = ''.join(re.escape(char) for char in sorted(delimiters))
+        alternatives.append('[{}]'.format(delimiter_class))
+        other_char = '[^{}]'.format(delimiter_class)
+    else:
+        other_char = '(?s:.)'
+
+    if guard:
+        alternatives.append('(?:{}{})+'.format(guard, other_char))
+    else:
+        alternatives.append(other_char + '+')
+
+    return '|'.join(alternatives)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Prebuilt index of token names: prefix completion & typo-tolerant suggestions.
+"""
+
+from bisect import bisect_left
+
+
+# Queries up to this long are matched by edit distance alone (see TokenNameIndex.suggest()).
+_SHORT_QUERY = 5
+
+
+class TokenNameIndex(object):
+
+    """
+    TokenNameIndex answers 'which token names look like this?' without scanning the table.
+
+    Built once from the token names of a compiled config, it holds:
+        a sorted array of the case-folded names, where the names sharing a prefix
+            are 1 contiguous slice found by binary search (a flattened trie),
+        & a trigram index: each 3-char gram of a name (padded with spaces at both ends)
+            -> the names that contain it.
+
+    complete() lists the names starting with a prefix.
+    suggest() finds the names closest to a misspelt one: candidates sharing trigrams
+        are ranked by trigram similarity, & the best ones are re-ranked by edit distance.
+    All lookups are case-insensitive; names are returned as they are in the config.
+
+    Example:
+
+        index = TokenNameIndex.from_config(load_config())
+        index.complete('id_')           -> ['id_start', 'id_continue']
+        index.suggest('identifer')      -> ['identifier']
+        index.search('strin')           -> ['stringprefix', 'stringliteral', 'stringescapeseq']
+
+    """
+
+
+    def __init__(self, token_names):
+        """Instantiate an index over an iterable of token names (in config order)."""
+
+        self.token_names = tuple(dict.fromkeys(token_names))
+        self.rank = {name: rank for rank, name in enumerate(self.token_names)}
+
+        entries = sorted((name.casefold(), self.rank[name]) for name in self.token_names)
+        self._keys = [key for key, rank in entries]
+        self._ranks = [rank for key, rank in entries]
+
+        self._grams = {}
+        self._gram_counts = []
+        for rank, name in enumerate(self.token_names):
+            grams = _trigrams(name.casefold())
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._grams.setdefault(gram, []).append(rank)
+
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the index of a CompiledConfig's token names."""
+
+        return cls(config.token_names)
+
+
+    def __len__(self):
+        return len(self.token_names)
+
+
+    def __contains__(self, token_name):
+        return token_name in self.rank
+
+
+    def complete(self, prefix, limit=10):
+        """
+        Return up to limit token names starting with prefix: shortest first, then in config order.
+
+        Input: str
+        Output: list of token names
+        """
+
+        prefix = prefix.casefold()
+        keys = self._keys
+        start = bisect_left(keys, prefix)
+        # Every key starting with prefix sorts before prefix + the highest code point.
+        end = bisect_left(keys, prefix + '\U0010ffff', start)
+
+        names = [self.token_names[rank] for rank in self._ranks[start:end]]
+        names.sort(key=lambda name: (len(name), self.rank[name]))
+        return names[:limit]
+
+
+    def suggest(self, query, limit=5, min_similarity=0.3, max_distance=None):
+        """
+        Return up to limit token names that look like query, best first:
+            ranked by edit distance (insertions, deletions, substitutions & transpositions),
+            then by trigram similarity, then in config order.
+        Names sharing too few trigrams with query (min_similarity, a Dice coefficient),
+            or more than max_distance edits away (default: a third of the query's length,
+            at least 1), are left out.
+        Queries of up to 5 chars skip the trigram filter: every name is checked by edit distance.
+
+        Input: str
+        Output: list of token names
+        """
+
+        key = query.casefold()
+        if max_distance is None:
+            max_distance = max(1, len(key) // 3)
+
+        query_grams = _trigrams(key)
+        shared = {}
+        for gram in query_grams:
+            for rank in self._grams.get(gram, ()):
+                shared[rank] = shared.get(rank, 0) + 1
+
+        if len(key) <= _SHORT_QUERY:
+            # Short names share few trigrams with their typos ('nmae' shares none with 'name'),
+            #   so every name of a close enough length is a candidate.
+            candidates = [(self._similarity(shared.get(rank, 0), query_grams, rank), rank)
+                          for rank, name in enumerate(self.token_names)
+                          if abs(len(name) - len(key)) <= max_distance]
+        else:
+            candidates = []
+            for rank, count in shared.items():
+                similarity = self._similarity(count, query_grams, rank)
+                if similarity >= min_similarity:
+                    candidates.append((similarity, rank))
+
+            # Edit distances are only computed for the best few candidates.
+            candidates.sort(key=lambda item: (-item[0], item[1]))
+            candidates = candidates[:max(limit * 4, 20)]
+
+        ranked = []
+        for similarity, rank in candidates:
+            distance = edit_distance(key, self.token_names[rank].casefold(), max_distance)
+            if distance <= max_distance:
+                ranked.append((distance, -similarity, rank))
+
+        ranked.sort()
+        return [self.token_names[rank] for distance, similarity, rank in ranked[:limit]]
+
+
+    def _similarity(self, shared_count, query_grams, rank):
+        """Return the trigram Dice coefficient of a query & the name of rank."""
+
+        return 2.0 * shared_count / (len(query_grams) + self._gram_counts[rank])
+
+
+    def search(self, query, limit=10):
+        """
+        Return up to limit token names for a query typed by a user, best first:
+            the exact name, then completions of the query, then suggestions for typos.
+
+        Input: str
+        Output: list of token names
+        """
+
+        results = self.complete(query, limit)
+        if len(results) < limit:
+            results.extend(name for name in self.suggest(query, limit)
+                           if name not in results)
+
+        exact = [name for name in results if name.casefold() == query.casefold()]
+        return (exact + [name for name in results if name not in exact])[:limit]
+
+
+
+def _trigrams(text):
+    """Return the set of 3-char grams of text, padded with 2 spaces in front & 1 behind."""
+
+    padded = '  {} '.format(text)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit=None):
+    """
+    Return the optimal string alignment distance between a & b:
+        the number of insertions, deletions, substitutions & adjacent transpositions.
+    If limit is given, stop as soon as the distance is known to exceed it (return limit + 1).
+    """
+
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+
+    if limit is not None:
+        return min(previous[-1], limit + 1)
+    return previous[-1]
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of tokenizing & normalizing results, shared between processes.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from pylex import _config_file
+from .config import default_cache_dir
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key   TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size  INTEGER NOT NULL,
+    used  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('bytes', 0);
+CREATE TRIGGER IF NOT EXISTS entries_inserted AFTER INSERT ON entries BEGIN
+    UPDATE meta SET value = value + NEW.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_updated AFTER UPDATE OF size ON entries BEGIN
+    UPDATE meta SET value = value + NEW.size - OLD.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS entries_deleted AFTER DELETE ON entries BEGIN
+    UPDATE meta SET value = value - OLD.size WHERE name = 'bytes';
+END;
+'''
+
+
+class PersistentCache(object):
+
+    """
+    PersistentCache keeps results on disk, in a SQLite file, so that short-lived processes
+        start from the results of earlier ones instead of from nothing.
+
+    Entries are keyed on a kind ('tokenize', 'normalize'...), the content hash of the config
+        they were computed with (CompiledConfig.content_hash()) & their input
+        (an expression or a token name). An entry computed under another config is never
+        returned: an edited config simply misses, & its old entries age out.
+    Values are pickled, like the config's own disk cache.
+
+    Concurrency:
+        The database is in WAL mode, so readers never block each other nor the writer,
+        & writers from any number of processes or threads take turns (waiting up to timeout).
+        Each process opens 1 connection on first use, shared by its threads behind a lock,
+            so threads that come & go (executors, thread pools) leave no connections behind.
+        A cache that cannot be read or written (locked for too long, disk full...)
+            behaves as a miss & counts an error: it never makes a lookup fail.
+
+    Eviction:
+        The total size of the stored values is kept in the database by triggers.
+        When a put takes it over max_bytes, the least recently used entries are deleted
+            until it is back under 90% of max_bytes.
+        Reads only write an entry's last use time back when it is older than touch_interval
+            seconds, so a hot cache is mostly read-only.
+
+    Counters (stats()) are those of this process: hits, misses, puts, evictions, errors
+        & hit_rate, along with the entries & bytes held by the whole database.
+
+    Example:
+
+        cache = PersistentCache()          # __pycache__/PyLex_results.sqlite3 next to the workbook
+        pylex = PyLex(interactive=False, persistent_cache=cache)
+        pylex.normalize('name')            # computed, then stored
+        # ... in a later process:
+        pylex.normalize('name')            # read back from disk
+        cache.stats()                      -> {'hits': 1, 'misses': 0, 'hit_rate': 1.0, ...}
+
+    """
+
+
+    def __init__(self, path=None, max_bytes=64 << 20, timeout=30.0, touch_interval=60.0,
+                 config_file=_config_file):
+        """Open (or create) the cache database at path.
+        Without a path, the database is kept in the dir of the config's disk cache
+            (see config.default_cache_dir())."""
+
+        if path is None:
+            path = os.path.join(default_cache_dir(config_file), 'PyLex_results.sqlite3')
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.touch_interval = touch_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.evictions = 0
+        self.errors = 0
+
+        self._lock = threading.Lock()        # Guards the counters
+        self._database = None
+        self._database_lock = threading.Lock()
+        self._pid = os.getpid()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._locked():
+            self._connection()
+
+
+    def _locked(self):
+        """Return the lock that guards this process's connection.
+        A process started by fork() gets a new lock (& a new connection, see _connection()):
+            the parent's may have been held by a thread that does not exist in the child."""
+
+        if self._pid != os.getpid():
+            self._database = None
+            self._database_lock = threading.Lock()
+            self._pid = os.getpid()
+        return self._database_lock
+
+
+    def _connection(self):
+        """Return this process's connection, opening it (& the schema) on first use.
+        Only call it with the lock of _locked() held."""
+
+        if self._database is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(_SCHEMA)
+            self._database = connection
+        return self._database
+
+
+    def _count(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+
+    def get(self, kind, key, content_hash):
+        """
+        Return the value stored for (kind, key) under a config's content hash, or None.
+
+        Input: str, str, str
+        Output: the value stored, or None
+        """
+
+        entry_key = _entry_key(kind, key, content_hash)
+
+        try:
+            with self._locked():
+                connection = self._connection()
+                row = connection.execute('SELECT value, used FROM entries WHERE key = ?',
+                                         (entry_key,)).fetchone()
+                now = time.time()
+                if row is not None and now - row[1] > self.touch_interval:
+                    connection.execute('UPDATE entries SET used = ? WHERE key = ?',
+                                       (now, entry_key))
+
+            if row is None:
+                self._count('misses')
+                return None
+
+            value = pickle.loads(row[0])
+
+        except (sqlite3.Error, pickle.UnpicklingError, EOFError, ValueError, TypeError,
+                AttributeError, ImportError):
+            self._count('errors')
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        return value
+
+
+    def put(self, kind, key, content_hash, value):
+        """
+        Store value for (kind, key) under a config's content hash,
+            evicting the least recently used entries if the cache grows over max_bytes.
+
+        Input: str, str, str, picklable value
+        """
+
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+
+        try:
+            with self._locked():
+                connection = self._connection()
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    connection.execute(
+                        'INSERT INTO entries (key, value, size, used) VALUES (?, ?, ?, ?) '
+                        'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                        'size = excluded.size, used = excluded.used',
+                        (_entry_key(kind, key, content_hash), data, len(data), time.time()))
+                    evicted = self._evict(connection)
+                    connection.execute('COMMIT')
+                except BaseException:
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+                    raise
+
+        except sqlite3.Error:
+            self._count('errors')
+            return
+
+        self._count('puts')
+        if evicted:
+            self._count('evictions', evicted)
+
+
+    def _evict(self, connection):
+        """Delete the least recently used entries while over max_bytes. Return how many."""
+
+        total = connection.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+
+        target = self.max_bytes * 9 // 10
+        evicted = 0
+        while total > target:
+            rows = connection.execute('SELECT key, size FROM entries ORDER BY used LIMIT 64')\
+                             .fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+                evicted += 1
+                total -= size
+                if total <= target:
+                    break
+
+        return evicted
+
+
+    def clear(self):
+        """Delete every entry, from every process's point of view. The counters are kept."""
+
+        try:
+            with self._locked():
+                self._connection().execute('DELETE FROM entries')
+        except sqlite3.Error:
+            self._count('errors')
+
+
+    def close(self):
+        """Close this process's connection (it is reopened on next use)."""
+
+        with self._locked():
+            if self._database is not None:
+                self._database.close()
+                self._database = None
+
+
+    def __len__(self):
+        with self._locked():
+            return self._connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+
+    def stats(self):
+        """Return the counters of this process & the size of the whole cache as a dict."""
+
+        try:
+            with self._locked():
+                connection = self._connection()
+                entries = connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+                total = connection.execute("SELECT value FROM meta WHERE name = 'bytes'")\
+                                  .fetchone()[0]
+        except sqlite3.Error:
+            entries = total = None
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'puts': self.puts,
+            'evictions': self.evictions,
+            'errors': self.errors,
+            'size': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+        }
+
+
+
+def _entry_key(kind, key, content_hash):
+    """Return the database key of an entry. NUL never appears in a kind nor in a hash."""
+
+    return '{}\0{}\0{}'.format(kind, content_hash, key)
@@ -5,9 +5,16 @@ Created on Mon Apr 15 10:50:48 2019
 @author: Raphael David
 """
 
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
 from pylex import _config_file
+from .config import load_config, read_sheet
+from .cache import LRUCache
+from .expansion import ExpansionEngine, segments_text
+from .names import TokenNameIndex
 from .tokenizer import Tokenizer
+from .trace import combine_traces, print_trace
 
 class PyLex(object):
 
@@ -27,8 +34,32 @@ class PyLex(object):
         progressing through all sub-tokens,
         leaving no non-terminal lexical elements within the evaluated expression.
 
+    PyLex can also be used without prompts or printing, e.g. from a service or a loop:
+        PyLex(interactive=False) skips the input() loop,
+        and normalize() returns the normal form of a token as a list of lexemes.
+    Fully evaluated normal forms are kept in a bounded LRU cache (normal_forms),
+        which is shared by every sub-token expansion:
+        once a sub-token has been evaluated for one token, it is reused by all others.
+    With a persistent_cache (see persistent.py), normal forms & tokens (tokenize()) are also
+        kept on disk, keyed on the config's content hash, so later processes start warm.
+    For tokens whose normal forms are too big to materialise, normalize_dag() returns
+        the normal form as a compressed DAG that is measured & flattened lazily (see dag.py).
+
+    Lookups & evaluation rounds are reported as trace events ('lookup', 'substitution',
+        'round_started', 'round_completed', see trace.py) sent to a sink: trace(event, fields).
+        An interactive PyLex prints them as it always has; with quiet=True (the default when
+        interactive is False) nothing is printed, & events only go to the trace sink given,
+        e.g. trace.logging_trace(). With neither, no event is even built.
+
+    normalize() keeps no per-call state on the instance, so 1 PyLex can serve many threads
+        (see normalize_many()). host_user() & evaluate_expression() collect into master_list
+        & are meant for 1 interactive user at a time.
+
     Example:
 
+        pylex = PyLex(interactive=False)
+        pylex.normalize('name')          -> ['a…z', ' ', '(', 'a…z', ' ', '|', ' ', "'_'", ')', '*']
+        pylex.normal_forms.stats()       -> {'hits': 1, 'misses': 2, 'evictions': 0, ...}
 
     Configs are stored in PyLex_configs.xlsx.
 
@@ -36,17 +67,57 @@ class PyLex(object):
 
 
 
-    print('PyLex is awesome')
-
-
-    def __init__(self, config_file=_config_file, config_sheet_name="PyLex_configs"):
+    def __init__(self, config_file=_config_file, config_sheet_name="PyLex_configs", config=None,
+                 interactive=True, cache_size=256, index=None, stats=None, trace=None, quiet=None,
+                 persistent_cache=None):
         """Instantiate an instance of the Pylex class.
-        Call host_user(), which engages all PyLex methods on the instance."""
-
-        self.df = pd.read_excel(config_file, config_sheet_name)
+        Call host_user(), which engages all PyLex methods on the instance.
+        An already compiled config (see config.load_config()) can be passed in via config.
+        If interactive is False, skip the user prompts: use normalize() instead.
+        cache_size bounds the number of normal forms cached (None for no bound).
+        index, a precomputed GrammarIndex (see closure.load_index()), makes normalize() a lookup.
+        stats, a Stats object (see stats.py), switches instrumentation on (for all engines).
+        trace, a callable trace(event, fields), receives lookup & evaluation events (see trace.py).
+        If quiet (by default: if not interactive), events are not printed.
+        persistent_cache, a PersistentCache (see persistent.py), keeps normal forms & tokens
+            on disk, for later processes to read back."""
+
+        self.stats = stats
+
+        if quiet is None:
+            quiet = not interactive
+        self.trace = combine_traces(None if quiet else print_trace, trace)
+
+        if config is None:
+            config = load_config(config_file, pylex_sheet_name=config_sheet_name, stats=stats)
+        self.config = config
+
+        # Where the deprecated df attribute is read from.
+        self._config_file = config_file
+        self._config_sheet_name = config_sheet_name
+        self._df = None
+
+        self.tokenizer = Tokenizer(config=self.config, stats=stats)
 
         self.master_list = []
 
+        self.index = index
+        self._name_index = None   # Built by name_index() on first use
+        self.normal_forms = LRUCache(cache_size)
+        self.expansion = ExpansionEngine(self.tokenizer, self.config.expressions,
+                                         self.normal_forms, stats)
+        if stats is not None:
+            stats.watch_cache('normal_forms', self.normal_forms)
+
+        self.persistent_cache = persistent_cache
+        self._content_hash = None   # Computed by content_hash() on first use
+        self._persisted = set()     # Token names whose normal forms are known to be on disk
+        if stats is not None and persistent_cache is not None:
+            stats.watch_cache('persistent', persistent_cache)
+
+        if not interactive:
+            return
+
         print('Welcome to PyLex')
 
         persistence = 'infinity'
@@ -62,6 +133,16 @@ class PyLex(object):
                 persistence = 0
 
 
+    @property
+    def df(self):
+        """Deprecated: the PyLex_configs sheet as a DataFrame, read from the workbook
+            on first use. PyLex itself only reads the compiled config."""
+
+        if self._df is None:
+            self._df = read_sheet(self._config_file, self._config_sheet_name)
+        return self._df
+
+
 
     def host_user(self):
         """Host the user as a guest to PyLex. Offer an index of Python language tokens."""
@@ -74,11 +155,14 @@ class PyLex(object):
         evaluation_attempt = 0
 
         if expression is not None:
-            evaluation = self.evaluate_expression(expression, evaluation_attempt)
-            while evaluation is not '':
+            self.expansion.check_cycles([(potential_pylang_token, True)])
+
+            evaluation = self.evaluate_segments(self.expansion.tokenize(expression),
+                                                evaluation_attempt)
+            while evaluation:
                 evaluation_attempt += 1
                 print('')
-                evaluation = self.evaluate_expression(evaluation, evaluation_attempt)
+                evaluation = self.evaluate_segments(evaluation, evaluation_attempt)
                 continue
 
             print('\n\n{}\nNormal Form Evaluation: '.format(potential_pylang_token),\
@@ -90,7 +174,7 @@ class PyLex(object):
             if decision == 'Yes' or decision == 'yes' or decision == 'Y' or decision == 'y':
 #             index
 
-                return self.df.token_name
+                return self.name_index().token_names
             else:
                 return 'No? ok.'
 
@@ -106,68 +190,197 @@ class PyLex(object):
 
 
     def look_up_token(self, input_token):
-        """Look up the input token in the Pylang Token dataframe.
-        Return None if token is not in Pylang Token dataframe."""
+        """Look up the input token in the Pylang Token config.
+        Return None if token is not in Pylang Token config."""
 
-        lookup = self.df.expression_string[self.df.token_name == input_token].values
-        lookup_result = lookup.item()    # convert to scalar & return
-                #could also do result = lookup[0]
+        if self.stats is not None:
+            self.stats.count('lookups')
 
-        if lookup_result is not None:
-            expression = lookup_result[1:-1]
-            print('Lexical Definition of {}: {}'.format(input_token, expression), end='\n\n')
-            return expression
-        else:
-            print('The token name you have entered is not found '\
-                      'in the list of tokens used by the Python lexical analyzer.')
-            return
+        expression = self.definition(input_token)
+
+        if self.trace is not None:
+            fields = {'token': input_token, 'expression': expression}
+            if input_token in self.config.token_name_set:
+                if expression is None:
+                    fields['blank'] = True
+            else:
+                fields['suggestions'] = self.name_index().search(input_token, 5)
+            self.trace('lookup', fields)
 
+        return expression
 
 
-    def evaluate_expression(self, expression, eval_number):
-        """Evaluate the entire expression"""
 
-        print('\nEvaluation #{}'.format(eval_number))
+    def name_index(self):
+        """Return the TokenNameIndex of the config's token names (see names.py), built once.
+        It completes prefixes & suggests token names for misspelt ones."""
+
+        if self._name_index is None:
+            self._name_index = TokenNameIndex.from_config(self.config)
+        return self._name_index
+
+
+
+    def definition(self, token_name):
+        """Return the lexical definition (expression) of a pylang token, without printing.
+        Return None if token is not in Pylang Token config."""
+
+        return self.config.expressions.get(token_name)
+
+
+
+    def normalize(self, token_name):
+        """
+        Evaluate a pylang token to its normal form, without prompting or printing.
+        The normal form holds the same lexemes that host_user() collects in master_list.
+        Normal forms are cached, along with those of every sub-token met along the way.
+        Raise KeyError for an unknown token & ExpansionCycleError for a recursive one.
+
+        Input: str (token name)
+        Output: list of lexemes
+        """
+
+        stats = self.stats
+        if stats is not None:
+            start = perf_counter()
+
+        normal_form = None
+        if self.index is not None:
+            normal_form = self.index.normal_forms.get(token_name)
+            if stats is not None:
+                stats.count('index_hits' if normal_form is not None else 'index_misses')
+
+        # Tokens first normalized as sub-tokens are in normal_forms but not yet on disk.
+        persistent = self.persistent_cache
+        if normal_form is None and persistent is not None and token_name not in self._persisted:
+            normal_form = persistent.get('normalize', token_name, self.content_hash())
+            if normal_form is None:
+                normal_form = self.expansion.normal_form(token_name)
+                persistent.put('normalize', token_name, self.content_hash(), normal_form)
+            elif token_name not in self.normal_forms:
+                self.normal_forms.put(token_name, normal_form)
+            self._persisted.add(token_name)
 
-        tokenizer = Tokenizer()
-        token_seq = tokenizer.tokenize(expression)
+        if normal_form is None:
+            normal_form = self.expansion.normal_form(token_name)
 
-        pylang_tokens_discovered_in_definition = []
-        intermediate_definition_remainder = ''
+        if stats is not None:
+            stats.add_time('normalize', perf_counter() - start)
+
+        return list(normal_form)
+
+
+
+    def tokenize(self, expression):
+        """
+        Tokenize an expression (see Tokenizer.tokenize()),
+            reading & storing its tokens in the persistent cache if there is one.
+
+        Input: str
+        Output: list of tokens
+        """
+
+        persistent = self.persistent_cache
+        if persistent is None:
+            return self.tokenizer.tokenize(expression)
+
+        tokens = persistent.get('tokenize', expression, self.content_hash())
+        if tokens is None:
+            tokens = self.tokenizer.tokenize(expression)
+            persistent.put('tokenize', expression, self.content_hash(), tokens)
+        return tokens
+
+
+
+    def content_hash(self):
+        """Return the content hash of the config (see CompiledConfig.content_hash()), computed once."""
+
+        if self._content_hash is None:
+            self._content_hash = self.config.content_hash()
+        return self._content_hash
+
+
+
+    def normalize_dag(self, token_name):
+        """
+        Evaluate a pylang token to its normal form held as a compressed DAG (see dag.py),
+            for tokens whose normal forms are too big to materialise.
+        The node reports the length of the normal form (len(), size) without flattening it,
+            & yields its lexemes lazily (iteration, indexing, iter_range(), flatten()).
+        Raise KeyError for an unknown token & ExpansionCycleError for a recursive one.
+
+        Input: str (token name)
+        Output: NormalFormNode
+        """
+
+        stats = self.stats
+        if stats is None:
+            return self.expansion.normal_form_dag(token_name)
+
+        start = perf_counter()
+        node = self.expansion.normal_form_dag(token_name)
+        stats.add_time('normalize_dag', perf_counter() - start)
+        return node
+
+
+
+    def normalize_many(self, token_names, workers=None):
+        """
+        Normalize many pylang tokens on a pool of threads that all share this PyLex,
+            its compiled config & its normal form cache.
+        Normal forms are returned in the same order as the token names.
+
+        Input: iterable of str (token names)
+        Output: list of lists of lexemes
+        """
+
+        if workers == 1:
+            return [self.normalize(token_name) for token_name in token_names]
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.normalize, token_names))
+
+
+
+    def evaluate_expression(self, expression, eval_number):
+        """Evaluate the entire expression (1 evaluation round).
+        Return the remainder of the expression that is still to be evaluated, as a str."""
 
-        counter = 0
+        segments = self.evaluate_segments(self.expansion.tokenize(expression), eval_number)
 
-        for token in token_seq:    # List level
-            for key in token:           # Dict level
+        return segments_text(segments)
 
-                lexeme = token.get(key)
 
-                if key == 'pylang_token':
 
-                    pylang_tokens_discovered_in_definition.append(lexeme)
-                    new_lexeme = self.look_up_token(lexeme)
-                    intermediate_definition_remainder = intermediate_definition_remainder\
-                                                        + new_lexeme
-                    counter = 1
-                    break
+    def evaluate_segments(self, segments, eval_number):
+        """Evaluate an already tokenized expression (1 evaluation round, see ExpansionEngine).
+        Return the remainder that is still to be evaluated, as segments."""
 
-                elif counter == 1:
-                    intermediate_definition_remainder = intermediate_definition_remainder + lexeme
-                    break
+        trace = self.trace
+        stats = self.stats
+        look_up = None
 
-                else:
-                    self.master_list.append(lexeme)
-                    token.clear()
-                    break
+        if trace is not None:
+            trace('round_started', {'round': eval_number})
 
+            def look_up(token_name):
+                if stats is not None:
+                    stats.count('lookups')
+                trace('substitution', {'token': token_name, 'round': eval_number,
+                                       'expression': self.definition(token_name)})
 
-#         print('Intermediate evaluation reveals the following Python Tokens: {}'\
-#               .format(pylang_tokens_discovered_in_definition))
+        elif stats is not None:
+            def look_up(token_name):
+                stats.count('lookups')
 
-        print('intermediate definition of {}: '.format(expression),\
-              *self.master_list, intermediate_definition_remainder)
+        intermediate_definition_remainder = self.expansion.substitute(
+            segments, self.master_list, look_up)
 
-#         print(intermediate_definition_remainder)
+        if trace is not None:
+            trace('round_completed', {'round': eval_number,
+                                      'expression': segments_text(segments),
+                                      'master_list': self.master_list,
+                                      'remainder': segments_text(intermediate_definition_remainder)})
 
         return intermediate_definition_remainder
 
@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+"""
+Reverse lookup: which pylang tokens can produce a concrete string.
+"""
+
+import re
+import unicodedata
+
+from .expansion import ExpansionCycleError
+
+
+# Operator names of the notation used in the definitions (see Tokenizer_configs).
+_ALTERNATION = 'vertical_bar'
+_POSTFIX = {'star': 0, 'plus': 1}     # operator_name -> minimum number of repetitions
+_GROUPS = {'open_paren': ('close_paren', False), 'open_bracket': ('close_bracket', True)}
+_SKIPPED = ('separator',)
+_RANGE = '…'
+
+
+class CharClass(object):
+
+    """
+    CharClass is a set of chars read from a class descriptor of the notation,
+        e.g. <any source character except "\\" or newline> or a range, e.g. a…z.
+
+    Descriptors are free English text, so they are read approximately:
+        'any source character', with the quoted chars & 'newline' listed after 'except' left out;
+        'id_start' / 'id_continue' & the general categories they are defined by,
+            via str.isidentifier(), picked from the descriptor's subject
+            ('all characters in id_start ...'); conditions on NFKC normalization are not
+            applied (approximate is then True);
+        anything else is read as any char (approximate is then True).
+    """
+
+    __slots__ = ('description', 'low', 'high', 'excluded', 'predicate', 'approximate')
+
+
+    def __init__(self, description, low=None, high=None, excluded='', predicate=None,
+                 approximate=False):
+        self.description = description
+        self.low = low
+        self.high = high
+        self.excluded = frozenset(excluded)
+        self.predicate = predicate
+        self.approximate = approximate
+
+
+    @classmethod
+    def from_range(cls, low, high):
+        return cls('{}…{}'.format(low, high), low=low, high=high)
+
+
+    @classmethod
+    def from_descriptor(cls, descriptor):
+        """Read a class descriptor phrase, e.g. '<any source character except "\\">'."""
+
+        text = descriptor.strip('<>')
+
+        excluded = ''
+        head, _, exceptions = text.partition(' except ')
+        if exceptions:
+            excluded = ''.join(re.findall(r'"(.)"', exceptions) + re.findall(r"'(.)'", exceptions))
+            if 'newline' in exceptions:
+                excluded += '\n\r'
+
+        # The set is named by the descriptor's subject ('all characters in id_start ...'),
+        #   unless categories are added to it ('..., plus characters in the categories Nd').
+        # Other class names further on (e.g. in an NFKC condition) say nothing of the set.
+        subject = re.match(r'all characters in (id_start|id_continue)\b', head)
+        if ' plus ' in head and 'Nd' in head:
+            predicate = _is_id_continue
+        elif subject is not None:
+            predicate = _is_id_start if subject.group(1) == 'id_start' else _is_id_continue
+        elif 'Lu' in head:
+            predicate = _is_id_start
+        elif 'Nd' in head:
+            predicate = _is_id_continue
+        else:
+            predicate = None
+        if predicate is not None:
+            # NFKC normalization is not applied: xid_start & xid_continue are read approximately.
+            return cls(descriptor, excluded=excluded, predicate=predicate,
+                       approximate='NFKC' in head)
+        if 'any source character' in head or 'any character' in head:
+            return cls(descriptor, excluded=excluded,
+                       approximate='quote' in exceptions)
+        return cls(descriptor, excluded=excluded, approximate=True)
+
+
+    def __contains__(self, char):
+        if char in self.excluded:
+            return False
+        if self.low is not None:
+            return self.low <= char <= self.high
+        if self.predicate is not None:
+            return self.predicate(char)
+        return True
+
+
+    def __repr__(self):
+        return '<CharClass {}>'.format(self.description)
+
+
+
+def _is_id_start(char):
+    return char.isidentifier()
+
+
+def _is_id_continue(char):
+    return ('a' + char).isidentifier() or unicodedata.category(char) in ('Mn', 'Mc', 'Nd', 'Pc')
+
+
+
+class TokenRecognizer(object):
+
+    """
+    TokenRecognizer matches a string against every pylang token of a config at once.
+
+    Each token's definition is parsed (as tokenized by the Tokenizer) into a pattern:
+        quoted strings are literals, a…z is a range, <...> is a char class (see CharClass),
+        juxtaposition is a sequence, | an alternation, ( ) a group, [ ] an option,
+        * & + repetitions, & a pylang token is its own definition, as a group.
+    Every pattern is compiled into a fragment of 1 nondeterministic automaton (Thompson),
+        whose accepting states are labelled with their token names.
+    Matching runs that single automaton over the input once, as a DFA built lazily:
+        each set of automaton states met is turned into 1 DFA state, with its transitions
+        cached per char, so repeated matches are dict lookups per char.
+
+    Tokens that cannot be compiled (blank definitions, definitions of separators only,
+        undefined or recursive references, syntax errors) are listed in errors. Tokens whose class descriptors could only be
+        read approximately are listed in approximate.
+
+    Example:
+
+        recognizer = TokenRecognizer.build(PyLex(interactive=False))
+        recognizer.match('abc_d')              -> ('identifier', 'name')
+        recognizer.match('"spam"')             -> ('stringliteral', 'shortstring')
+        recognizer.longest_match('spam = 1')   -> (4, ('identifier', 'name'))
+
+    """
+
+
+    def __init__(self, token_names, max_dfa_states=10000):
+        """Instantiate an empty recognizer. Use build() to compile a config."""
+
+        self.token_names = tuple(token_names)
+        self.max_dfa_states = max_dfa_states
+
+        self.errors = {}
+        self.approximate = set()
+
+        # The automaton: per state, a dict of char -> target states, a list of
+        # (CharClass, target state) & a list of epsilon target states.
+        self._char_edges = []
+        self._class_edges = []
+        self._epsilons = []
+        self._accepts = {}     # state -> token name
+        self._start = self._new_state()
+
+        self._closures = {}
+        self._start_closure = None
+        self._dfa_ids = {}
+        self._dfa_states = []
+        self._dfa_edges = []
+        self._dfa_accepts = []
+
+
+    @classmethod
+    def build(cls, pylex, token_names=None, max_dfa_states=10000):
+        """
+        Compile the definitions of a PyLex's tokens (all of its config's by default).
+
+        Input: PyLex
+        Output: TokenRecognizer
+        """
+
+        if token_names is None:
+            token_names = pylex.config.token_names
+
+        recognizer = cls(token_names, max_dfa_states)
+        parser = _PatternParser(pylex.tokenizer, pylex.config.expressions)
+
+        for token_name in recognizer.token_names:
+            try:
+                pattern = parser.pattern(token_name)
+            except (KeyError, ValueError) as error:
+                recognizer.errors[token_name] = error.args[0] if error.args else str(error)
+                continue
+            if token_name in parser.approximate:
+                recognizer.approximate.add(token_name)
+            start, end = recognizer._compile(pattern)
+            recognizer._epsilons[recognizer._start].append(start)
+            recognizer._accepts[end] = token_name
+
+        return recognizer
+
+
+    def match(self, text):
+        """
+        Return the names of the tokens whose definitions match the whole text,
+            in config order.
+
+        Input: str
+        Output: tuple of token names
+        """
+
+        state = self._dfa_start()
+        edges = self._dfa_edges
+
+        for char in text:
+            target = edges[state].get(char)
+            if target is None:
+                target = self._dfa_step(state, char)
+            if target == 0:
+                return ()
+            state = target
+
+        return self._dfa_accepts[state]
+
+
+    def longest_match(self, text, start=0):
+        """
+        Find the longest prefix of text[start:] that some token matches.
+        Return its end index & the tokens that match it, or (start, ()) if none does.
+
+        Input: str, int
+        Output: (int, tuple of token names)
+        """
+
+        state = self._dfa_start()
+        edges = self._dfa_edges
+        accepts = self._dfa_accepts
+
+        best = (start, accepts[state])
+        for i in range(start, len(text)):
+            char = text[i]
+            target = edges[state].get(char)
+            if target is None:
+                target = self._dfa_step(state, char)
+            if target == 0:
+                break
+            state = target
+            if accepts[state]:
+                best = (i + 1, accepts[state])
+
+        return best
+
+
+    def dfa_size(self):
+        """Return the number of DFA states built so far."""
+
+        return len(self._dfa_states)
+
+
+    def nfa_size(self):
+        """Return the number of states of the compiled automaton."""
+
+        return len(self._epsilons)
+
+
+    # Automaton construction
+
+    def _new_state(self):
+        self._char_edges.append({})
+        self._class_edges.append([])
+        self._epsilons.append([])
+        return len(self._epsilons) - 1
+
+
+    def _compile(self, pattern):
+        """Compile a pattern into a fragment of the automaton. Return its (start, end) states."""
+
+        kind = pattern[0]
+        start = self._new_state()
+
+        if kind == 'literal':
+            state = start
+            for char in pattern[1]:
+                target = self._new_state()
+                self._char_edges[state].setdefault(char, []).append(target)
+                state = target
+            return start, state
+
+        if kind == 'class':
+            end = self._new_state()
+            self._class_edges[start].append((pattern[1], end))
+            return start, end
+
+        end = self._new_state()
+
+        if kind == 'sequence':
+            state = start
+            for item in pattern[1]:
+                item_start, item_end = self._compile(item)
+                self._epsilons[state].append(item_start)
+                state = item_end
+            self._epsilons[state].append(end)
+
+        elif kind == 'alternation':
+            for item in pattern[1]:
+                item_start, item_end = self._compile(item)
+                self._epsilons[start].append(item_start)
+                self._epsilons[item_end].append(end)
+
+        elif kind == 'repeat':
+            item, minimum = pattern[1], pattern[2]
+            item_start, item_end = self._compile(item)
+            self._epsilons[start].append(item_start)
+            self._epsilons[item_end].extend((item_start, end))
+            if minimum == 0:
+                self._epsilons[start].append(end)
+
+        elif kind == 'option':
+            item_start, item_end = self._compile(pattern[1])
+            self._epsilons[start].extend((item_start, end))
+            self._epsilons[item_end].append(end)
+
+        return start, end
+
+
+    # Lazy DFA
+
+    def _closure(self, states):
+        """Return the epsilon closure of a set of automaton states, as a frozenset,
+            leaving out the states that only have epsilon edges.
+        The closure of each single state is computed once & cached."""
+
+        closures = self._closures
+        epsilons = self._epsilons
+        closure = set()
+
+        for state in states:
+            state_closure = closures.get(state)
+            if state_closure is None:
+                state_closure = {state}
+                stack = [state]
+                while stack:
+                    for target in epsilons[stack.pop()]:
+                        if target not in state_closure:
+                            state_closure.add(target)
+                            stack.append(target)
+                # Only states with char edges, or accepting ones, tell DFA states apart.
+                state_closure = closures[state] = frozenset(
+                    [target for target in state_closure
+                     if self._char_edges[target] or self._class_edges[target]
+                     or target in self._accepts])
+            closure |= state_closure
+
+        return frozenset(closure)
+
+
+    def _dfa_state(self, states):
+        """Return the id of the DFA state for a closed set of automaton states."""
+
+        dfa_id = self._dfa_ids.get(states)
+        if dfa_id is None:
+            dfa_id = len(self._dfa_states)
+            self._dfa_states.append(states)
+            self._dfa_edges.append({})
+            accepted = {self._accepts[state] for state in states if state in self._accepts}
+            self._dfa_accepts.append(tuple(name for name in self.token_names
+                                           if name in accepted))
+            self._dfa_ids[states] = dfa_id
+        return dfa_id
+
+
+    def _dfa_start(self):
+        """Return the id of the start DFA state. Once more than max_dfa_states were built,
+        the DFA is dropped & rebuilt from scratch, so its memory stays bounded."""
+
+        if not self._dfa_states or len(self._dfa_states) > self.max_dfa_states:
+            self._dfa_ids = {}
+            self._dfa_states = []
+            self._dfa_edges = []
+            self._dfa_accepts = []
+            self._dfa_state(frozenset())     # Id 0: the dead state
+            self._start_closure = self._closure([self._start])
+        start = self._dfa_ids.get(self._start_closure)
+        if start is None:
+            start = self._dfa_state(self._start_closure)
+        return start
+
+
+    def _dfa_step(self, dfa_id, char):
+        """Build & cache the transition of a DFA state on a char. Return the target id."""
+
+        targets = []
+        for state in self._dfa_states[dfa_id]:
+            targets.extend(self._char_edges[state].get(char, ()))
+            for char_class, target in self._class_edges[state]:
+                if char in char_class:
+                    targets.append(target)
+
+        target_id = self._dfa_state(self._closure(targets)) if targets else 0
+        self._dfa_edges[dfa_id][char] = target_id
+        return target_id
+
+
+
+class _PatternParser(object):
+
+    """Parse token definitions into patterns (nested tuples), following pylang tokens."""
+
+
+    def __init__(self, tokenizer, expressions):
+        self.tokenizer = tokenizer
+        self.expressions = expressions
+        self.patterns = {}
+        self.approximate = set()
+        self._path = []
+
+
+    def pattern(self, token_name):
+        """Return the pattern of a token, with its pylang tokens replaced by their patterns."""
+
+        pattern = self.patterns.get(token_name)
+        if pattern is not None:
+            return pattern
+
+        if token_name in self._path:
+            raise ExpansionCycleError(self._path[self._path.index(token_name):] + [token_name])
+
+        expression = self.expressions.get(token_name)
+        if expression is None:
+            raise KeyError('blank or undefined definition: {}'.format(token_name))
+
+        self._path.append(token_name)
+        try:
+            tokens = [next(iter(token.items())) for token in self.tokenizer.tokenize(expression)]
+            tokens = [token for token in tokens if token[0] not in _SKIPPED]
+            if not tokens:
+                # It would match the empty string, which no token stands for.
+                raise ValueError('empty definition: {}'.format(token_name))
+            pattern, i = self._alternation(tokens, 0, token_name)
+            if i != len(tokens):
+                raise ValueError('unexpected {!r} in the definition of {}'\
+                                 .format(tokens[i][1], token_name))
+        finally:
+            self._path.pop()
+
+        self.patterns[token_name] = pattern
+        return pattern
+
+
+    def _alternation(self, tokens, i, token_name):
+        items = []
+        while True:
+            item, i = self._sequence(tokens, i, token_name)
+            items.append(item)
+            if i < len(tokens) and tokens[i][0] == _ALTERNATION:
+                i += 1
+                continue
+            break
+        return (items[0] if len(items) == 1 else ('alternation', tuple(items))), i
+
+
+    def _sequence(self, tokens, i, token_name):
+        items = []
+        while i < len(tokens) and tokens[i][0] != _ALTERNATION \
+                and tokens[i][0] not in ('close_paren', 'close_bracket'):
+            item, i = self._atom(tokens, i, token_name)
+            while i < len(tokens) and tokens[i][0] in _POSTFIX:
+                item = ('repeat', item, _POSTFIX[tokens[i][0]])
+                i += 1
+            items.append(item)
+        return (items[0] if len(items) == 1 else ('sequence', tuple(items))), i
+
+
+    def _atom(self, tokens, i, token_name):
+        key, text = tokens[i]
+
+        if key in _GROUPS:
+            closer, optional = _GROUPS[key]
+            item, i = self._alternation(tokens, i + 1, token_name)
+            if i >= len(tokens) or tokens[i][0] != closer:
+                raise ValueError('unbalanced {!r} in the definition of {}'.format(text, token_name))
+            return (('option', item) if optional else item), i + 1
+
+        if key == 'pylang_token':
+            sub_pattern = self.pattern(text)
+            if text in self.approximate:
+                self.approximate.add(token_name)
+            return sub_pattern, i + 1
+
+        if key == 'class_descriptor':
+            char_class = CharClass.from_descriptor(text)
+            if char_class.approximate:
+                self.approximate.add(token_name)
+            return ('class', char_class), i + 1
+
+        if key == 'pylang_definition_string':
+            literal = text[1:-1]
+        elif key == 'definition_extras':
+            low, separator, high = text.partition(_RANGE)
+            if separator and len(low) == 1 and len(high) == 1:
+                return ('class', CharClass.from_range(low, high)), i + 1
+            literal = text
+        elif key == 'Syntax Error':
+            raise ValueError('syntax error in the definition of {}: {!r}'.format(token_name, text))
+        else:
+            literal = text
+
+        # A range written as 3 tokens: "a" … "z"
+        if i + 2 < len(tokens) and tokens[i + 1][1] == _RANGE:
+            high_key, high = tokens[i + 2]
+            if high_key == 'pylang_definition_string':
+                high = high[1:-1]
+            if len(literal) == 1 and len(high) == 1:
+                return ('class', CharClass.from_range(literal, high)), i + 3
+
+        return ('literal', literal), i + 1
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Hot reloading of the config workbook for long-running processes.
+"""
+
+import os
+import threading
+from time import perf_counter
+
+from pylex import _config_file
+from .config import _hash_file, load_config
+from .pylex import PyLex
+
+
+class ConfigWatcher(object):
+
+    """
+    ConfigWatcher keeps a PyLex up to date with its config workbook, without restarts.
+
+    A background thread polls the workbook every interval seconds.
+    When its mtime or size change (or, with check_hash, its contents),
+        the workbook is compiled again (see config.load_config()) & a new PyLex
+        (with its own Lexer & Tokenizer tables) is built on the polling thread.
+    The new PyLex is then swapped in by a single attribute assignment:
+        a request that took watcher.pylex before the swap finishes on the old snapshot,
+        & every request after it sees the new one.
+
+    Caches are carried over selectively (see invalidated_tokens()):
+        if only token definitions changed, the cached normal forms & tokenized definitions
+        of every token that does not depend on a changed token, directly or not, are kept.
+        If the Lexer or Tokenizer sheets changed, nothing is kept.
+
+    Example:
+
+        with ConfigWatcher(interval=2.0) as watcher:
+            ...
+            pylex = watcher.pylex         # take 1 snapshot per request
+            pylex.normalize('name')
+
+    """
+
+
+    def __init__(self, config_file=_config_file, interval=1.0, check_hash=False,
+                 cache_size=256, on_reload=None, on_error=None, stats=None):
+        """Instantiate a watcher & build the first PyLex. Polling starts with start().
+        on_reload, if given, is called after each swap as on_reload(old, new, invalidated),
+            where invalidated is the set of token names whose cached entries were dropped
+            (None if every cache was dropped).
+        on_error, if given, is called with the exception when a reload fails;
+            the old PyLex is then kept & the workbook is tried again on the next poll.
+        stats, a Stats object (see stats.py), is shared by every PyLex built."""
+
+        self.config_file = os.path.abspath(config_file)
+        self.interval = interval
+        self.check_hash = check_hash
+        self.cache_size = cache_size
+        self.on_reload = on_reload
+        self.on_error = on_error
+        self.stats = stats
+
+        self._stamp = self._read_stamp()
+        self._file_hash = _hash_file(self.config_file)
+        self.pylex = self._build(load_config(self.config_file, stats=stats))
+        self.reloads = 0
+
+        self._reload_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+    def start(self):
+        """Start polling on a daemon thread."""
+
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._poll, name='pylex-config-watcher',
+                                            daemon=True)
+            self._thread.start()
+
+
+    def stop(self):
+        """Stop polling & wait for the polling thread to end."""
+
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+
+    def _poll(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as error:
+                if self.on_error is not None:
+                    self.on_error(error)
+
+
+    def check(self):
+        """
+        Poll the workbook once. Reload it if it has changed.
+        Return True if a new PyLex was swapped in.
+        """
+
+        stamp = self._read_stamp()
+        if stamp == self._stamp and not self.check_hash:
+            return False
+
+        file_hash = _hash_file(self.config_file)
+        if file_hash == self._file_hash:
+            self._stamp = stamp
+            return False
+
+        # Only recorded once the reload has succeeded, so that a file that fails to load
+        #   (half saved, unreadable...) is retried on the next poll.
+        swapped = self.reload()
+        self._stamp = stamp
+        self._file_hash = file_hash
+
+        return swapped
+
+
+    def reload(self):
+        """
+        Compile the workbook, build a new PyLex & swap it in, keeping what caches are still valid.
+        Return True if a new PyLex was swapped in (False if the compiled config is unchanged).
+        """
+
+        with self._reload_lock:
+            start = perf_counter()
+
+            old = self.pylex
+            config = load_config(self.config_file, stats=self.stats, refresh=True)
+            if config.content_hash() == old.config.content_hash():
+                return False
+
+            new = self._build(config)
+            invalidated = invalidated_tokens(old, config)
+            carry_over(old, new, invalidated)
+
+            self.pylex = new
+            self.reloads += 1
+
+            if self.stats is not None:
+                self.stats.add_time('config.reload', perf_counter() - start)
+                self.stats.count('config.reloads')
+
+        if self.on_reload is not None:
+            self.on_reload(old, new, invalidated)
+
+        return True
+
+
+    def _build(self, config):
+        return PyLex(self.config_file, config=config, interactive=False,
+                     cache_size=self.cache_size, stats=self.stats)
+
+
+    def _read_stamp(self):
+        stat = os.stat(self.config_file)
+        return stat.st_mtime_ns, stat.st_size
+
+
+
+def invalidated_tokens(pylex, config):
+    """
+    Return the tokens whose cached entries in pylex are stale under a new config:
+        tokens whose definitions were added, removed or edited,
+        tokens whose definitions mention a token name that was added or removed
+            (they now tokenize differently),
+        & every token that depends on any of those, directly or not.
+    Return None if the Lexer or Tokenizer data changed, which makes every cache stale.
+
+    Dependencies are read from the definitions pylex has already tokenized:
+        a token can only have a cached normal form if its whole closure was tokenized.
+
+    Input: PyLex, CompiledConfig (the new one)
+    Output: set of token names, or None
+    """
+
+    old = pylex.config
+
+    if (old.delimiters != config.delimiters
+            or old.priority_char_seqs != config.priority_char_seqs
+            or old.operators != config.operators
+            or old.phrase_openers != config.phrase_openers
+            or old.phrase_closers != config.phrase_closers
+            or old.phrase_names != config.phrase_names):
+        return None
+
+    changed = {token_name for token_name in set(old.expressions) | set(config.expressions)
+               if old.expressions.get(token_name) != config.expressions.get(token_name)}
+
+    # Copied first: request threads may still be adding definitions while this runs.
+    definitions = list(pylex.expansion.definitions.items())
+    renamed = old.token_name_set ^ config.token_name_set
+    if renamed:
+        changed.update(token_name for token_name, segments in definitions
+                       if any(text in renamed for text, is_pylang_token in segments))
+
+    dependents = {}
+    for token_name, segments in definitions:
+        for text, is_pylang_token in segments:
+            if is_pylang_token:
+                dependents.setdefault(text, set()).add(token_name)
+
+    invalidated = set()
+    stack = list(changed)
+    while stack:
+        token_name = stack.pop()
+        if token_name not in invalidated:
+            invalidated.add(token_name)
+            stack.extend(dependents.get(token_name, ()))
+
+    return invalidated
+
+
+def carry_over(old, new, invalidated):
+    """
+    Copy the still valid cache entries of 1 PyLex into another:
+        tokenized definitions & normal forms of every token not in invalidated.
+    Nothing is copied if invalidated is None.
+
+    Input: PyLex, PyLex, set of token names or None
+    """
+
+    if invalidated is None:
+        return
+
+    # Copied first: request threads may still be adding definitions while this runs.
+    new.expansion.definitions.update(
+        (token_name, segments) for token_name, segments in list(old.expansion.definitions.items())
+        if token_name not in invalidated)
+
+    for token_name, normal_form in old.normal_forms.items():
+        if token_name not in invalidated:
+            new.normal_forms.put(token_name, normal_form)
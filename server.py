@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+A long-lived PyLex service: JSON over HTTP, on localhost or on a Unix socket.
+
+Run:
+    python -m pylex.server --port 8765
+    python -m pylex.server --unix /tmp/pylex.sock
+
+Requests:
+    POST /look_up_token   {"token": "name"}             -> {"token": ..., "definition": ...}
+    POST /normalize       {"token": "name"}             -> {"token": ..., "normal_form": [...]}
+    POST /tokenize        {"expression": "a…z | '_'"}   -> {"expression": ..., "tokens": [...]}
+    GET  /health                                        -> {"status": "ok", "pending": ...}
+    GET  /stats                                         -> the server's Stats.to_dict()
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from pylex import _config_file
+from .expansion import ExpansionCycleError
+from .pylex import PyLex
+
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 422: 'Unprocessable Entity',
+            431: 'Request Header Fields Too Large',
+            500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class RequestError(Exception):
+
+    """An error reported to the client as an HTTP status & a JSON {"error": ...} body."""
+
+    def __init__(self, status, message):
+        self.status = status
+        super().__init__(message)
+
+
+
+class PyLexServer(object):
+
+    """
+    PyLexServer answers token lookups, normal forms & tokenizing requests from many clients.
+
+    The config is loaded once, into 1 PyLex (quiet, not interactive) that every request shares,
+        along with its normal form cache.
+    Lookups are answered on the event loop. Normalizing & tokenizing run on a thread pool
+        (workers threads), so a long expansion never holds up other clients.
+
+    Backpressure:
+        at most max_pending requests are handled at once; any more are answered at once
+            with 503 & a Retry-After header, instead of queueing without bound,
+        request bodies over max_body bytes are refused (413),
+        & a client that sends nothing for idle_timeout seconds is disconnected.
+
+    Example:
+
+        server = PyLexServer(workers=4)
+        asyncio.run(server.serve(port=8765))
+
+    """
+
+
+    def __init__(self, config_file=_config_file, config=None, pylex=None, workers=None,
+                 max_pending=64, max_body=1 << 20, idle_timeout=30.0, stats=None):
+        """Instantiate a server over a PyLex (built from config_file or config if not given).
+        stats, a Stats object (see stats.py), records per-request timings & counters."""
+
+        if pylex is None:
+            pylex = PyLex(config_file, config=config, interactive=False, stats=stats)
+        self.pylex = pylex
+        self.stats = stats
+
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.idle_timeout = idle_timeout
+
+        self.pending = 0
+
+        self.routes = {
+            ('POST', '/look_up_token'): self.look_up_token,
+            ('POST', '/normalize'): self.normalize,
+            ('POST', '/tokenize'): self.tokenize,
+            ('GET', '/health'): self.health,
+            ('GET', '/stats'): self.stats_report,
+        }
+
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None, ready=None):
+        """
+        Serve until cancelled: on a Unix socket if path is given, else on host:port.
+        ready, if given, is an asyncio.Event set once the server is listening.
+        """
+
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path=path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+
+        if ready is not None:
+            ready.set()
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False)
+
+
+    async def handle_connection(self, reader, writer):
+        """Answer the HTTP/1.1 requests of 1 connection, one after the other (keep-alive)."""
+
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader),
+                                                     self.idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except RequestError as error:
+                    await self.write_response(writer, error.status, {'error': str(error)},
+                                              keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                status, payload, extra_headers = await self.dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.write_response(writer, status, payload, keep_alive, extra_headers)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+
+    async def read_request(self, reader):
+        """
+        Read 1 HTTP request. Return None at the end of the connection.
+
+        Output: (method, path, dict of lower-case headers, bytes body)
+        """
+
+        request_line = await _read_line(reader, 400, 'Request line too long')
+        if not request_line:
+            return None
+
+        try:
+            method, path, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise RequestError(400, 'Malformed request line')
+
+        headers = {}
+        while True:
+            line = await _read_line(reader, 431, 'Header line too long')
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise RequestError(400, 'Malformed Content-Length')
+        if length > self.max_body:
+            raise RequestError(413, 'Request body over {} bytes'.format(self.max_body))
+
+        body = await reader.readexactly(length) if length else b''
+
+        return method, path.split('?', 1)[0], headers, body
+
+
+    async def write_response(self, writer, status, payload, keep_alive=True, extra_headers=()):
+        """Write 1 JSON response."""
+
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = ['HTTP/1.1 {} {}'.format(status, _REASONS.get(status, '')),
+                'Content-Type: application/json; charset=utf-8',
+                'Content-Length: {}'.format(len(body)),
+                'Connection: {}'.format('keep-alive' if keep_alive else 'close')]
+        head.extend('{}: {}'.format(name, value) for name, value in extra_headers)
+
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+    async def dispatch(self, method, path, body):
+        """
+        Route 1 request to its handler, within the max_pending limit.
+
+        Output: (status, JSON-able payload, list of extra headers)
+        """
+
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for route_method, route_path in self.routes):
+                return 405, {'error': 'Method not allowed'}, []
+            return 404, {'error': 'No such endpoint: {}'.format(path)}, []
+
+        if self.pending >= self.max_pending:
+            if self.stats is not None:
+                self.stats.count('server.rejected')
+            return 503, {'error': 'Server busy, retry later'}, [('Retry-After', '1')]
+
+        self.pending += 1
+        start = perf_counter()
+        try:
+            if method == 'POST':
+                try:
+                    params = json.loads(body.decode('utf-8')) if body else {}
+                except ValueError:
+                    raise RequestError(400, 'The request body is not valid JSON')
+                if not isinstance(params, dict):
+                    raise RequestError(400, 'The request body must be a JSON object')
+                payload = await handler(params)
+            else:
+                payload = await handler()
+            status = 200
+
+        except RequestError as error:
+            status, payload = error.status, {'error': str(error)}
+        except KeyError as error:
+            status, payload = 404, {'error': error.args[0] if error.args else str(error)}
+        except ExpansionCycleError as error:
+            status, payload = 422, {'error': str(error), 'cycle': list(error.cycle)}
+        except Exception as error:
+            status, payload = 500, {'error': '{}: {}'.format(type(error).__name__, error)}
+
+        finally:
+            self.pending -= 1
+
+        if self.stats is not None:
+            self.stats.add_time('server' + path.replace('/', '.'), perf_counter() - start)
+            self.stats.count('server.status_{}'.format(status))
+
+        return status, payload, []
+
+
+    async def run_in_executor(self, function, *args):
+        """Run a CPU-heavy call on the thread pool."""
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+
+    async def look_up_token(self, params):
+        token_name = _param(params, 'token')
+        definition = self.pylex.look_up_token(token_name)
+        if definition is None:
+            raise KeyError('The token name {!r} is not found in the list of tokens '\
+                           'used by the Python lexical analyzer.'.format(token_name))
+        return {'token': token_name, 'definition': definition}
+
+
+    async def normalize(self, params):
+        token_name = _param(params, 'token')
+        normal_form = await self.run_in_executor(self.pylex.normalize, token_name)
+        return {'token': token_name, 'normal_form': normal_form}
+
+
+    async def tokenize(self, params):
+        expression = _param(params, 'expression')
+        tokens = await self.run_in_executor(self.pylex.tokenize, expression)
+        return {'expression': expression, 'tokens': tokens}
+
+
+    async def health(self):
+        return {'status': 'ok', 'pending': self.pending, 'max_pending': self.max_pending}
+
+
+    async def stats_report(self):
+        if self.stats is None:
+            return {'normal_forms': self.pylex.normal_forms.stats()}
+        return self.stats.to_dict()
+
+
+
+async def _read_line(reader, status, message):
+    """Read 1 line of a request. A line over the reader's limit is a RequestError."""
+
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        raise RequestError(status, message)
+
+
+def _param(params, name):
+    """Return a required str parameter of a request."""
+
+    value = params.get(name)
+    if not isinstance(value, str):
+        raise RequestError(400, 'Missing str parameter: {!r}'.format(name))
+    return value
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve PyLex lookups as JSON over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help='listen on a Unix socket instead')
+    parser.add_argument('--config', default=_config_file, help='path of PyLex_configs.xlsx')
+    parser.add_argument('--workers', type=int, default=None, help='executor threads')
+    parser.add_argument('--max-pending', type=int, default=64,
+                        help='requests handled at once before answering 503')
+    args = parser.parse_args(argv)
+
+    from .stats import Stats
+
+    server = PyLexServer(args.config, workers=args.workers, max_pending=args.max_pending,
+                         stats=Stats())
+
+    if args.unix and os.path.exists(args.unix):
+        os.unlink(args.unix)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, path=args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+Config-driven tokenizing of real Python source files, with line/column positions.
+
+Only part of the lexing rules come from the config: its delimiters, priority sequences
+    & operator names (Lexer_configs & Tokenizer_configs).
+The config describes the notation of the Python reference, not Python source,
+    so it lacks most of Python's punctuation ('{', ',', '%', '**=', ...).
+The rest is fixed here, not read from the config: SOURCE_DELIMITERS, SOURCE_OPERATORS
+    & AUGMENTABLE_OPERATORS, along with the patterns for strings, comments, numbers,
+    newlines & indentation. Editing the config does not change them.
+"""
+
+import io
+import os
+import re
+from collections import namedtuple
+from time import perf_counter
+
+from pylex import _config_file
+from .bulk import map_chunks, worker, worker_pool
+from .config import CompiledConfig, load_config
+from .lexer import lexeme_pattern
+
+
+# Python punctuation the source lexer always slices on, on top of the config's delimiters.
+# Fixed: not read from the config (see the module docstring).
+# Whitespace, newlines, '#' & quotes are delimiters too, so a run of other chars never spans them.
+SOURCE_DELIMITERS = frozenset(' \t\f\r\n#\'"\\()[]{}<>=+-*/%&|^~@!:;,.$?`')
+
+# Operator names for Python punctuation missing from the config's Tokenizer_configs.
+# Fixed, like SOURCE_DELIMITERS. The config's own names win for any symbol it defines.
+SOURCE_OPERATORS = {
+    '(': 'open_paren', ')': 'close_paren', '[': 'open_bracket', ']': 'close_bracket',
+    '{': 'open_brace', '}': 'close_brace', ',': 'comma', ';': 'semicolon', ':': 'colon',
+    '.': 'dot', '=': 'assignment', '+': 'plus', '-': 'hyphen', '*': 'star', '/': 'slash',
+    '%': 'percent', '&': 'ampersand', '|': 'vertical_bar', '^': 'caret', '~': 'tilde',
+    '@': 'at', '!': 'exclamation', '<': 'less_than', '>': 'greater_than', '\\': 'backslash',
+    '...': 'ellipsis', '**': 'double_star', '//': 'double_slash', '<<': 'left_shift',
+    '>>': 'right_shift', '==': 'equal', '!=': 'not_equal', '<=': 'less_equal',
+    '>=': 'greater_equal', '->': 'arrow', ':=': 'walrus',
+}
+
+# Operators that can be followed by '=' to make an augmented assignment, e.g. '+='.
+AUGMENTABLE_OPERATORS = ('+', '-', '*', '/', '%', '&', '|', '^', '@', '**', '//', '<<', '>>')
+
+_OPENING_BRACKETS = frozenset('([{')
+_CLOSING_BRACKETS = frozenset(')]}')
+
+_TAB_SIZE = 8
+
+
+_string_prefix = r'(?:[bB][rR]?|[rR][bBfF]?|[uU]|[fF][rR]?)?'
+
+_number = '|'.join([
+    r'0[xX](?:_?[0-9a-fA-F])+',
+    r'0[bB](?:_?[01])+',
+    r'0[oO](?:_?[0-7])+',
+    r'(?:[0-9](?:_?[0-9])*\.(?:[0-9](?:_?[0-9])*)?|\.[0-9](?:_?[0-9])*)'
+    r'(?:[eE][-+]?[0-9](?:_?[0-9])*)?[jJ]?',
+    r'[0-9](?:_?[0-9])*(?:[eE][-+]?[0-9](?:_?[0-9])*[jJ]?|[jJ])',
+    r'0(?:_?0)*|[1-9](?:_?[0-9])*',
+])
+
+# What the config cannot describe: strings, comments, newlines, continuations,
+# whitespace & numbers. Everything else is left to the config-driven lexeme pattern.
+_source_patterns = [
+    ('string', _string_prefix + '(?:'
+               r"'''[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*'''" '|'
+               r'"""[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""' '|'
+               r"'[^\r\n'\\]*(?:\\.[^\r\n'\\]*)*'" '|'
+               r'"[^\r\n"\\]*(?:\\.[^\r\n"\\]*)*"' ')'),
+    ('unterminated_string', _string_prefix + '(?:'
+               r"'''.*|" r'""".*|'
+               r"'[^\r\n'\\]*(?:\\.[^\r\n'\\]*)*" '|'
+               r'"[^\r\n"\\]*(?:\\.[^\r\n"\\]*)*' ')'),
+    ('comment', r'#[^\r\n]*'),
+    ('newline', r'\r\n|\r|\n'),
+    ('continuation', r'\\(?:\r\n|\r|\n)'),
+    ('whitespace', r'[ \t\f]+'),
+    ('number', '(?:{})'.format(_number)),
+]
+
+
+class SourceToken(namedtuple('SourceToken', 'kind text start end')):
+
+    """
+    1 token of a Python source file: its kind, its text,
+        & the (row, column) of its first char & of the char after its last,
+        with rows counted from 1 & columns from 0 (as in the stdlib tokenize module).
+    """
+
+    __slots__ = ()
+
+
+
+class SourceFile(namedtuple('SourceFile', 'path size tokens error')):
+
+    """
+    The result of tokenizing 1 file: its path, its size in bytes,
+        & its list of SourceTokens, or the error that kept it from being read (tokens is None).
+    """
+
+    __slots__ = ()
+
+
+
+class SourceTokenizer(object):
+
+    """
+    SourceTokenizer tokenizes whole Python source files with the lexing rules of the config.
+
+    Lexer & Tokenizer only ever see short definition strings, which have no lines,
+        no indentation, no comments & no string literals with escapes.
+    SourceTokenizer adds the structure of a source file around the config-driven rules:
+
+        Lexing rules:   the config's delimiters & priority sequences, extended with the Python
+                        punctuation the config lacks (SOURCE_DELIMITERS & the multi-char
+                        operators of SOURCE_OPERATORS). Priority sequences made of non-delimiter
+                        chars would split names, so they are left out.
+        Operator names: the config's operator names (Tokenizer_configs), then SOURCE_OPERATORS
+                        for any symbol it lacks. '<' & quotes open no phrase here:
+                        in source, '<' is an operator & quotes start string literals.
+        Source layer:   strings (prefixes, triple quotes, escapes), comments, numbers,
+                        newlines, backslash continuations & indentation.
+
+    All of it is compiled into 1 regular expression, scanned once over the whole source
+        (see Lexer's regex engine).
+
+    Token kinds:
+        operator names  e.g. 'open_paren', 'assignment', 'double_star', 'plus_assignment'
+        'name', 'number', 'string', 'comment'
+        'newline'       the end of a logical line
+        'nl'            a line break inside brackets, or ending a blank or comment-only line
+        'indent', 'dedent', 'endmarker'
+        'error_token'   a char that is neither an operator nor part of a name
+        'Syntax Error'  an unterminated string (to the end of its line, or of the file if it is
+                        triple-quoted), a dedent to no enclosing indentation, or brackets still
+                        open at the end of the file
+
+    Whitespace & backslash continuations are not tokens: their extent is in the positions.
+    Unlike the stdlib tokenize module, no 'encoding' token is produced, nothing is raised
+        on malformed input, & f-strings are read as single strings.
+
+    Example:
+
+        source_tokenizer = SourceTokenizer()
+        source_tokenizer.tokenize('x = (1,\\n     2)\\n')
+            -> [SourceToken(kind='name', text='x', start=(1, 0), end=(1, 1)),
+                SourceToken(kind='assignment', text='=', start=(1, 2), end=(1, 3)), ...]
+
+        for source_file in source_tokenizer.tokenize_tree('src/', workers=4):
+            print(source_file.path, len(source_file.tokens))
+
+    """
+
+
+    def __init__(self, config_file=_config_file, config=None, stats=None):
+        """Instantiate over the config (see config.load_config()).
+        stats, a Stats object (see stats.py), switches instrumentation on."""
+
+        self.stats = stats
+
+        if config is None:
+            config = load_config(config_file, stats=stats)
+        self.config = config
+
+        self.delimiters = frozenset(config.delimiters) | SOURCE_DELIMITERS
+
+        operators = dict(SOURCE_OPERATORS)
+        operators.update(config.operators)
+        for operator in AUGMENTABLE_OPERATORS:
+            operators.setdefault(operator + '=', operators[operator] + '_assignment')
+        self.operators = operators
+
+        # Longest first: a shorter operator must not win over a longer one it starts.
+        char_seqs = sorted((operator for operator in operators if len(operator) > 1),
+                           key=len, reverse=True)
+        char_seqs += [char_seq for char_seq in config.priority_char_seqs
+                      if char_seq and all(char in self.delimiters for char in char_seq)]
+        self.priority_char_seqs = tuple(dict.fromkeys(char_seqs))
+
+        patterns = ['(?P<{}>{})'.format(name, pattern) for name, pattern in _source_patterns]
+        patterns.append('(?P<lexeme>{})'.format(
+            lexeme_pattern(self.delimiters, self.priority_char_seqs)))
+        self.source_regex = re.compile('|'.join(patterns), re.DOTALL)
+
+
+    def tokenize(self, source):
+        """
+        Tokenize the text of a Python source file.
+
+        Input: str
+        Output: list of SourceTokens
+        """
+
+        stats = self.stats
+        if stats is None:
+            return list(self.iter_tokens(source))
+
+        start = perf_counter()
+        tokens = list(self.iter_tokens(source))
+        stats.add_time('tokenize_source', perf_counter() - start)
+        stats.count('source_tokens', len(tokens))
+        return tokens
+
+
+    def iter_tokens(self, source):
+        """
+        Tokenize the text of a Python source file. Yield SourceTokens one at a time.
+
+        Input: str
+        Output: generator of SourceTokens
+        """
+
+        operators = self.operators
+
+        row = 1
+        line_start = 0         # Offset of the first char of the current row
+        depth = 0              # Brackets open
+        indents = [0]
+        logical_line_empty = True
+
+        for match in self.source_regex.finditer(source):
+            group = match.lastgroup
+
+            if group == 'whitespace':
+                continue
+
+            start, end = match.span()
+            text = match.group()
+
+            if group == 'newline':
+                if depth or logical_line_empty:
+                    kind = 'nl'
+                else:
+                    kind = 'newline'
+                    logical_line_empty = True
+                yield SourceToken(kind, text, (row, start - line_start), (row, end - line_start))
+                row += 1
+                line_start = end
+                continue
+
+            if group == 'continuation':
+                row += 1
+                line_start = end
+                continue
+
+            if logical_line_empty and group != 'comment':
+                logical_line_empty = False
+                yield from _indentation(source, line_start, start, row, indents)
+
+            if group == 'lexeme':
+                kind = operators.get(text)
+                if kind is None:
+                    kind = 'name' if text.isidentifier() else 'error_token'
+                elif text in _OPENING_BRACKETS:
+                    depth += 1
+                elif text in _CLOSING_BRACKETS and depth:
+                    depth -= 1
+            elif group == 'unterminated_string':
+                kind = 'Syntax Error'
+            else:
+                kind = group
+
+            if kind == 'string' or kind == 'Syntax Error':
+                # String literals can span rows.
+                last_break = max(text.rfind('\n'), text.rfind('\r'))
+                if last_break >= 0:
+                    first_row = row
+                    row += text.count('\n') + text.count('\r') - text.count('\r\n')
+                    yield SourceToken(kind, text, (first_row, start - line_start),
+                                      (row, len(text) - last_break - 1))
+                    line_start = start + last_break + 1
+                    continue
+
+            yield SourceToken(kind, text, (row, start - line_start), (row, end - line_start))
+
+        column = len(source) - line_start
+        if depth:
+            yield SourceToken('Syntax Error', '', (row, column), (row, column))
+        # A last line without a line break still ends its logical line, as with stdlib tokenize
+        # (the 'newline' token has no chars but is 1 column wide).
+        if not logical_line_empty:
+            yield SourceToken('newline', '', (row, column), (row, column + 1))
+        elif column:
+            yield SourceToken('nl', '', (row, column), (row, column))
+        if column or not logical_line_empty:
+            row += 1
+        for indent in indents[1:]:
+            yield SourceToken('dedent', '', (row, 0), (row, 0))
+        yield SourceToken('endmarker', '', (row, 0), (row, 0))
+
+
+    def tokenize_file(self, path, encoding=None):
+        """
+        Read & tokenize a Python source file.
+        Without an encoding, it is read as Python reads it: from a coding declaration
+            or a BOM (see PEP 263), else as UTF-8.
+
+        Input: path to a file
+        Output: list of SourceTokens
+        """
+
+        with open(path, 'rb') as source_file:
+            data = source_file.read()
+
+        stats = self.stats
+        if stats is not None:
+            stats.count('source_files')
+            stats.count('source_bytes', len(data))
+
+        return self.tokenize(decode_source(data, encoding))
+
+
+    def tokenize_tree(self, root, workers=1, chunksize=16, suffixes=('.py',)):
+        """
+        Tokenize every Python source file under a directory (see walk_source_files()).
+        Yield a SourceFile per file, in walk order. A file that cannot be read or decoded
+            is yielded with its error instead of tokens.
+        With workers > 1, files are tokenized on a pool of processes, chunksize files at a time,
+            with at most 2 chunks per worker in flight.
+
+        Input: path to a directory (or to 1 file)
+        Output: generator of SourceFiles
+        """
+
+        paths = walk_source_files(root, suffixes)
+
+        if workers == 1:
+            for path in paths:
+                yield self._tokenize_path(path)
+            return
+
+        with worker_pool(workers, _build_source_tokenizer, self.config.to_dict()) as pool:
+            yield from map_chunks(pool, _tokenize_chunk, paths, chunksize, 2 * workers)
+
+
+    def _tokenize_path(self, path):
+        """Tokenize 1 file into a SourceFile, catching the errors of reading & decoding it."""
+
+        try:
+            size = os.path.getsize(path)
+            return SourceFile(path, size, self.tokenize_file(path), None)
+        except (OSError, UnicodeDecodeError, SyntaxError, LookupError) as error:
+            return SourceFile(path, None, None, '{}: {}'.format(type(error).__name__, error))
+
+
+
+def _build_source_tokenizer(config_data):
+    """Build the SourceTokenizer of a worker process from the compiled config sent to it."""
+
+    return SourceTokenizer(config=CompiledConfig.from_dict(config_data))
+
+
+def _tokenize_chunk(paths):
+    """Tokenize a chunk of files in a worker process."""
+
+    source_tokenizer = worker()
+    return [source_tokenizer._tokenize_path(path) for path in paths]
+
+
+def _indentation(source, line_start, start, row, indents):
+    """
+    Yield the indent or dedent tokens for a logical line whose first token starts at start,
+        updating the stack of indentation columns.
+    """
+
+    column = 0
+    for char in source[line_start:start]:
+        if char == ' ':
+            column += 1
+        elif char == '\t':
+            column = (column // _TAB_SIZE + 1) * _TAB_SIZE
+        elif char == '\f':
+            column = 0
+
+    position = (row, start - line_start)
+
+    if column > indents[-1]:
+        indents.append(column)
+        yield SourceToken('indent', source[line_start:start], (row, 0), position)
+        return
+
+    while column < indents[-1]:
+        indents.pop()
+        yield SourceToken('dedent', '', position, position)
+
+    if column != indents[-1]:
+        yield SourceToken('Syntax Error', '', position, position)
+
+
+def decode_source(data, encoding=None):
+    """
+    Decode the bytes of a Python source file.
+    Without an encoding, use its coding declaration or BOM (see PEP 263), else UTF-8.
+
+    Input: bytes
+    Output: str
+    """
+
+    if encoding is None:
+        from tokenize import detect_encoding
+        encoding = detect_encoding(io.BytesIO(data).readline)[0]
+
+    return data.decode(encoding)
+
+
+def walk_source_files(root, suffixes=('.py',), skip_dirs=('__pycache__', 'node_modules')):
+    """
+    Yield the paths of the files ending with 1 of suffixes under root, in sorted order.
+    Hidden dirs (.git, .tox, .venv...) & skip_dirs are not entered.
+    If root is a file, only root is yielded.
+
+    Input: path
+    Output: generator of paths
+    """
+
+    if not os.path.isdir(root):
+        yield root
+        return
+
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(name for name in dir_names
+                              if not name.startswith('.') and name not in skip_dirs)
+        for name in sorted(file_names):
+            if name.endswith(suffixes):
+                yield os.path.join(dir_path, name)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Optional instrumentation of Lexer, Tokenizer and PyLex.
+"""
+
+import threading
+from time import perf_counter
+
+
+class Stats(object):
+
+    """
+    Stats records where the time goes in Lexer, Tokenizer & PyLex.
+
+    Pass the same Stats object to any of them (stats=...) to switch instrumentation on.
+    Without one (the default), each instrumented method only pays for 1 'is None' check.
+
+    Recorded:
+        stages:    calls & cumulative seconds, e.g.
+                       config.xlsx_parse, config.disk_cache_load,
+                       lex, lex.priority_isolation, lex.delimiter_slicing,
+                       tokenize, tokenize.subtokens, tokenize.phrases, tokenize.pylang_tokens,
+                       normalize, expansion_round
+            Stages nest: e.g. the time of tokenize includes that of lex.
+        counters:  e.g. lexemes, tokens, phrases, lookups, definitions_tokenized,
+                       expansion_rounds, index_hits, config.memory_hits
+        caches:    hit/miss/eviction counters of the caches being watched (watch_cache())
+
+    Hooks (add_hook()) are called on every record, as hook(kind, name, value),
+        where kind is 'time' (value in seconds) or 'count', to feed other metrics pipelines.
+
+    Example:
+
+        stats = Stats()
+        pylex = PyLex(interactive=False, stats=stats)
+        pylex.normalize('identifier')
+        stats.to_dict()         -> {'stages': {'normalize': {'calls': 1, 'seconds': ...}, ...}, ...}
+        stats.to_prometheus()   -> '# TYPE pylex_stage_calls_total counter\\n...'
+
+    """
+
+
+    def __init__(self):
+        """Instantiate an empty Stats object."""
+
+        self.stages = {}      # name -> [calls, seconds]
+        self.counters = {}    # name -> int
+        self.caches = {}      # name -> object with a stats() method (e.g. LRUCache)
+        self.hooks = []
+
+        self._lock = threading.Lock()
+
+
+    def add_time(self, name, seconds, calls=1):
+        """Record calls to a stage that took seconds in total."""
+
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                self.stages[name] = [calls, seconds]
+            else:
+                stage[0] += calls
+                stage[1] += seconds
+        for hook in self.hooks:
+            hook('time', name, seconds)
+
+
+    def count(self, name, value=1):
+        """Add value to a counter."""
+
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook('count', name, value)
+
+
+    def timer(self, name):
+        """Return a context manager that records the time spent in its block as a stage."""
+
+        return _StageTimer(self, name)
+
+
+    def watch_cache(self, name, cache):
+        """Include a cache's own counters (its stats() dict) in every export."""
+
+        self.caches[name] = cache
+
+
+    def add_hook(self, hook):
+        """Call hook(kind, name, value) on every record."""
+
+        self.hooks.append(hook)
+
+
+    def reset(self):
+        """Forget every stage & counter. Watched caches & hooks are kept."""
+
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+
+
+    def to_dict(self):
+        """Return everything recorded as a dict of plain data."""
+
+        with self._lock:
+            stages = {name: {'calls': calls, 'seconds': seconds}
+                      for name, (calls, seconds) in self.stages.items()}
+            counters = dict(self.counters)
+
+        return {
+            'stages': stages,
+            'counters': counters,
+            'caches': {name: cache.stats() for name, cache in self.caches.items()},
+        }
+
+
+    def to_prometheus(self, prefix='pylex'):
+        """Return everything recorded in the Prometheus text exposition format."""
+
+        data = self.to_dict()
+        lines = []
+
+        def family(name, kind, samples):
+            if samples:
+                lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+                lines.extend('{}_{}{{{}}} {}'.format(prefix, name, labels, value)
+                             for labels, value in samples)
+
+        stages = sorted(data['stages'].items())
+        family('stage_calls_total', 'counter',
+               [('stage="{}"'.format(name), stage['calls']) for name, stage in stages])
+        family('stage_seconds_total', 'counter',
+               [('stage="{}"'.format(name), repr(stage['seconds'])) for name, stage in stages])
+        family('events_total', 'counter',
+               [('event="{}"'.format(name), value)
+                for name, value in sorted(data['counters'].items())])
+
+        # Counts only go up: counters, e.g. pylex_cache_hits_total. The rest (size, hit_rate, ...)
+        # go up & down: gauges, in 1 pylex_cache family labelled by stat.
+        caches = sorted(data['caches'].items())
+        for stat in _CACHE_COUNTERS:
+            family('cache_{}_total'.format(stat), 'counter',
+                   [('cache="{}"'.format(name), cache_stats[stat])
+                    for name, cache_stats in caches if cache_stats.get(stat) is not None])
+        family('cache', 'gauge',
+               [('cache="{}",stat="{}"'.format(name, stat), value)
+                for name, cache_stats in caches
+                for stat, value in sorted(cache_stats.items())
+                if value is not None and stat not in _CACHE_COUNTERS])
+
+        return '\n'.join(lines) + '\n'
+
+
+
+# The cache stats that are monotonic counts, exported as Prometheus counters.
+_CACHE_COUNTERS = ('hits', 'misses', 'evictions', 'puts', 'errors')
+
+
+
+class _StageTimer(object):
+
+    """Context manager behind Stats.timer()."""
+
+    __slots__ = ('stats', 'name', 'start')
+
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.stats.add_time(self.name, perf_counter() - self.start)
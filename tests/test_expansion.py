@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Expansion of pylang tokens: normal forms against the original re-tokenizing loop,
+    & recursive definitions.
+
+Usage (from the dir that contains the pylex checkout, so that pylex.py is not imported as pylex):
+    python -m pytest pylex/tests/test_expansion.py
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex import PyLex, Tokenizer
+from pylex.config import CompiledConfig, load_config
+from pylex.expansion import ExpansionCycleError, ExpansionEngine
+
+
+def baseline_normal_form(tokenizer, expressions, token_name):
+    """
+    The evaluation loop PyLex.host_user() first shipped with: each round re-tokenizes the
+        whole remainder as a str. Lexemes before the first pylang token go to the normal form;
+        that token is replaced by its definition, & the rest is left for the next round.
+    Raise KeyError for a blank or unknown definition.
+    """
+
+    def look_up(name):
+        expression = expressions.get(name)
+        if expression is None:
+            raise KeyError(name)
+        return expression
+
+    master_list = []
+    remainder = look_up(token_name)
+    while remainder:
+        expression, remainder = remainder, ''
+        substituted = False
+        for token in tokenizer.tokenize(expression):
+            for key, lexeme in token.items():
+                if key == 'pylang_token':
+                    remainder += look_up(lexeme)
+                    substituted = True
+                elif substituted:
+                    remainder += lexeme
+                else:
+                    master_list.append(lexeme)
+    return master_list
+
+
+
+class ExpansionTest(unittest.TestCase):
+
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+
+
+    def test_normalize_equals_baseline(self):
+        pylex = PyLex(config=self.config, interactive=False)
+        tokenizer = Tokenizer(config=self.config)
+        checked = 0
+
+        for token_name in self.config.token_names:
+            try:
+                expected = baseline_normal_form(tokenizer, self.config.expressions, token_name)
+            except KeyError:
+                with self.assertRaises(KeyError):
+                    pylex.normalize(token_name)
+                continue
+            self.assertEqual(pylex.normalize(token_name), expected, token_name)
+            checked += 1
+
+        self.assertGreater(checked, 10)
+
+
+    def test_recursive_definitions_raise(self):
+        rows = {'selfish': "'x' selfish | 'y'", 'ping': "'a' pong", 'pong': "'b' ping | 'c'",
+                'user': 'lc_letter ping'}
+        data = self.config.to_dict()
+        data['token_names'] += tuple(rows)
+        data['expressions'] = expressions = dict(data['expressions'], **rows)
+        tokenizer = Tokenizer(config=CompiledConfig.from_dict(data))
+
+        for token_name, cycle in [('selfish', ('selfish', 'selfish')),
+                                  ('ping', ('ping', 'pong', 'ping')),
+                                  ('user', ('ping', 'pong', 'ping'))]:
+            # A fresh engine each time: nothing cached from an earlier failure.
+            engine = ExpansionEngine(tokenizer, expressions)
+            with self.assertRaises(ExpansionCycleError) as raised:
+                engine.normal_form(token_name)
+            self.assertEqual(raised.exception.cycle, cycle)
+
+            engine = ExpansionEngine(tokenizer, expressions)
+            with self.assertRaises(ExpansionCycleError):
+                engine.check_cycles([(token_name, True)])
+
+        # Tokens outside the cycles still expand.
+        engine = ExpansionEngine(tokenizer, expressions)
+        self.assertEqual(list(engine.normal_form('lc_letter')), ['a…z'])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+IncrementalTokenizer.edit() against tokenizing the edited source from scratch.
+
+Usage (from the dir that contains the pylex checkout, so that pylex.py is not imported as pylex):
+    python -m pytest pylex/tests/test_incremental.py
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex import Lexer, Tokenizer
+from pylex.config import load_config
+from pylex.incremental import IncrementalTokenizer, StreamChange
+
+
+# Phrase openers & closers, & pieces of the '...' priority sequence.
+EDIT_PIECES = ['<', '>', "'", '"', '.', '..', '...', ' ', '|', 'a', 'bb']
+
+
+def token_tuples(buffer):
+    return list(zip(buffer.kinds, buffer.starts, buffer.ends))
+
+
+
+class IncrementalTokenizerTest(unittest.TestCase):
+
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.pieces = ([expression for expression in cls.config.expressions.values()
+                       if expression] + list(cls.config.token_names) + EDIT_PIECES)
+
+
+    def check_edit(self, incremental, stream, offset, deleted, inserted):
+        """Apply 1 edit, check it against a full tokenize. Return the new stream."""
+
+        tokenizer = incremental.tokenizer
+        new_stream, change = incremental.edit(stream, offset, deleted, inserted)
+        context = '{!r}: {} chars deleted at {}, {!r} inserted'.format(
+            stream.source, deleted, offset, inserted)
+
+        self.assertEqual(new_stream.source,
+                         stream.source[:offset] + inserted + stream.source[offset + deleted:])
+        self.assertEqual(token_tuples(new_stream.tokens),
+                         token_tuples(tokenizer.tokenize_buffer(new_stream.source)), context)
+        self.assertEqual(token_tuples(new_stream.lexemes),
+                         token_tuples(tokenizer.lexer.lex_buffer(new_stream.source)), context)
+
+        # Outside the change, the tokens are the old ones (shifted after it).
+        old = token_tuples(stream.tokens)
+        new = token_tuples(new_stream.tokens)
+        delta = len(inserted) - deleted
+        self.assertEqual(new[:change.first], old[:change.first], context)
+        self.assertEqual(new[change.new_stop:],
+                         [(kind, start + delta, end + delta)
+                          for kind, start, end in old[change.old_stop:]], context)
+        self.assertLessEqual(change.start, offset, context)
+
+        return new_stream
+
+
+    def test_random_edits(self):
+        for engine in Lexer.engines:
+            incremental = IncrementalTokenizer(Tokenizer(config=self.config, lexer_engine=engine))
+            rng = random.Random(engine)
+            for trial in range(150):
+                source = ''.join(rng.choice(self.pieces) for piece in range(rng.randint(0, 16)))
+                stream = incremental.tokenize(source)
+                for edit in range(10):
+                    length = len(stream.source)
+                    offset = rng.randint(0, length)
+                    deleted = rng.randint(0, min(5, length - offset))
+                    inserted = ''.join(rng.choice(EDIT_PIECES) for piece in range(rng.randint(0, 2)))
+                    stream = self.check_edit(incremental, stream, offset, deleted, inserted)
+
+
+    def test_phrase_edits(self):
+        # Opening & closing phrases re-tokenizes as far as the phrase now reaches.
+        for engine in Lexer.engines:
+            incremental = IncrementalTokenizer(Tokenizer(config=self.config, lexer_engine=engine))
+            stream = incremental.tokenize("a | <b c> | 'd e' | f")
+            for offset, deleted, inserted in [(0, 0, '<'), (4, 1, ''), (8, 1, ''),
+                                              (0, 0, "'"), (12, 1, ''), (16, 0, '"'),
+                                              (2, 0, '>'), (0, 0, '"')]:
+                stream = self.check_edit(incremental, stream, offset, deleted, inserted)
+
+
+    def test_edits_near_priority_sequence(self):
+        # Edits within lookahead of '...' can make or break it.
+        for engine in Lexer.engines:
+            incremental = IncrementalTokenizer(Tokenizer(config=self.config, lexer_engine=engine))
+            source = 'a..b...c . d'
+            lookahead = incremental.lookahead
+            for offset in range(len(source) + 1):
+                for deleted in range(min(lookahead + 1, len(source) - offset) + 1):
+                    for inserted in ('', '.', '..', 'x'):
+                        self.check_edit(incremental, incremental.tokenize(source),
+                                        offset, deleted, inserted)
+
+
+    def test_docstring_example(self):
+        incremental = IncrementalTokenizer(Tokenizer(config=self.config))
+        stream = incremental.tokenize('lc_letter (lc_letter)*')
+        stream, change = incremental.edit(stream, 11, 9, 'name')
+
+        self.assertEqual(stream.to_dicts(), [
+            {'pylang_token': 'lc_letter'}, {'separator': ' '}, {'open_paren': '('},
+            {'pylang_token': 'name'}, {'close_paren': ')'}, {'star': '*'}])
+        self.assertEqual(change, StreamChange(first=3, old_stop=4, new_stop=4, start=11,
+                                              old_end=20, new_end=15))
+
+
+    def test_out_of_range(self):
+        incremental = IncrementalTokenizer(Tokenizer(config=self.config))
+        stream = incremental.tokenize('abc')
+        with self.assertRaises(ValueError):
+            incremental.edit(stream, 2, 2, '')
+
+
+
+if __name__ == '__main__':
+    unittest.main()
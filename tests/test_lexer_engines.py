@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Equivalence of the lexer engines: the table-driven & regex engines against the legacy one.
+
+Usage (from the dir that contains the pylex checkout, so that pylex.py is not imported as pylex):
+    python -m pytest pylex/tests/test_lexer_engines.py
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex import Lexer
+from pylex.config import CompiledConfig, load_config
+
+
+def random_strings(config, count, seed=0):
+    """Build count random strings over the delimiters, the priority sequences & a few letters."""
+
+    rng = random.Random(seed)
+    alphabet = sorted(config.delimiters) + list(config.priority_char_seqs) + list('abcx1_')
+    return [''.join(rng.choice(alphabet) for char in range(rng.randint(0, 24)))
+            for string in range(count)]
+
+
+def first_row_only(config):
+    """Return a copy of config with only the first priority row, the only 1 legacy reads."""
+
+    data = config.to_dict()
+    data['priority_char_seqs'] = data['priority_char_seqs'][:1]
+    return CompiledConfig.from_dict(data)
+
+
+
+class LexerEngineTest(unittest.TestCase):
+
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.legacy = Lexer(config=cls.config, engine='legacy')
+        cls.engines = [Lexer(config=cls.config, engine=engine)
+                       for engine in Lexer.engines if engine != 'legacy']
+
+
+    def assert_same_lexemes(self, legacy, engines, strings):
+        for string in strings:
+            expected = legacy.lex_string(string)
+            for lexer in engines:
+                self.assertEqual(lexer.lex_string(string), expected,
+                                 '{} engine on {!r}'.format(lexer.engine, string))
+
+
+    def test_config_expressions(self):
+        expressions = [expression for expression in self.config.expressions.values()
+                       if expression]
+        self.assertTrue(expressions)
+        self.assert_same_lexemes(self.legacy, self.engines, expressions)
+
+
+    def test_random_strings(self):
+        # Only strings without the second priority row ('bb') are lexed the same: see below.
+        second_row = self.config.priority_char_seqs[1]
+        strings = [string for string in random_strings(self.config, 20000)
+                   if second_row not in string]
+        self.assert_same_lexemes(self.legacy, self.engines, strings)
+
+
+    def test_random_strings_first_row_only(self):
+        # Without a second priority row, every string is lexed the same.
+        config = first_row_only(self.config)
+        legacy = Lexer(config=config, engine='legacy')
+        engines = [Lexer(config=config, engine=lexer.engine) for lexer in self.engines]
+        self.assert_same_lexemes(legacy, engines, random_strings(self.config, 20000, seed=1))
+
+
+    def test_second_priority_row(self):
+        # The intended difference: legacy only reads the first priority row ('...'),
+        #   the other engines honour the second 1 ('bb') too.
+        self.assertEqual(self.config.priority_char_seqs[:2], ('...', 'bb'))
+
+        self.assertEqual(self.legacy.lex_string('abba...x'), ['abba', '...', 'x'])
+        for lexer in self.engines:
+            self.assertEqual(lexer.lex_string('abba...x'), ['a', 'bb', 'a', '...', 'x'])
+            self.assertEqual(lexer.lex_string('bbb'), ['bb', 'b'])
+
+
+    def test_row_order_wins(self):
+        # When 2 priority sequences start at the same char, the higher row wins.
+        data = self.config.to_dict()
+        data['priority_char_seqs'] = ('..', '...')
+        config = CompiledConfig.from_dict(data)
+        for engine in Lexer.engines[1:]:
+            self.assertEqual(Lexer(config=config, engine=engine).lex_string('a...b'),
+                             ['a', '..', '.', 'b'])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+PersistentCache: storage, byte accounting, LRU eviction & failures read as misses.
+
+Usage (from the dir that contains the pylex checkout, so that pylex.py is not imported as pylex):
+    python -m pytest pylex/tests/test_persistent.py
+"""
+
+import os
+import pickle
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex import PyLex
+from pylex.config import load_config
+from pylex.persistent import PersistentCache
+
+
+
+class PersistentCacheTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'results.sqlite3')
+        self.caches = []
+
+
+    def tearDown(self):
+        for cache in self.caches:
+            cache.close()
+        shutil.rmtree(self.dir)
+
+
+    def cache(self, **options):
+        cache = PersistentCache(self.path, **options)
+        self.caches.append(cache)
+        return cache
+
+
+    def stored(self):
+        """Return (total size of the entries, bytes counted in meta), read directly."""
+
+        with sqlite3.connect(self.path) as connection:
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            counted = connection.execute("SELECT value FROM meta WHERE name = 'bytes'")\
+                                .fetchone()[0]
+        return total, counted
+
+
+    def test_put_get(self):
+        cache = self.cache()
+        cache.put('normalize', 'name', 'hash', ['a', 'b'])
+
+        self.assertEqual(cache.get('normalize', 'name', 'hash'), ['a', 'b'])
+        self.assertIsNone(cache.get('normalize', 'name', 'other hash'))
+        self.assertIsNone(cache.get('tokenize', 'name', 'hash'))
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['puts']), (1, 2, 1))
+        self.assertEqual(stats['hit_rate'], 1 / 3)
+
+        # Another instance (as in another process) reads the same file.
+        self.assertEqual(self.cache().get('normalize', 'name', 'hash'), ['a', 'b'])
+
+
+    def test_byte_accounting(self):
+        cache = self.cache()
+        values = {str(i): 'x' * i for i in range(50)}
+        for key, value in values.items():
+            cache.put('k', key, 'h', value)
+        # Overwrites change the size of an entry.
+        for key in list(values)[:10]:
+            values[key] = 'y' * 100
+            cache.put('k', key, 'h', values[key])
+
+        expected = sum(len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+                       for value in values.values())
+        self.assertEqual(self.stored(), (expected, expected))
+        self.assertEqual(cache.stats()['bytes'], expected)
+        self.assertEqual(len(cache), 50)
+
+        cache.clear()
+        self.assertEqual(self.stored(), (0, 0))
+        self.assertEqual(len(cache), 0)
+
+
+    def test_lru_eviction(self):
+        entry_size = len(pickle.dumps('x' * 100, pickle.HIGHEST_PROTOCOL))
+        max_bytes = entry_size * 10
+        cache = self.cache(max_bytes=max_bytes, touch_interval=0)
+
+        for i in range(10):
+            cache.put('k', str(i), 'h', 'x' * 100)
+        self.assertEqual(cache.stats()['evictions'], 0)
+        cache.get('k', '0', 'h')     # Now the most recently used
+
+        cache.put('k', '10', 'h', 'x' * 100)
+
+        total, counted = self.stored()
+        self.assertEqual(total, counted)
+        self.assertLessEqual(total, max_bytes * 9 // 10)
+        self.assertEqual(cache.stats()['evictions'], 11 - total // entry_size)
+        self.assertIsNotNone(cache.get('k', '0', 'h'))
+        self.assertIsNotNone(cache.get('k', '10', 'h'))
+        self.assertIsNone(cache.get('k', '1', 'h'))
+
+
+    def test_value_over_max_bytes_is_not_stored(self):
+        cache = self.cache(max_bytes=100)
+        cache.put('k', 'big', 'h', 'x' * 1000)
+        self.assertIsNone(cache.get('k', 'big', 'h'))
+        self.assertEqual(len(cache), 0)
+
+
+    def test_corrupt_value_is_a_miss(self):
+        cache = self.cache()
+        cache.put('k', 'a', 'h', [1, 2])
+        with sqlite3.connect(self.path) as connection:
+            connection.execute("UPDATE entries SET value = ?", (b'not a pickle',))
+
+        self.assertIsNone(cache.get('k', 'a', 'h'))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['errors']), (0, 1, 1))
+
+
+    def test_locked_database_is_a_miss(self):
+        cache = self.cache(timeout=0.05)
+        cache.put('k', 'a', 'h', 1)
+        cache.close()
+
+        blocker = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            blocker.execute('PRAGMA locking_mode=EXCLUSIVE')
+            blocker.execute('BEGIN EXCLUSIVE')
+
+            self.assertIsNone(cache.get('k', 'a', 'h'))
+            cache.put('k', 'b', 'h', 2)      # Neither raises
+            stats = cache.stats()
+            self.assertEqual((stats['misses'], stats['puts'], stats['errors']), (1, 1, 2))
+        finally:
+            blocker.close()
+
+        self.assertEqual(cache.get('k', 'a', 'h'), 1)
+
+
+    def test_normalize_hit_from_another_pylex(self):
+        config = load_config()
+        first = PyLex(config=config, interactive=False, persistent_cache=self.cache())
+        normal_form = first.normalize('name')
+
+        cache = self.cache()
+        second = PyLex(config=config, interactive=False, persistent_cache=cache)
+        self.assertEqual(second.normalize('name'), normal_form)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(second.normal_forms.stats()['misses'], 0)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
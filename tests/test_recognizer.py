@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+TokenRecognizer over the shipped config: which tokens match a string, & the longest match.
+
+Usage (from the dir that contains the pylex checkout, so that pylex.py is not imported as pylex):
+    python -m pytest pylex/tests/test_recognizer.py
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex import PyLex
+from pylex.recognizer import CharClass, TokenRecognizer
+
+
+
+class TokenRecognizerTest(unittest.TestCase):
+
+
+    @classmethod
+    def setUpClass(cls):
+        cls.recognizer = TokenRecognizer.build(PyLex(interactive=False))
+
+
+    def test_identifiers(self):
+        match = self.recognizer.match
+        self.assertEqual(match('abc_d'), ('identifier', 'name'))
+        self.assertEqual(match('_x1'), ('identifier',))
+        self.assertEqual(match('x1'), ('identifier',))
+        self.assertIn('identifier', match('é'))
+
+
+    def test_leading_digit_is_not_an_identifier(self):
+        match = self.recognizer.match
+        self.assertEqual(match('1abc'), ())
+        self.assertEqual(match('1a'), ())
+        self.assertNotIn('xid_start', match('1'))
+        self.assertNotIn('id_start', match('1'))
+        self.assertIn('xid_continue', match('1'))
+        self.assertIn('id_continue', match('1'))
+
+
+    def test_empty_string_matches_nothing(self):
+        self.assertEqual(self.recognizer.match(''), ())
+        self.assertEqual(self.recognizer.longest_match(''), (0, ()))
+        self.assertIn('DEDENT', self.recognizer.errors)
+
+
+    def test_blank_definitions_are_errors(self):
+        self.assertIn('INDENT', self.recognizer.errors)
+        self.assertIn('NEWLINE', self.recognizer.errors)
+
+
+    def test_strings(self):
+        match = self.recognizer.match
+        self.assertEqual(match('"spam"'), ('stringliteral', 'shortstring'))
+        self.assertEqual(match("'''a\nb'''"), ('stringliteral', 'longstring'))
+        self.assertEqual(match('r"a"'), ('stringliteral',))
+        self.assertEqual(match('"a'), ())
+        self.assertIn('stringescapeseq', match('\\n'))
+
+
+    def test_longest_match(self):
+        longest_match = self.recognizer.longest_match
+        self.assertEqual(longest_match('spam = 1'), (4, ('identifier', 'name')))
+        self.assertEqual(longest_match('x = 1', 4), (5, longest_match('1')[1]))
+        self.assertEqual(longest_match('1abc')[0], 1)
+        self.assertEqual(longest_match('"spam" + x'), (6, ('stringliteral', 'shortstring')))
+
+
+    def test_approximate(self):
+        self.assertTrue({'xid_start', 'xid_continue', 'identifier'} <= self.recognizer.approximate)
+        self.assertNotIn('id_start', self.recognizer.approximate)
+        self.assertNotIn('name', self.recognizer.approximate)
+
+
+    def test_descriptor_subject(self):
+        xid_start = CharClass.from_descriptor(
+            "<all characters in id_start whose NFKC normalization is in "
+            "'id_start xid_continue*'>")
+        self.assertNotIn('1', xid_start)
+        self.assertIn('a', xid_start)
+        self.assertTrue(xid_start.approximate)
+
+        id_continue = CharClass.from_descriptor(
+            '<all characters in id_start, plus characters in the categories Mn, Mc, Nd, Pc '
+            'and others with the Other_ID_Continue property>')
+        self.assertIn('1', id_continue)
+        self.assertFalse(id_continue.approximate)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
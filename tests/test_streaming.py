@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked lexing: Lexer.iter_lex() & lex_file() against lex_string() at every chunk boundary.
+
+Usage (from the dir that contains the pylex checkout, so that pylex.py is not imported as pylex):
+    python -m pytest pylex/tests/test_streaming.py
+"""
+
+import io
+import mmap
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex import Lexer
+from pylex.config import load_config
+
+
+CHUNK_SIZES = range(1, 9)
+
+
+def random_strings(config, count, seed=0):
+    """Build random strings around the priority sequences, with multi-byte chars ('…', 'é')
+        that a chunk of bytes can split."""
+
+    rng = random.Random(seed)
+    pieces = (sorted(config.delimiters) + list(config.priority_char_seqs)
+              + ['.', '..', 'b', 'abc', '…', 'é', 'a…z'])
+    return [''.join(rng.choice(pieces) for piece in range(rng.randint(0, 16)))
+            for string in range(count)]
+
+
+
+class StreamingLexTest(unittest.TestCase):
+
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.lexers = [Lexer(config=cls.config, engine=engine) for engine in Lexer.engines]
+        cls.strings = random_strings(cls.config, 60) + [
+            '', '...', 'a...b', '....', 'bbb', 'abba...x', 'a…z | "x" <y>']
+        cls.temp_dir = tempfile.mkdtemp()
+
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.temp_dir)
+
+
+    def check(self, read, description):
+        """read(lexer, string, chunk_size) -> lexemes, for every lexer, string & chunk size."""
+
+        for lexer in self.lexers:
+            for string in self.strings:
+                expected = lexer.lex_string(string) if string else []
+                for chunk_size in CHUNK_SIZES:
+                    self.assertEqual(list(read(lexer, string, chunk_size)), expected,
+                                     '{}, {} engine, chunks of {}: {!r}'.format(
+                                         description, lexer.engine, chunk_size, string))
+
+
+    def test_str(self):
+        self.check(lambda lexer, string, chunk_size:
+                   lexer.iter_lex(io.StringIO(string), chunk_size), 'str')
+
+
+    def test_bytes(self):
+        self.check(lambda lexer, string, chunk_size:
+                   lexer.iter_lex(io.BytesIO(string.encode('utf-8')), chunk_size), 'bytes')
+
+
+    def write(self, string):
+        path = os.path.join(self.temp_dir, 'input.txt')
+        with open(path, 'wb') as output:
+            output.write(string.encode('utf-8'))
+        return path
+
+
+    def test_mmap(self):
+        def read(lexer, string, chunk_size):
+            if not string:
+                return []      # An empty file cannot be memory mapped
+            with open(self.write(string), 'rb') as input_file:
+                with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return list(lexer.iter_lex(mapped, chunk_size))
+
+        self.check(read, 'mmap')
+
+
+    def test_lex_file(self):
+        self.check(lambda lexer, string, chunk_size:
+                   lexer.lex_file(self.write(string), chunk_size), 'lex_file')
+
+
+
+if __name__ == '__main__':
+    unittest.main()
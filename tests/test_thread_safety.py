@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Thread-safety stress tests: 1 shared Tokenizer & 1 shared PyLex serving a thread pool.
+
+The thread switch interval is shortened to force as much interleaving as possible,
+    & the threaded results are compared with the single-threaded ones.
+
+Usage (from the dir that contains the pylex checkout, so that pylex.py is not imported as pylex):
+    python -m pytest pylex/tests/test_thread_safety.py
+"""
+
+import os
+import random
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex import Lexer, PyLex, Tokenizer
+from pylex.cache import LRUCache
+from pylex.config import load_config
+
+
+WORKERS = 8
+ROUNDS = 3
+
+
+def random_expressions(config, count, seed=0):
+    """Build random expressions out of config expressions, token names & delimiter chars."""
+
+    rng = random.Random(seed)
+    pieces = [expression for expression in config.expressions.values() if expression]
+    pieces += list(config.token_names) + sorted(config.delimiters) + ['...', 'abc', '…']
+
+    return [''.join(rng.choice(pieces) for piece in range(rng.randint(0, 12)))
+            for expression in range(count)]
+
+
+
+class CountingCache(LRUCache):
+
+    """An LRUCache that also counts the calls made to it, to check its own counters against."""
+
+
+    def __init__(self, maxsize=256):
+        super().__init__(maxsize)
+        self.gets = 0
+        self.puts = 0
+        self._calls_lock = threading.Lock()
+
+
+    def get(self, key, default=None):
+        with self._calls_lock:
+            self.gets += 1
+        return super().get(key, default)
+
+
+    def put(self, key, value):
+        with self._calls_lock:
+            self.puts += 1
+        super().put(key, value)
+
+
+
+class ThreadSafetyTest(unittest.TestCase):
+
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.token_names = [name for name in cls.config.token_names
+                           if cls.config.expressions.get(name)]
+        cls.normal_forms = dict(zip(cls.token_names, [
+            PyLex(config=cls.config, interactive=False).normalize(name)
+            for name in cls.token_names]))
+
+
+    def setUp(self):
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+
+    def test_tokenize_many(self):
+        expressions = random_expressions(self.config, 2000)
+        for engine in Lexer.engines:
+            tokenizer = Tokenizer(config=self.config, lexer_engine=engine)
+            serial = [tokenizer.tokenize(expression) for expression in expressions]
+            for round_number in range(ROUNDS):
+                self.assertEqual(tokenizer.tokenize_many(expressions, workers=WORKERS), serial,
+                                 '{} engine, round {}'.format(engine, round_number))
+
+
+    def test_normalize_many(self):
+        # A tiny cache, so that entries are evicted all the time.
+        self.check_normalize_many(CountingCache(2))
+
+
+    def test_normalize_many_unbounded_cache(self):
+        cache = self.check_normalize_many(CountingCache(None))
+        self.assertEqual(cache.evictions, 0)
+        for token_name, normal_form in self.normal_forms.items():
+            self.assertEqual(list(cache.get(token_name)), normal_form)
+
+
+    def check_normalize_many(self, cache):
+        """Normalize every token many times over on a thread pool, sharing 1 PyLex & cache.
+        Check the results against normalize() & the cache counters against the calls made."""
+
+        pylex = PyLex(config=self.config, interactive=False)
+        pylex.normal_forms = pylex.expansion.normal_forms = cache
+
+        for round_number in range(ROUNDS):
+            names = self.token_names * 50
+            random.Random(round_number).shuffle(names)
+            threaded = pylex.normalize_many(names, workers=WORKERS)
+            self.assertEqual(threaded, [self.normal_forms[name] for name in names],
+                             'round {}'.format(round_number))
+
+            stats = cache.stats()
+            self.assertEqual(stats['hits'] + stats['misses'], cache.gets)
+            self.assertGreaterEqual(stats['hits'], 1)
+            self.assertEqual(stats['size'], len(cache.items()))
+            if cache.maxsize is not None:
+                self.assertLessEqual(stats['size'], cache.maxsize)
+            # Every eviction removes an entry that a put added.
+            self.assertLessEqual(stats['size'] + stats['evictions'], cache.puts)
+
+        return cache
+
+
+
+if __name__ == '__main__':
+    unittest.main()
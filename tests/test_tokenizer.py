@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+The fused tokenizer pipeline (stream_token_spans()) against the staged one (tokenize_staged()).
+
+Usage (from the dir that contains the pylex checkout, so that pylex.py is not imported as pylex):
+    python -m pytest pylex/tests/test_tokenizer.py
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+from pylex import Lexer, Tokenizer
+from pylex.config import load_config
+
+
+def random_strings(config, count, seed=0):
+    """Build random strings of delimiters (quotes & angle brackets included), token names
+        & a few other chars."""
+
+    rng = random.Random(seed)
+    pieces = (sorted(config.delimiters) + ['"', "'", '<', '>'] * 3
+              + list(config.token_names) + ['abc', '…', '...'])
+    return [''.join(rng.choice(pieces) for piece in range(rng.randint(0, 14)))
+            for string in range(count)]
+
+
+
+class FusedPipelineTest(unittest.TestCase):
+
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+        cls.expressions = ([expression for expression in cls.config.expressions.values()
+                            if expression] + random_strings(cls.config, 5000))
+
+
+    def test_fused_equals_staged(self):
+        for engine in Lexer.engines:
+            tokenizer = Tokenizer(config=self.config, lexer_engine=engine)
+            for expression in self.expressions:
+                staged = tokenizer.tokenize_staged(expression)
+                lexemes = tokenizer.lexer.lex_string(expression)
+                spans = list(tokenizer.stream_token_spans(lexemes))
+
+                self.assertEqual([{key: text} for key, start, end, text in spans], staged,
+                                 '{} engine: {!r}'.format(engine, expression))
+                self.assertEqual(tokenizer.tokenize(expression), staged)
+
+
+    def test_spans(self):
+        # Spans are offsets into the lexed text, & cover it from end to end.
+        tokenizer = Tokenizer(config=self.config)
+        for expression in self.expressions:
+            lexemes = tokenizer.lexer.lex_string(expression)
+            text = ''.join(lexemes)
+            position = 0
+            for key, start, end, token_text in tokenizer.stream_token_spans(lexemes):
+                self.assertEqual(start, position, repr(expression))
+                self.assertEqual(text[start:end], token_text, repr(expression))
+                position = end
+            self.assertEqual(position, len(text), repr(expression))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
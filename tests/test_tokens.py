@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Kind codes across process boundaries: a pickled TokenBuffer keeps its kind names.
+
+Usage (from the dir that contains the pylex checkout, so that pylex.py is not imported as pylex):
+    python -m pytest pylex/tests/test_tokens.py
+"""
+
+import json
+import os
+import pickle
+import subprocess
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+import pylex
+from pylex import Tokenizer
+
+
+# The dir that contains the pylex package imported here, for the child process.
+_root = os.path.dirname(os.path.dirname(os.path.abspath(pylex.__file__)))
+
+
+# Interns other kind names first, so the codes of the unpickled buffer differ from the parent's.
+_CHILD = """
+import json, pickle, sys
+from pylex.tokens import kind_code
+for name in ('zz_kind_{}'.format(i) for i in range(40)):
+    kind_code(name)
+print(json.dumps(pickle.loads(sys.stdin.buffer.read()).to_dicts()))
+"""
+
+
+class TokenBufferPickleTest(unittest.TestCase):
+
+
+    def test_round_trip_in_another_process(self):
+        tokenizer = Tokenizer()
+        expression = '<b c> | "d" (a ... z) e'
+        buffer = tokenizer.tokenize_buffer(expression)
+
+        child = subprocess.run([sys.executable, '-c', _CHILD], input=pickle.dumps(buffer),
+                               stdout=subprocess.PIPE, check=True, cwd=_root,
+                               env=dict(os.environ, PYTHONPATH=_root))
+
+        self.assertEqual(json.loads(child.stdout.decode('utf-8')), buffer.to_dicts())
+        self.assertEqual(pickle.loads(pickle.dumps(buffer)).to_dicts(), buffer.to_dicts())
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Whole-config validation: cycles, sheet checks & the exit code of python -m pylex.validate.
+
+Usage (from the dir that contains the pylex checkout, so that pylex.py is not imported as pylex):
+    python -m pytest pylex/tests/test_validate.py
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+
+import pylex
+from pylex.config import CompiledConfig, load_config
+from pylex.validate import ConfigValidator, main, strongly_connected_components
+
+
+# Rows added to the shipped config: 1 self-recursive token & 2 mutually recursive ones.
+RECURSIVE_ROWS = [
+    ('selfish', "'x' selfish | 'y'"),
+    ('ping', "'a' pong"),
+    ('pong', "'b' ping | 'c'"),
+]
+
+
+def with_rows(config, rows):
+    """Return a copy of config with rows of (token_name, expression) added."""
+
+    data = config.to_dict()
+    data['token_names'] = data['token_names'] + tuple(name for name, expression in rows)
+    data['expressions'] = dict(data['expressions'], **dict(rows))
+    return CompiledConfig.from_dict(data)
+
+
+def run_main(argv):
+    """Run python -m pylex.validate. Return its exit code & output."""
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        status = main(argv)
+    return status, output.getvalue()
+
+
+
+class ValidateTest(unittest.TestCase):
+
+
+    @classmethod
+    def setUpClass(cls):
+        cls.config = load_config()
+
+
+    def test_shipped_config_has_no_errors(self):
+        report = ConfigValidator(self.config, workers=1).validate()
+        self.assertEqual(report.errors, [])
+        self.assertTrue(report.ok)
+        kinds = {(issue.kind, issue.severity) for issue in report.warnings}
+        self.assertIn(('unnamed_priority_seq', 'warning'), kinds)
+
+        status, output = run_main(['--workers', '1'])
+        self.assertEqual(status, 0, output)
+
+
+    def test_cycles(self):
+        report = ConfigValidator(with_rows(self.config, RECURSIVE_ROWS), workers=1).validate()
+        cycles = {issue.token_name: issue.message for issue in report.errors
+                  if issue.kind == 'cycle'}
+
+        self.assertEqual(set(cycles), {'selfish', 'ping'})
+        self.assertIn('selfish -> selfish', cycles['selfish'])
+        self.assertIn('ping -> pong -> ping', cycles['ping'])
+        self.assertFalse(report.ok)
+
+
+    def test_cycles_exit_code(self):
+        import openpyxl
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            config_file = os.path.join(temp_dir, 'PyLex_configs.xlsx')
+            shutil.copy(pylex._config_file, config_file)
+            workbook = openpyxl.load_workbook(config_file)
+            sheet = workbook['PyLex_configs']
+            for token_name, expression in RECURSIVE_ROWS:
+                sheet.append([token_name, '"{}"'.format(expression)])
+            workbook.save(config_file)
+
+            status, output = run_main(['--config', config_file, '--workers', '1'])
+        finally:
+            shutil.rmtree(temp_dir)
+
+        self.assertEqual(status, 1)
+        self.assertIn('error: selfish [cycle]', output)
+        self.assertIn('error: ping [cycle]', output)
+
+
+    def test_strongly_connected_components(self):
+        graph = {'a': ['b'], 'b': ['c', 'a'], 'c': ['c'], 'd': ['a', 'missing'], 'e': []}
+        components = sorted(sorted(component)
+                            for component in strongly_connected_components(graph))
+        self.assertEqual(components, [['a', 'b'], ['c'], ['d'], ['e']])
+
+
+    def test_revalidate_breaks_a_cycle(self):
+        validator = ConfigValidator(with_rows(self.config, RECURSIVE_ROWS), workers=1)
+        self.assertFalse(validator.validate().ok)
+
+        fixed = with_rows(self.config, RECURSIVE_ROWS[:2] + [('pong', "'c'")])
+        fixed.expressions['selfish'] = "'y'"
+        report = validator.revalidate(fixed)
+        self.assertTrue(report.ok, report.format())
+        self.assertEqual(report.rows_checked, 2)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,9 +5,14 @@ Created on Mon Apr 15 10:50:01 2019
 @author: Raphael David
 """
 
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from time import perf_counter
+
 from pylex import _config_file
+from .config import load_config, read_sheet
 from .lexer import Lexer
+from .tokens import DEFINITION_EXTRAS, PYLANG_TOKEN, TokenBuffer, kind_code
 
 class Tokenizer(object):
 
@@ -33,52 +38,355 @@ class Tokenizer(object):
     Tokenizer outputs all resulting tokens together as a single list of dictionaries.
     Each individual dictionary constitutes 1 token.
 
-    """
+    tokenize() runs on a fused, streaming pipeline (iter_tokens()):
+        subtoken classification, phrase grouping & pylang token recognition
+        are all done in one pass over the lexemes, using dict/set lookups only.
+    The 3 staged methods (identify_subtokens(), identify_token_phrases(),
+        identify_pylang_tokens()) are kept & produce the same tokens list by list.
 
+    iter_tokens_from() runs the same pipeline over the lexemes of a file read in chunks,
+        so inputs of any size can be tokenized in bounded memory.
 
+    classify_lexemes() classifies a whole batch of lexemes at once, with NumPy,
+        into an array of int kind codes (see tokens.py), without grouping phrases.
+
+    tokenize_buffer() runs the same pipeline but outputs a compact TokenBuffer
+        (see tokens.py) instead of a list of dicts.
+
+    Tokenizer (& its Lexer) keep no per-call state on the instance,
+        and the compiled config they share is never modified.
+    So 1 instance can serve many threads at once: see tokenize_many().
+
+    """
 
-    print('Tokenizer reporting for duty')
 
 
     def __init__(self, config_file=_config_file,\
                  tokenizer_config_sheet_name="Tokenizer_configs",\
-                pylex_config_sheet_name="PyLex_configs"):
-        """Instantiate an instance of the Tokenizer class."""
+                pylex_config_sheet_name="PyLex_configs", config=None, lexer_engine='legacy',\
+                 stats=None):
+        """Instantiate an instance of the Tokenizer class.
+        An already compiled config (see config.load_config()) can be passed in via config.
+        lexer_engine selects the engine of the Lexer that is called (see Lexer).
+        stats, a Stats object (see stats.py), switches instrumentation on (for the Lexer too)."""
+
+        self.stats = stats
+
+        if config is None:
+            config = load_config(config_file,
+                                 tokenizer_sheet_name=tokenizer_config_sheet_name,
+                                 pylex_sheet_name=pylex_config_sheet_name,
+                                 stats=stats)
+        self.config = config
+
+        # Where the deprecated DataFrame attributes (tokenizer_df, pylex_df) are read from.
+        self._config_file = config_file
+        self._sheet_names = (tokenizer_config_sheet_name, pylex_config_sheet_name)
+        self._dfs = {}
+
+        self.subtoken_configs = self.config.operators
+        self.phrase_opener_configs = self.config.phrase_openers
+        self.phrase_closer_configs = self.config.phrase_closers
+        self.phrase_configs = self.config.phrase_names
+        self.token_configs = self.config.token_name_set
+
+        self.lexer = Lexer(config=self.config, engine=lexer_engine, stats=stats)
+
+        self._kind_table = None   # Built by classify_lexemes() on first use
+
 
-#         subtoken_seq = []
-#         token_seq = []
+    @property
+    def tokenizer_df(self):
+        """Deprecated: the Tokenizer_configs sheet as a DataFrame, read from the workbook
+            on first use. The Tokenizer itself only reads the compiled config."""
 
+        return self._sheet(self._sheet_names[0])
 
-        self.tokenizer_df = pd.read_excel(config_file, tokenizer_config_sheet_name)
-        self.pylex_df = pd.read_excel(config_file, pylex_config_sheet_name)
 
-        self.subtoken_configs = self.tokenizer_df.operator.values
-        self.operator_configs = self.tokenizer_df.operator_name.values
-        self.phrase_configs = self.tokenizer_df.phrase_name.values
-        self.token_configs = self.pylex_df.token_name.values
+    @property
+    def pylex_df(self):
+        """Deprecated: the PyLex_configs sheet as a DataFrame, read from the workbook
+            on first use."""
+
+        return self._sheet(self._sheet_names[1])
+
+
+    @property
+    def operator_configs(self):
+        """Deprecated: the operator_name column of the Tokenizer_configs sheet."""
+
+        return self.tokenizer_df.operator_name.values
+
+
+    def _sheet(self, sheet_name):
+        if sheet_name not in self._dfs:
+            self._dfs[sheet_name] = read_sheet(self._config_file, sheet_name)
+        return self._dfs[sheet_name]
 
 
     def tokenize(self, expression):
         """
         Call Lexer to lex a str expression.
-        Feed the list of resulting lexemes through all other Tokenizer methods.
+        Feed the resulting lexemes through the fused tokenizer pipeline.
 
         Input: str
         Output: list of tokens
         """
 
-        string_to_be_lexed = Lexer()
-        lexeme_list = string_to_be_lexed.lex_string(expression)
+        stats = self.stats
+        if stats is None:
+            return list(self.iter_tokens(expression))
+
+        start = perf_counter()
+        token_seq = list(self.iter_tokens(expression))
+        stats.add_time('tokenize', perf_counter() - start)
+        stats.count('tokens', len(token_seq))
+        return token_seq
+
+
+    def tokenize_many(self, expressions, workers=None):
+        """
+        Tokenize many str expressions on a pool of threads that all share this Tokenizer.
+        Tokens are returned in the same order as the expressions.
+        workers is the number of threads (see concurrent.futures.ThreadPoolExecutor);
+            with workers=1, the expressions are tokenized serially.
+
+        Input: iterable of str
+        Output: list of lists of tokens
+        """
+
+        if workers == 1:
+            return [self.tokenize(expression) for expression in expressions]
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(self.tokenize, expressions))
+
+
+    def tokenize_staged(self, expression):
+        """
+        Call Lexer to lex a str expression.
+        Feed the list of resulting lexemes through all other Tokenizer methods, one at a time.
+        Produces the same list of tokens as tokenize().
+
+        Input: str
+        Output: list of tokens
+        """
+
+        stats = self.stats
+        if stats is not None:
+            start = perf_counter()
+
+        lexeme_list = self.lexer.lex_string(expression)
+
+        if stats is not None:
+            lexed = perf_counter()
 
         subtoken_seq = self.identify_subtokens(lexeme_list)
+
+        if stats is not None:
+            classified = perf_counter()
+            stats.add_time('tokenize.subtokens', classified - lexed)
+
         token_seq = self.identify_token_phrases(subtoken_seq)
 #         print('Token Seq = ', token_seq)
+
+        if stats is not None:
+            grouped = perf_counter()
+            stats.add_time('tokenize.phrases', grouped - classified)
+
         token_seq = self.identify_pylang_tokens(token_seq)
 
+        if stats is not None:
+            end = perf_counter()
+            stats.add_time('tokenize.pylang_tokens', end - grouped)
+            stats.add_time('tokenize', end - start)
+            stats.count('tokens', len(token_seq))
+
 #         print('Tokens: {}'.format(token_seq))
         return token_seq
 
 
+    def iter_tokens(self, expression):
+        """
+        Call Lexer to lex a str expression & yield its tokens one at a time.
+        Each lexeme is classified as a subtoken, grouped into a phrase if a phrase is open,
+            & recognized as a pylang token, in a single pass.
+
+        Input: str
+        Output: generator of tokens
+        """
+
+        return self.stream_tokens(self.lexer.lex_string(expression))
+
+
+    def iter_tokens_from(self, fileobj, chunk_size=1 << 16, encoding='utf-8'):
+        """
+        Tokenize the contents of a file in chunks (see Lexer.iter_lex()).
+        Yield tokens one at a time. A phrase left open at the end of a chunk
+            stays open until its closer is read from a later chunk.
+
+        Input: object with a read(size) method (file opened in text or binary mode, mmap...)
+        Output: generator of tokens
+        """
+
+        return self.stream_tokens(self.lexer.iter_lex(fileobj, chunk_size, encoding))
+
+
+    def stream_tokens(self, lexemes):
+        """
+        The fused pipeline behind iter_tokens(). Reads lexemes from any iterable.
+        Equivalent to identify_subtokens(), identify_token_phrases()
+            & identify_pylang_tokens() run one after the other.
+
+        Input: iterable of lexemes
+        Output: generator of tokens
+        """
+
+        for key, start, end, text in self.stream_token_spans(lexemes):
+            yield {key: text}
+
+
+    def stream_token_spans(self, lexemes):
+        """
+        Run the fused pipeline over lexemes that tile a source string in order.
+        Yield each token as (key, start, end, text),
+            where start & end are the token's offsets in the source string.
+
+        Input: iterable of lexemes
+        Output: generator of tuples
+        """
+
+        operators = self.subtoken_configs
+        phrase_openers = self.phrase_opener_configs
+        phrase_closers = self.phrase_closer_configs
+        phrases = self.phrase_configs
+        pylang_tokens = self.token_configs
+        stats = self.stats
+
+        phrase_parts = []
+        phrase_start = 0
+        match = None      # operator_name that closes the open phrase (None if no phrase is open)
+
+        start = 0
+        for lexeme in lexemes:
+            end = start + len(lexeme)
+            key = operators.get(lexeme, 'potential_pylang_token')
+
+            if match is not None:     # Hold for phrase
+                phrase_parts.append(lexeme)
+                if key == match:
+                    if stats is not None:
+                        stats.count('phrases')
+                    yield str(phrases[key]), phrase_start, end, ''.join(phrase_parts)
+                    phrase_parts = []
+                    match = None
+
+            elif phrase_openers[key]:
+                phrase_parts.append(lexeme)
+                phrase_start = start
+                match = str(phrase_closers[key])
+
+            elif key == 'potential_pylang_token':
+                if lexeme in pylang_tokens:
+                    yield 'pylang_token', start, end, lexeme
+                else:
+                    yield 'definition_extras', start, end, lexeme
+
+            else:
+                yield key, start, end, lexeme
+
+            start = end
+
+        if match is not None:
+            yield 'Syntax Error', phrase_start, start, ''.join(phrase_parts)
+
+
+    def tokenize_buffer(self, expression):
+        """
+        Tokenize a str expression, or the lexemes in a TokenBuffer made by Lexer.lex_buffer(),
+            into a TokenBuffer. Token texts are not materialised.
+
+        Input: str or TokenBuffer of lexemes
+        Output: TokenBuffer of tokens
+        """
+
+        stats = self.stats
+        if stats is not None:
+            started = perf_counter()
+
+        if isinstance(expression, TokenBuffer):
+            lexemes = expression.texts()
+            expression = expression.source
+        else:
+            lexemes = self.lexer.lex_string(expression)
+
+        token_buffer = TokenBuffer(expression)
+        append = token_buffer.append
+
+        for key, start, end, text in self.stream_token_spans(lexemes):
+            append(kind_code(key), start, end)
+
+        if stats is not None:
+            stats.add_time('tokenize', perf_counter() - started)
+            stats.count('tokens', len(token_buffer))
+
+        return token_buffer
+
+
+    def classify_lexemes(self, lexemes):
+        """
+        Classify a batch of lexemes against the operator & pylang token tables in one go.
+        Each lexeme gets the kind code (see tokens.py) of its operator name if it is an operator,
+            PYLANG_TOKEN if it is a pylang token name, DEFINITION_EXTRAS otherwise:
+            the same as identify_subtokens() followed by identify_pylang_tokens(),
+            but without grouping phrases.
+        Requires NumPy.
+
+        The batch can be:
+            a NumPy array of str:  looked up with searchsorted() on the sorted table,
+            a pandas Categorical:  only its categories are looked up, then taken by code,
+            any other iterable:    looked up in the table dict, straight into an int array.
+
+        Input: list, NumPy array or pandas Categorical of lexemes
+        Output: NumPy array of int32 kind codes
+
+        Operator codes are process-local (see kind_code()):
+            map them to names with kind_name() before sending them to another process.
+        """
+
+        import numpy as np
+
+        if self._kind_table is None:
+            table = {token_name: PYLANG_TOKEN for token_name in self.token_configs}
+            table.update((operator, kind_code(operator_name))
+                         for operator, operator_name in self.subtoken_configs.items())
+            keys = sorted(table)
+            self._kind_table = (table, np.array(keys, dtype=str),
+                                np.array([table[key] for key in keys], dtype=np.int32))
+
+        table, keys, codes = self._kind_table
+
+        if isinstance(lexemes, np.ndarray) and lexemes.dtype.kind == 'U':
+            if not len(keys):
+                return np.full(len(lexemes), DEFINITION_EXTRAS, dtype=np.int32)
+            i = np.searchsorted(keys, lexemes)
+            i[i == len(keys)] = 0
+            return np.where(keys[i] == lexemes, codes[i], DEFINITION_EXTRAS).astype(np.int32)
+
+        categories = getattr(lexemes, 'categories', None)
+        if categories is not None:
+            category_codes = np.fromiter(map(table.get, categories, repeat(DEFINITION_EXTRAS)),
+                                         dtype=np.int32, count=len(categories))
+            # Missing values (code -1) pick up the DEFINITION_EXTRAS appended last.
+            return np.append(category_codes, np.int32(DEFINITION_EXTRAS))[lexemes.codes]
+
+        if not hasattr(lexemes, '__len__'):
+            lexemes = list(lexemes)
+
+        return np.fromiter(map(table.get, lexemes, repeat(DEFINITION_EXTRAS)),
+                           dtype=np.int32, count=len(lexemes))
+
+
     def identify_subtokens(self, lexeme_list):
         """
         Assign each lexeme as a value to keys that are based on a pre-determined category list.
@@ -92,13 +400,9 @@ class Tokenizer(object):
         subtoken_seq = []
 
         for lexeme in lexeme_list:
-            lookup = '"' + lexeme + '"'
-
-            if lookup in self.subtoken_configs:
-                lookup_result = self.tokenizer_df.operator_name\
-                                [self.tokenizer_df.operator == lookup].values
 
-                key = lookup_result.item()   # The name of the operator
+            if lexeme in self.subtoken_configs:
+                key = self.subtoken_configs[lexeme]   # The name of the operator
 
                 subtoken_seq.append({key: lexeme})
 
@@ -127,7 +431,6 @@ class Tokenizer(object):
         token_seq = []
 #         print('beg:', token_seq)
 
-        lookup = ''
         token = ''
         lexeme = ''
         match = ''
@@ -144,9 +447,7 @@ class Tokenizer(object):
 
                     if str(key) == str(match):
 #                         print('key does equal match')
-                        lookup = self.tokenizer_df.phrase_name\
-                            [self.tokenizer_df.operator_name == key].values
-                        phrase = lookup.item()
+                        phrase = self.phrase_configs[key]
 #                         print('phrase =', phrase)
 
                         token = {str(phrase): lexeme}
@@ -160,21 +461,15 @@ class Tokenizer(object):
                         break
 
                 else:
-                    lookup = self.tokenizer_df.phrase_opener\
-                            [self.tokenizer_df.operator_name == key].values
 #                     print('kv = ', subtoken)
 #                     print('key = ', key)
-#                     print('lookup = ', lookup)
-                    is_a_phrase = lookup.item()
+                    is_a_phrase = self.phrase_opener_configs[key]
 #                     print('Phrase?', is_a_phrase)
 #                     print(type(is_a_phrase))
 
                     if is_a_phrase:
 #                         print('made it to IF')
-                        lookup = self.tokenizer_df.phrase_closer\
-                                [self.tokenizer_df.operator_name == key].values
-#                         print('since True, lookup =', lookup)
-                        match = lookup.item()
+                        match = self.phrase_closer_configs[key]
 #                         print('match =', match)
                         mode = 'hold for phrase'
                         break
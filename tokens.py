@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Compact token representations shared by Lexer, Tokenizer and PyLex.
+"""
+
+import threading
+from array import array
+from collections import namedtuple
+
+
+# Kind names are interned as small ints. The first few are fixed;
+# operator & phrase names from the config are added on first use,
+# so their codes depend on what a process tokenized first & are only valid in that process.
+# Send kind names, not codes, to other processes or to disk (TokenBuffers pickle their names).
+_kind_names = ['lexeme', 'string', 'potential_pylang_token', 'pylang_token',
+               'definition_extras', 'Syntax Error']
+_kind_codes = {name: code for code, name in enumerate(_kind_names)}
+_kind_lock = threading.Lock()
+
+LEXEME = 0
+STRING = 1
+POTENTIAL_PYLANG_TOKEN = 2
+PYLANG_TOKEN = 3
+DEFINITION_EXTRAS = 4
+SYNTAX_ERROR = 5
+
+
+def kind_code(name):
+    """
+    Return the interned int code for a kind name, adding the name if it is new.
+    Codes beyond the fixed ones are process-local: convert them back with kind_name()
+        before they leave the process.
+    """
+
+    code = _kind_codes.get(name)
+    if code is None:
+        with _kind_lock:
+            code = _kind_codes.get(name)
+            if code is None:
+                code = len(_kind_names)
+                _kind_names.append(name)
+                _kind_codes[name] = code
+    return code
+
+
+def kind_name(code):
+    """Return the kind name behind an interned int code."""
+
+    return _kind_names[code]
+
+
+
+class Token(namedtuple('Token', 'kind start end')):
+
+    """
+    Token is 1 lexeme or token, stored as an interned int kind
+        & the start/end offsets of its text in the source string.
+    Its text is only sliced out of the source when asked for.
+
+    Example:
+        source = 'lc_letter*'
+        Token(PYLANG_TOKEN, 0, 9).text(source)    -> 'lc_letter'
+        Token(PYLANG_TOKEN, 0, 9).as_dict(source) -> {'pylang_token': 'lc_letter'}
+
+    """
+
+    __slots__ = ()
+
+
+    @property
+    def name(self):
+        """The kind name of the token, e.g. 'pylang_token'."""
+
+        return _kind_names[self.kind]
+
+
+    def text(self, source):
+        """Return the token's text from the source string."""
+
+        return source[self.start:self.end]
+
+
+    def as_dict(self, source):
+        """Return the token as the single key-value pair dict used by tokenize()."""
+
+        return {_kind_names[self.kind]: source[self.start:self.end]}
+
+
+
+class TokenBuffer(object):
+
+    """
+    TokenBuffer holds a sequence of tokens over 1 source string
+        as 3 parallel int arrays: kinds, starts & ends.
+    It takes far less memory than a list of dicts
+        & no substrings are created until text() or to_dicts() is called.
+
+    Lexer.lex_buffer(), Tokenizer.tokenize_buffer() & ExpansionEngine.tokenize()
+        produce and/or consume TokenBuffers.
+
+    Kind codes are process-local (see kind_code()),
+        so a pickled TokenBuffer carries kind names & is re-interned when unpickled.
+
+    """
+
+
+    __slots__ = ('source', 'kinds', 'starts', 'ends')
+
+
+    def __init__(self, source=''):
+        """Instantiate an empty buffer over a source string."""
+
+        self.source = source
+        self.kinds = array('i')
+        self.starts = array('i')
+        self.ends = array('i')
+
+
+    @classmethod
+    def from_lexemes(cls, source, lexemes, kind=LEXEME):
+        """
+        Build a buffer from lexemes that tile the source string in order
+            (as the lexemes returned by Lexer.lex_string() do).
+
+        Input: str, list of lexemes
+        Output: TokenBuffer
+        """
+
+        buffer = cls(source)
+        start = 0
+        for lexeme in lexemes:
+            end = start + len(lexeme)
+            buffer.append(kind, start, end)
+            start = end
+        return buffer
+
+
+    def __getstate__(self):
+        names = sorted(set(self.kinds))
+        index = {kind: i for i, kind in enumerate(names)}
+        return (self.source, [_kind_names[kind] for kind in names],
+                array('i', [index[kind] for kind in self.kinds]), self.starts, self.ends)
+
+
+    def __setstate__(self, state):
+        source, names, kinds, starts, ends = state
+        codes = [kind_code(name) for name in names]
+        self.source = source
+        self.kinds = array('i', [codes[kind] for kind in kinds])
+        self.starts = starts
+        self.ends = ends
+
+
+    def append(self, kind, start, end):
+        """Add a token to the end of the buffer."""
+
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+
+
+    def __len__(self):
+        return len(self.kinds)
+
+
+    def __getitem__(self, i):
+        return Token(self.kinds[i], self.starts[i], self.ends[i])
+
+
+    def __iter__(self):
+        return map(Token, self.kinds, self.starts, self.ends)
+
+
+    def text(self, i):
+        """Return the text of token i."""
+
+        return self.source[self.starts[i]:self.ends[i]]
+
+
+    def texts(self):
+        """Yield the text of every token, in order."""
+
+        source = self.source
+        for start, end in zip(self.starts, self.ends):
+            yield source[start:end]
+
+
+    def to_dicts(self):
+        """Return the tokens as the list of single key-value pair dicts used by tokenize()."""
+
+        source = self.source
+        return [{_kind_names[kind]: source[start:end]}
+                for kind, start, end in zip(self.kinds, self.starts, self.ends)]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Trace sinks for PyLex: where lookup & evaluation events go instead of print().
+"""
+
+import logging
+
+
+# Every event PyLex emits, with the fields it is sent with:
+#     'lookup'           token, expression (None if the token is not found or blank),
+#                        blank (True, only if the token is found but its definition is blank),
+#                        suggestions (similar token names, only if the token is not found)
+#     'substitution'     token, expression, round
+#     'round_started'    round
+#     'round_completed'  round, expression, master_list, remainder
+EVENTS = ('lookup', 'substitution', 'round_started', 'round_completed')
+
+
+def print_trace(event, fields):
+    """
+    The interactive sink: print each event exactly as PyLex always has.
+
+    Input: event name, dict of fields
+    """
+
+    if event == 'lookup' or event == 'substitution':
+        if fields['expression'] is not None:
+            print('Lexical Definition of {}: {}'.format(fields['token'], fields['expression']),
+                  end='\n\n')
+        elif fields.get('blank'):
+            print('The token {} has a blank definition.'.format(fields['token']))
+        else:
+            print('The token name you have entered is not found '\
+                      'in the list of tokens used by the Python lexical analyzer.')
+            if fields.get('suggestions'):
+                print('Did you mean: {}?'.format(', '.join(fields['suggestions'])))
+
+    elif event == 'round_started':
+        print('\nEvaluation #{}'.format(fields['round']))
+
+    elif event == 'round_completed':
+        print('intermediate definition of {}: '.format(fields['expression']),\
+              *fields['master_list'], fields['remainder'])
+
+
+def logging_trace(logger=None, level=logging.DEBUG):
+    """
+    Return a sink that sends each event to a logging.Logger (logger 'pylex' by default),
+        with the event's fields attached to the log record as record.pylex_fields.
+
+    Input: logging.Logger or None, logging level
+    Output: sink callable
+    """
+
+    if logger is None:
+        logger = logging.getLogger('pylex')
+
+    def sink(event, fields):
+        if logger.isEnabledFor(level):
+            logger.log(level, '%s %s', event,
+                       {name: value for name, value in fields.items() if name != 'master_list'},
+                       extra={'pylex_event': event, 'pylex_fields': fields})
+
+    return sink
+
+
+def combine_traces(*sinks):
+    """
+    Return 1 sink that sends each event to every sink given (None sinks are skipped).
+    Return None if no sink is left, so PyLex stays silent at no cost.
+    """
+
+    sinks = [sink for sink in sinks if sink is not None]
+
+    if not sinks:
+        return None
+    if len(sinks) == 1:
+        return sinks[0]
+
+    def sink(event, fields):
+        for each_sink in sinks:
+            each_sink(event, fields)
+
+    return sink
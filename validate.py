@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+"""
+Whole-config validation of PyLex_configs.xlsx, with incremental revalidation after edits.
+
+Usage:
+    python -m pylex.validate [--config PyLex_configs.xlsx] [--root identifier ...] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import namedtuple
+
+from pylex import _config_file
+from .bulk import map_chunks, worker, worker_pool
+from .config import CompiledConfig, load_config
+from .names import TokenNameIndex
+from .tokenizer import Tokenizer
+
+
+class Issue(namedtuple('Issue', 'severity kind token_name message')):
+
+    """
+    1 problem found in the config: its severity ('error' or 'warning'), its kind,
+        the token whose row it is on (None for problems of the Lexer & Tokenizer sheets)
+        & a message for humans.
+    """
+
+    __slots__ = ()
+
+
+
+class RowCheck(namedtuple('RowCheck', 'expression references words issues')):
+
+    """
+    The result of checking 1 row of the PyLex_configs sheet on its own:
+        its expression, the pylang tokens it refers to (in order, without repeats),
+        every bare word in it (pylang tokens or not) & the issues found in it.
+    """
+
+    __slots__ = ()
+
+
+
+class ValidationReport(object):
+
+    """
+    The issues found in a config, in config order: row issues first, then graph issues,
+        then issues of the Lexer & Tokenizer sheets.
+    rows_checked is the number of rows that were (re)tokenized to produce the report.
+    """
+
+
+    def __init__(self, issues, rows_checked, content_hash=None):
+        self.issues = list(issues)
+        self.rows_checked = rows_checked
+        self.content_hash = content_hash
+
+
+    def __len__(self):
+        return len(self.issues)
+
+
+    def __iter__(self):
+        return iter(self.issues)
+
+
+    @property
+    def errors(self):
+        return [issue for issue in self.issues if issue.severity == 'error']
+
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue.severity == 'warning']
+
+
+    @property
+    def ok(self):
+        """True if no errors were found (warnings are allowed)."""
+
+        return not self.errors
+
+
+    def to_dict(self):
+        """Return the report as a dict of plain, JSON-able data."""
+
+        return {
+            'ok': self.ok,
+            'errors': len(self.errors),
+            'warnings': len(self.warnings),
+            'rows_checked': self.rows_checked,
+            'content_hash': self.content_hash,
+            'issues': [issue._asdict() for issue in self.issues],
+        }
+
+
+    def format(self):
+        """Return the report as lines of text, 1 per issue, then a summary line."""
+
+        lines = ['{}: {} [{}] {}'.format(issue.severity, issue.token_name or '(config)',
+                                         issue.kind, issue.message) for issue in self.issues]
+        lines.append('{} errors, {} warnings ({} rows checked)'\
+                     .format(len(self.errors), len(self.warnings), self.rows_checked))
+        return '\n'.join(lines)
+
+
+
+class ConfigValidator(object):
+
+    """
+    ConfigValidator checks a whole compiled config at once, instead of waiting for
+        problems to show up at lookup time.
+
+    Each row of the PyLex_configs sheet is tokenized once & checked on its own (check_row()):
+        blank_definition      the row has no expression (warning)
+        undefined_reference   a bare word that looks like a token name is not one
+                              (it is read as a definition extra, & never expanded)
+        unbalanced_phrase     a phrase opener ('<', a quote...) is never closed,
+                              or a phrase closer ('>') has no opener
+    Row checks run on a pool of processes, chunksize rows at a time
+        (inline when there is only 1 chunk).
+
+    The references found in the rows then make a dependency graph, checked as a whole:
+        cycle                 tokens whose definitions refer back to themselves
+        blank_reference       a reference to a token with a blank definition (warning)
+        unreachable           a token that no root refers to, directly or not (warning).
+                              Roots default to the tokens no other token refers to,
+                              so only tokens referred to from detached cycles are unreachable.
+    And the Lexer & Tokenizer sheets are checked against each other:
+        missing_operator      a delimiter with no operator in Tokenizer_configs
+                              (it is read as a potential pylang token),
+                              or a phrase closer that is not an operator
+        unnamed_priority_seq  a priority sequence with no operator in Tokenizer_configs (warning):
+                              it is kept whole, then read as a potential pylang token,
+                              which the shipped config relies on for '...' & 'bb'
+
+    revalidate() takes the config after an edit & only re-tokenizes the rows it may affect:
+        rows that were added or edited, & rows mentioning a token name that was added or removed
+        (or, when names were added or removed, with undefined references to suggest names for).
+        Every row is re-tokenized if the Lexer or Tokenizer sheets changed.
+        Graph & sheet checks are cheap & always run on the whole config.
+
+    Example:
+
+        validator = ConfigValidator(load_config())
+        report = validator.validate()
+        print(report.format())
+        report = validator.revalidate(load_config(refresh=True))   -> report.rows_checked == 1
+
+    """
+
+
+    def __init__(self, config, roots=None, workers=None, chunksize=1024):
+        """Instantiate a validator over a CompiledConfig.
+        roots are the token names that every token should be reachable from (see class docstring).
+        workers defaults to the number of CPUs."""
+
+        self.config = config
+        self.roots = None if roots is None else tuple(roots)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+
+        self.rows = {}     # token_name -> RowCheck
+
+
+    def validate(self):
+        """
+        Check every row of the config, then the dependency graph & the Lexer & Tokenizer sheets.
+
+        Input: nothing
+        Output: ValidationReport
+        """
+
+        self.rows = {}
+        return self._report(list(self.config.token_names))
+
+
+    def revalidate(self, config):
+        """
+        Validate an edited config, re-tokenizing only the rows the edit may affect.
+
+        Input: CompiledConfig (the new one)
+        Output: ValidationReport
+        """
+
+        old = self.config
+        self.config = config
+
+        if _tokenizer_data(old) != _tokenizer_data(config):
+            self.rows = {}
+            return self._report(list(config.token_names))
+
+        renamed = old.token_name_set ^ config.token_name_set
+        rows = {}
+        stale = []
+        for token_name in config.token_names:
+            row = self.rows.get(token_name)
+            # Rows with undefined references are re-checked too: their suggestions may change.
+            if (row is None or row.expression != config.expressions.get(token_name)
+                    or not renamed.isdisjoint(row.words)
+                    or (renamed and any(issue.kind == 'undefined_reference'
+                                        for issue in row.issues))):
+                stale.append(token_name)
+            else:
+                rows[token_name] = row
+
+        self.rows = rows
+        return self._report(stale)
+
+
+    def _report(self, stale):
+        """Check the stale rows, then build the report over every row."""
+
+        config = self.config
+        self.rows.update(zip(stale, self._check_rows(stale)))
+
+        issues = []
+        for token_name in config.token_names:
+            issues.extend(self.rows[token_name].issues)
+        issues.extend(self._graph_issues())
+        issues.extend(sheet_issues(config))
+
+        return ValidationReport(issues, len(stale), config.content_hash())
+
+
+    def _check_rows(self, token_names):
+        """Check rows on the process pool (or inline for a single chunk). Return RowChecks."""
+
+        config = self.config
+        rows = [(token_name, config.expressions.get(token_name)) for token_name in token_names]
+
+        if self.workers == 1 or len(rows) <= self.chunksize:
+            tokenizer = Tokenizer(config=config)
+            name_index = TokenNameIndex.from_config(config)
+            return [check_row(tokenizer, name_index, token_name, expression)
+                    for token_name, expression in rows]
+
+        workers = min(self.workers, -(-len(rows) // self.chunksize))
+        with worker_pool(workers, _build_checker, config.to_dict()) as pool:
+            return list(map_chunks(pool, _check_chunk, rows, self.chunksize, 2 * workers))
+
+
+    def _graph_issues(self):
+        """Yield the issues of the dependency graph: cycles, blank references & unreachable tokens."""
+
+        config = self.config
+        references = {token_name: row.references for token_name, row in self.rows.items()}
+        order = {token_name: rank for rank, token_name in enumerate(config.token_names)}
+
+        for component in strongly_connected_components(references):
+            if len(component) > 1 or component[0] in references[component[0]]:
+                first = min(component, key=order.get)
+                cycle = _cycle_through(first, set(component), references)
+                yield Issue('error', 'cycle', first,
+                            'Recursive definition, the expansion would never end: {}'\
+                            .format(' -> '.join(cycle)))
+
+        for token_name in config.token_names:
+            for reference in references[token_name]:
+                if config.expressions.get(reference) is None:
+                    yield Issue('warning', 'blank_reference', token_name,
+                                'Refers to {!r}, which has a blank definition.'.format(reference))
+
+        roots = self.roots
+        if roots is None:
+            referenced = {reference for token_references in references.values()
+                          for reference in token_references}
+            roots = [token_name for token_name in config.token_names
+                     if token_name not in referenced]
+
+        reached = set()
+        stack = [root for root in roots if root in references]
+        while stack:
+            token_name = stack.pop()
+            if token_name not in reached:
+                reached.add(token_name)
+                stack.extend(references[token_name])
+
+        for token_name in config.token_names:
+            if token_name not in reached:
+                yield Issue('warning', 'unreachable', token_name,
+                            'Not reachable from any root token.')
+
+
+
+def validate_config(config=None, config_file=_config_file, roots=None, workers=None):
+    """
+    Validate a config once (see ConfigValidator).
+
+    Input: CompiledConfig, or path to an xlsx config file
+    Output: ValidationReport
+    """
+
+    if config is None:
+        config = load_config(config_file)
+
+    return ConfigValidator(config, roots=roots, workers=workers).validate()
+
+
+def check_row(tokenizer, name_index, token_name, expression):
+    """
+    Tokenize 1 row's expression & check it on its own.
+    name_index (a TokenNameIndex of the config's token names) suggests names for undefined ones.
+
+    Input: Tokenizer, TokenNameIndex, str, str or None
+    Output: RowCheck
+    """
+
+    if expression is None:
+        return RowCheck(None, (), frozenset(), (Issue('warning', 'blank_definition', token_name,
+                                                      'The definition is blank.'),))
+
+    phrase_closers = {closer for opener, closer in tokenizer.phrase_closer_configs.items()
+                      if tokenizer.phrase_opener_configs.get(opener) and closer != opener}
+
+    references = []
+    words = set()
+    issues = []
+
+    lexemes = tokenizer.lexer.lex_string(expression)
+    for key, start, end, text in tokenizer.stream_token_spans(lexemes):
+        if key == 'pylang_token':
+            words.add(text)
+            if text not in references:
+                references.append(text)
+
+        elif key == 'definition_extras':
+            words.add(text)
+            if text.isidentifier():
+                suggestions = name_index.suggest(text, 3)
+                message = '{!r} (at {}) is not a token name.'.format(text, start)
+                if suggestions:
+                    message += ' Did you mean: {}?'.format(', '.join(suggestions))
+                issues.append(Issue('error', 'undefined_reference', token_name, message))
+
+        elif key == 'Syntax Error':
+            issues.append(Issue('error', 'unbalanced_phrase', token_name,
+                                'The phrase opened at {} is never closed: {!r}'\
+                                .format(start, text)))
+
+        elif key in phrase_closers:
+            issues.append(Issue('error', 'unbalanced_phrase', token_name,
+                                'Phrase closer {!r} (at {}) has no opener.'.format(text, start)))
+
+    return RowCheck(expression, tuple(references), frozenset(words), tuple(issues))
+
+
+def sheet_issues(config):
+    """
+    Yield the issues between the Lexer & Tokenizer sheets: delimiters with no operator,
+        phrase closers that are not operators & (as warnings) priority sequences with no operator.
+
+    Input: CompiledConfig
+    Output: generator of Issues
+    """
+
+    operators = config.operators
+    operator_names = set(operators.values())
+
+    for delimiter in sorted(config.delimiters):
+        if delimiter not in operators:
+            yield Issue('error', 'missing_operator', None,
+                        'Delimiter {!r} has no operator in Tokenizer_configs.'.format(delimiter))
+
+    for char_seq in config.priority_char_seqs:
+        if char_seq not in operators:
+            yield Issue('warning', 'unnamed_priority_seq', None,
+                        'Priority sequence {!r} has no operator in Tokenizer_configs.'\
+                        .format(char_seq))
+
+    for operator_name, is_opener in config.phrase_openers.items():
+        if not is_opener:
+            continue
+        closer = config.phrase_closers.get(operator_name)
+        if closer not in operator_names:
+            yield Issue('error', 'missing_operator', None,
+                        'Phrase opener {!r} is closed by {!r}, which is not an operator.'\
+                        .format(operator_name, closer))
+
+
+def strongly_connected_components(graph):
+    """
+    Return the strongly connected components of a graph (Tarjan's algorithm, iterative).
+    Edges to nodes outside the graph are ignored.
+
+    Input: dict of node -> iterable of nodes
+    Output: list of lists of nodes
+    """
+
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    components = []
+
+    for root in graph:
+        if root in index:
+            continue
+
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+
+        while work:
+            node, edges = work[-1]
+            for successor in edges:
+                if successor not in graph:
+                    continue
+                if successor not in index:
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph[successor])))
+                    break
+                if successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def _cycle_through(start, component, graph):
+    """Return a shortest cycle from start back to itself inside 1 strongly connected component."""
+
+    previous = {}
+    queue = [start]
+    for node in queue:
+        for successor in graph[node]:
+            if successor == start:
+                path = [start]
+                while node != start:
+                    path.append(node)
+                    node = previous[node]
+                return [start] + path[:0:-1] + [start]
+            if successor in component and successor not in previous:
+                previous[successor] = node
+                queue.append(successor)
+    return [start, start]
+
+
+def _tokenizer_data(config):
+    """What the Lexer & Tokenizer read from a config: if it changes, every row must be re-checked."""
+
+    return (config.delimiters, config.priority_char_seqs, config.operators,
+            config.phrase_openers, config.phrase_closers, config.phrase_names)
+
+
+def _build_checker(config_data):
+    """Build the Tokenizer & name index of a worker process from the compiled config sent to it."""
+
+    config = CompiledConfig.from_dict(config_data)
+    return Tokenizer(config=config), TokenNameIndex.from_config(config)
+
+
+def _check_chunk(rows):
+    """Check a chunk of (token_name, expression) rows in a worker process."""
+
+    tokenizer, name_index = worker()
+    return [check_row(tokenizer, name_index, token_name, expression)
+            for token_name, expression in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m pylex.validate',
+                                     description='Check a whole PyLex config for problems.')
+    parser.add_argument('--config', default=_config_file, help='path of PyLex_configs.xlsx')
+    parser.add_argument('--root', action='append', dest='roots', metavar='TOKEN',
+                        help='a token every token should be reachable from (repeatable)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes checking rows (default: 1 per CPU)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = validate_config(config_file=args.config, roots=args.roots, workers=args.workers)
+
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2, ensure_ascii=False))
+    else:
+        print(report.format())
+
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())